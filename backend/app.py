@@ -1,24 +1,55 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 try:
-    from core.config import configure_api_env, init_storage
+    from core.concurrency import shutdown_executors
+    from core.config import EMBEDDING_WARMUP, INGEST_WORKERS, configure_api_env, init_storage
     from core.logging import setup_logging
     from routes.health import router as health_router
     from routes.documents import router as documents_router
+    from services.documents import warmup_embeddings
+    from services.jobs import WorkerPool, elect_app_workers
 except Exception:  # fallback for running as backend.app
-    from backend.core.config import configure_api_env, init_storage
+    from backend.core.concurrency import shutdown_executors
+    from backend.core.config import EMBEDDING_WARMUP, INGEST_WORKERS, configure_api_env, init_storage
     from backend.core.logging import setup_logging
     from backend.routes.health import router as health_router
     from backend.routes.documents import router as documents_router
+    from backend.services.documents import warmup_embeddings
+    from backend.services.jobs import WorkerPool, elect_app_workers
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    workers = None
+    # With several uvicorn workers, only the elected one starts the ingestion pool
+    election = elect_app_workers() if INGEST_WORKERS > 0 else None
+    if election is not None:
+        workers = WorkerPool(INGEST_WORKERS)
+        workers.start()
+    yield
+    if workers is not None:
+        workers.stop()
+    if hasattr(election, "close"):
+        election.close()
+    shutdown_executors()
+    try:
+        from rag.llm_clients import aclose
+    except ImportError:
+        return
+    await aclose()
 
 
 def create_app() -> FastAPI:
-    setup_logging()
+    logger = setup_logging()
     configure_api_env()
     init_storage()
+    if EMBEDDING_WARMUP:
+        warmup_embeddings(logger)
 
-    app = FastAPI(title="DocuMind Backend (Demo)")
+    app = FastAPI(title="DocuMind Backend (Demo)", lifespan=lifespan)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
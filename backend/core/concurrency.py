@@ -0,0 +1,42 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, TypeVar
+
+try:
+    from core.config import LLM_MAX_CONCURRENCY, RAG_THREAD_POOL_SIZE
+except Exception:  # fallback when running as backend.app
+    from backend.core.config import LLM_MAX_CONCURRENCY, RAG_THREAD_POOL_SIZE
+
+T = TypeVar("T")
+
+_rag_executor: Optional[ThreadPoolExecutor] = None
+_llm_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_rag_executor() -> ThreadPoolExecutor:
+    """Bounded pool for blocking retrieval work, kept off the event loop."""
+    global _rag_executor
+    if _rag_executor is None:
+        _rag_executor = ThreadPoolExecutor(max_workers=RAG_THREAD_POOL_SIZE, thread_name_prefix="rag")
+    return _rag_executor
+
+
+async def run_blocking(func: Callable[..., T], *args) -> T:
+    """Run a short blocking call (SQLite lookups, file reads) on the RAG pool."""
+    return await asyncio.get_running_loop().run_in_executor(get_rag_executor(), func, *args)
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Caps concurrent LLM generations per worker."""
+    global _llm_semaphore
+    if _llm_semaphore is None:
+        _llm_semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _llm_semaphore
+
+
+def shutdown_executors() -> None:
+    global _rag_executor, _llm_semaphore
+    if _rag_executor is not None:
+        _rag_executor.shutdown(wait=False, cancel_futures=True)
+        _rag_executor = None
+    _llm_semaphore = None
@@ -15,6 +15,22 @@ ROOT_DIR = Path(__file__).resolve().parent.parent.parent
 RAG_DIR = ROOT_DIR / "rag"
 UPLOAD_DIR = RAG_DIR / "uploads"
 DB_DIR = RAG_DIR / "db"
+JOBS_DB_PATH = RAG_DIR / "jobs.sqlite3"
+
+# Load the embedding model at startup so the first /query doesn't pay for it
+EMBEDDING_WARMUP = os.getenv("EMBEDDING_WARMUP", "true").lower() in ("1", "true", "yes")
+
+# Threads for blocking retrieval work (embedding + Chroma I/O) and max in-flight LLM calls per worker
+RAG_THREAD_POOL_SIZE = int(os.getenv("RAG_THREAD_POOL_SIZE", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+
+# Ingestion job queue: worker processes started with the app (0 = run `python -m backend.worker` separately)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", "3"))
+INGEST_RETRY_DELAY = float(os.getenv("INGEST_RETRY_DELAY", "5"))
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "1"))
+# A running job's lease: renewed by its worker, requeued by any poller once expired (e.g. the worker was killed)
+INGEST_LEASE_SECONDS = float(os.getenv("INGEST_LEASE_SECONDS", "60"))
 
 
 def init_storage() -> None:
@@ -36,3 +52,10 @@ def configure_api_env() -> None:
         os.environ["OPENAI_API_BASE"] = siray_base
     if not os.getenv("OPENAI_BASE_URL") and siray_base:
         os.environ["OPENAI_BASE_URL"] = siray_base
+
+    # Shared LLM clients pick up the key and base URL (rebuilt only if they changed)
+    try:
+        from rag.llm_clients import configure
+    except ImportError:
+        return
+    configure()
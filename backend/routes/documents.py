@@ -1,8 +1,9 @@
 import sys
 import os
+import json
 from pathlib import Path
-from fastapi import APIRouter, BackgroundTasks, File, Form, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, File, Form, HTTPException, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
 
 # Add parent directory to path for imports
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent
@@ -10,20 +11,39 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 try:
+    from core.concurrency import get_llm_semaphore, get_rag_executor, run_blocking
+    from core.config import UPLOAD_DIR
     from core.logging import setup_logging
-    from services.documents import save_upload, process_document
+    from services.dedup import claim_content, resolve_doc_id
+    from services.documents import save_upload
+    from services.jobs import FAILED, QUEUED, RUNNING, enqueue, get_job
 except ImportError:  # fallback when running as backend.app
+    from backend.core.concurrency import get_llm_semaphore, get_rag_executor, run_blocking
+    from backend.core.config import UPLOAD_DIR
     from backend.core.logging import setup_logging
-    from backend.services.documents import save_upload, process_document
+    from backend.services.dedup import claim_content, resolve_doc_id
+    from backend.services.documents import save_upload
+    from backend.services.jobs import FAILED, QUEUED, RUNNING, enqueue, get_job
 
 router = APIRouter()
 logger = setup_logging()
 
 
 @router.post("/upload")
-async def upload(background_tasks: BackgroundTasks, file: UploadFile = File(...)) -> dict:
+async def upload(file: UploadFile = File(...)) -> dict:
     saved = save_upload(file)
-    background_tasks.add_task(process_document, saved["path"], saved["doc_id"], logger)
+
+    # Same bytes as an earlier upload: share its index and insights instead of reprocessing
+    canonical = await run_blocking(claim_content, saved["sha256"], saved["doc_id"])
+    if canonical != saved["doc_id"]:
+        logger.info(f"Upload {saved['doc_id']} duplicates {canonical}, skipping ingestion")
+        Path(saved["path"]).unlink(missing_ok=True)
+        job = await run_blocking(get_job, canonical)
+        filename = Path(job["file_path"]).name if job else saved["filename"]
+        return {"doc_id": saved["doc_id"], "filename": filename, "duplicate_of": canonical}
+
+    # Durable queue - the ingestion worker pool picks this up, even after a restart
+    await run_blocking(enqueue, saved["doc_id"], saved["path"])
     return {"doc_id": saved["doc_id"], "filename": saved["filename"]}
 
 
@@ -33,14 +53,24 @@ async def query(question: str = Form(...), doc_id: str = Form(...)) -> JSONRespo
         raise HTTPException(status_code=400, detail="doc_id is required")
 
     try:
-        from rag.query import query_doc
+        from rag.query import aquery_doc
     except ImportError as exc:
-        logger.error(f"Failed to import query_doc: {exc}")
+        logger.error(f"Failed to import aquery_doc: {exc}")
         raise HTTPException(status_code=500, detail=f"Query backend unavailable: {exc}") from exc
 
     try:
         logger.info(f"Querying doc {doc_id} with question: {question}")
-        answer = query_doc(doc_id, question)
+        canonical = await run_blocking(resolve_doc_id, doc_id)
+        answer = await aquery_doc(
+            canonical,
+            question,
+            executor=get_rag_executor(),
+            llm_semaphore=get_llm_semaphore(),
+        )
+        job = await run_blocking(get_job, canonical)
+        if job is not None and job["status"] in (QUEUED, RUNNING):
+            # Answered from the pages indexed so far
+            answer = {**answer, "partial": True, "progress": round(job["progress"], 1)}
         logger.info(f"Query succeeded for doc {doc_id}")
         return JSONResponse(content=answer)
     except Exception as exc:
@@ -48,6 +78,114 @@ async def query(question: str = Form(...), doc_id: str = Form(...)) -> JSONRespo
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
 
+@router.post("/query/corpus")
+async def query_corpus(question: str = Form(...), doc_ids: str = Form("all"), k: int = Form(6)) -> JSONResponse:
+    """Ask across documents: `doc_ids` is a comma-separated list or "all"."""
+    try:
+        from rag.query import aquery_corpus
+    except ImportError as exc:
+        logger.error(f"Failed to import aquery_corpus: {exc}")
+        raise HTTPException(status_code=500, detail=f"Query backend unavailable: {exc}") from exc
+
+    scope = None
+    if doc_ids.strip().lower() != "all":
+        requested = [d.strip() for d in doc_ids.split(",") if d.strip()]
+        scope = list(dict.fromkeys(await run_blocking(lambda: [resolve_doc_id(d) for d in requested])))
+        if not scope:
+            raise HTTPException(status_code=400, detail='doc_ids must list at least one doc_id or be "all"')
+
+    try:
+        logger.info(f"Querying {len(scope) if scope else 'all'} docs with question: {question}")
+        answer = await aquery_corpus(
+            question,
+            scope,
+            k=max(1, min(k, 50)),
+            executor=get_rag_executor(),
+            llm_semaphore=get_llm_semaphore(),
+        )
+        return JSONResponse(content=answer)
+    except Exception as exc:
+        logger.exception(f"Corpus query failed: {exc}")
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
+@router.post("/query/batch")
+async def query_batch(questions: str = Form(...), doc_id: str = Form(...), k: int = Form(4)) -> JSONResponse:
+    """Answer many questions about one document: `questions` is a JSON array or one question per line."""
+    if not doc_id:
+        raise HTTPException(status_code=400, detail="doc_id is required")
+
+    try:
+        from rag.query import BATCH_MAX_QUESTIONS, aquery_doc_batch
+    except ImportError as exc:
+        logger.error(f"Failed to import aquery_doc_batch: {exc}")
+        raise HTTPException(status_code=500, detail=f"Query backend unavailable: {exc}") from exc
+
+    try:
+        parsed = json.loads(questions)
+    except ValueError:
+        parsed = questions.splitlines()
+    if not isinstance(parsed, list):
+        parsed = [parsed]
+    parsed = [str(q).strip() for q in parsed if str(q).strip()]
+    if not parsed:
+        raise HTTPException(status_code=400, detail="questions must contain at least one question")
+    if len(parsed) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+
+    try:
+        logger.info(f"Batch querying doc {doc_id} with {len(parsed)} questions")
+        canonical = await run_blocking(resolve_doc_id, doc_id)
+        answer = await aquery_doc_batch(
+            canonical,
+            parsed,
+            k=max(1, min(k, 50)),
+            executor=get_rag_executor(),
+            llm_semaphore=get_llm_semaphore(),
+        )
+        job = await run_blocking(get_job, canonical)
+        if job is not None and job["status"] in (QUEUED, RUNNING):
+            answer = {**answer, "partial": True, "progress": round(job["progress"], 1)}
+        logger.info(f"Batch query succeeded for doc {doc_id}")
+        return JSONResponse(content=answer)
+    except Exception as exc:
+        logger.exception(f"Batch query failed for doc {doc_id}: {exc}")
+        raise HTTPException(status_code=500, detail=str(exc)) from exc
+
+
+@router.post("/query/stream")
+async def query_stream(question: str = Form(...), doc_id: str = Form(...)) -> StreamingResponse:
+    """Server-sent events: `sources` first, then answer `token`s, then `done` (or `error`)."""
+    if not doc_id:
+        raise HTTPException(status_code=400, detail="doc_id is required")
+
+    try:
+        from rag.query import astream_query_doc
+    except ImportError as exc:
+        logger.error(f"Failed to import astream_query_doc: {exc}")
+        raise HTTPException(status_code=500, detail=f"Query backend unavailable: {exc}") from exc
+
+    async def events():
+        try:
+            async for event, data in astream_query_doc(
+                await run_blocking(resolve_doc_id, doc_id),
+                question,
+                executor=get_rag_executor(),
+                llm_semaphore=get_llm_semaphore(),
+            ):
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        except Exception as exc:
+            logger.exception(f"Streaming query failed for doc {doc_id}: {exc}")
+            yield f"event: error\ndata: {json.dumps(str(exc))}\n\n"
+
+    logger.info(f"Streaming query for doc {doc_id} with question: {question}")
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/insights/{doc_id}")
 async def insights(doc_id: str) -> JSONResponse:
     if not doc_id:
@@ -61,15 +199,42 @@ async def insights(doc_id: str) -> JSONResponse:
 
     try:
         logger.info(f"Fetching insights for doc {doc_id}")
-        saved = get_saved_insights(doc_id)
+        canonical = await run_blocking(resolve_doc_id, doc_id)
+        saved = await run_blocking(get_saved_insights, canonical)
         if not saved:
-            logger.info(f"No saved insights for doc {doc_id}, still processing")
-            return JSONResponse({"status": "processing", "doc_id": doc_id})
+            job = await run_blocking(get_job, canonical)
+            if job is None:
+                # Uploaded before the job queue existed: no job row, insights saved under the id as given
+                saved = await run_blocking(get_saved_insights, doc_id)
+                if not saved:
+                    if not any(UPLOAD_DIR.glob(f"{doc_id}.*")):
+                        raise HTTPException(status_code=404, detail=f"Unknown doc_id {doc_id}")
+                    logger.info(f"No saved insights or job for doc {doc_id}, still processing")
+                    return JSONResponse({"status": "processing", "doc_id": doc_id})
+            elif job["status"] == FAILED:
+                logger.info(f"Processing failed for doc {doc_id}: {job['error']}")
+                return JSONResponse({
+                    "status": "failed",
+                    "doc_id": doc_id,
+                    "error": job["error"],
+                    "attempts": job["attempts"],
+                })
+            else:
+                logger.info(f"No saved insights for doc {doc_id}, job {job['status']}")
+                return JSONResponse({
+                    "status": "processing",
+                    "doc_id": doc_id,
+                    "job_status": job["status"],
+                    "queue_position": job["queue_position"],
+                    "attempts": job["attempts"],
+                    "progress": round(job["progress"], 1),
+                })
 
         metadata = {
             "num_chunks": saved.get("num_chunks"),
             "page_count": saved.get("page_count"),
             "word_count": saved.get("word_count"),
+            "parse_ms": (saved.get("parse_timing") or {}).get("total_ms"),
         }
 
         logger.info(f"Returning ready insights for doc {doc_id}")
@@ -79,6 +244,8 @@ async def insights(doc_id: str) -> JSONResponse:
             "insights": saved.get("insights"),
             "metadata": metadata,
         })
+    except HTTPException:
+        raise
     except Exception as exc:
         logger.exception(f"Insights endpoint failed for doc {doc_id}: {exc}")
         raise HTTPException(status_code=500, detail=str(exc)) from exc
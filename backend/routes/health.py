@@ -8,6 +8,26 @@ async def health() -> dict:
     return {"status": "ok"}
 
 
+@router.get("/metrics")
+async def metrics() -> dict:
+    """Per-worker counters for the retrieval caches."""
+    try:
+        from rag.answer_cache import get_answer_cache
+        from rag.chroma_pool import get_pool
+        from rag import embedding_service, llm_clients, model_router, reranker
+    except ImportError as exc:
+        return {"status": "unavailable", "detail": str(exc)}
+
+    return {
+        "answer_cache": get_answer_cache().stats(),
+        "chroma_pool": get_pool().stats(),
+        "embeddings": embedding_service.stats(),
+        "reranker": reranker.stats(),
+        "llm": llm_clients.stats(),
+        "router": model_router.stats(),
+    }
+
+
 @router.get("/")
 async def root() -> dict:
     return {"status": "ok", "message": "DocuMind Backend (demo) — see /health"}
@@ -0,0 +1,139 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Set
+
+try:
+    from core.config import JOBS_DB_PATH
+except Exception:  # fallback when running as backend.app
+    from backend.core.config import JOBS_DB_PATH
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS documents (
+        content_hash TEXT PRIMARY KEY,
+        doc_id TEXT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS aliases (
+        doc_id TEXT PRIMARY KEY,
+        canonical_id TEXT NOT NULL
+    )
+    """,
+)
+
+# Lookups, misses included, are kept in memory until any process changes the
+# aliases table, which it signals by touching a stamp file next to the database
+ALIAS_CACHE_SIZE = 65536
+_alias_cache: Dict[str, str] = {}
+_alias_cache_stamp = 0
+_alias_lock = threading.Lock()
+_initialized: Set[str] = set()
+_init_lock = threading.Lock()
+
+
+def _connect(db_path=None) -> sqlite3.Connection:
+    path = str(db_path or JOBS_DB_PATH)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    if path not in _initialized:
+        with _init_lock:
+            if path not in _initialized:
+                conn.execute("PRAGMA journal_mode=WAL")
+                for statement in _SCHEMA:
+                    conn.execute(statement)
+                _initialized.add(path)
+    return conn
+
+
+def _stamp_path(db_path=None) -> str:
+    return f"{db_path or JOBS_DB_PATH}.aliases"
+
+
+def _read_stamp(db_path=None) -> int:
+    try:
+        return os.stat(_stamp_path(db_path)).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _bump_stamp(db_path=None) -> None:
+    with open(_stamp_path(db_path), "w", encoding="utf-8") as fh:
+        fh.write(str(time.time_ns()))
+
+
+def claim_content(content_hash: str, doc_id: str, db_path=None) -> str:
+    """Return the doc_id that owns `content_hash`, registering `doc_id` as an alias of it.
+
+    The first upload of some content becomes its canonical document. A previous
+    owner whose ingestion job failed is replaced so the content gets processed
+    again; the failed owner and its aliases then resolve to the new one.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute("SELECT doc_id FROM documents WHERE content_hash = ?", (content_hash,)).fetchone()
+        canonical = row[0] if row else None
+        failed = None
+        if canonical is not None:
+            try:
+                job = conn.execute("SELECT status FROM jobs WHERE doc_id = ?", (canonical,)).fetchone()
+            except sqlite3.OperationalError:
+                job = None  # jobs table not created yet
+            # No job row yet means the owner is between claiming and enqueueing
+            if job is not None and job[0] == "failed":
+                failed, canonical = canonical, None
+
+        aliases_changed = False
+        if canonical is None:
+            conn.execute(
+                "INSERT OR REPLACE INTO documents (content_hash, doc_id) VALUES (?, ?)", (content_hash, doc_id)
+            )
+            canonical = doc_id
+            if failed is not None:
+                conn.execute("UPDATE aliases SET canonical_id = ? WHERE canonical_id = ?", (doc_id, failed))
+                conn.execute(
+                    "INSERT OR REPLACE INTO aliases (doc_id, canonical_id) VALUES (?, ?)", (failed, doc_id)
+                )
+                aliases_changed = True
+        elif canonical != doc_id:
+            conn.execute(
+                "INSERT OR REPLACE INTO aliases (doc_id, canonical_id) VALUES (?, ?)", (doc_id, canonical)
+            )
+            aliases_changed = True
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+    if aliases_changed:
+        _bump_stamp(db_path)
+    return canonical
+
+
+def resolve_doc_id(doc_id: str, db_path=None) -> str:
+    """Map a duplicate upload's doc_id to the document whose index and insights it shares (blocking)."""
+    global _alias_cache_stamp
+    stamp = _read_stamp(db_path)
+    with _alias_lock:
+        if stamp != _alias_cache_stamp:
+            _alias_cache.clear()
+            _alias_cache_stamp = stamp
+        canonical: Optional[str] = _alias_cache.get(doc_id)
+    if canonical is not None:
+        return canonical
+
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT canonical_id FROM aliases WHERE doc_id = ?", (doc_id,)).fetchone()
+    finally:
+        conn.close()
+    canonical = row[0] if row else doc_id
+    with _alias_lock:
+        if stamp == _alias_cache_stamp:
+            if len(_alias_cache) >= ALIAS_CACHE_SIZE:
+                _alias_cache.clear()
+            _alias_cache[doc_id] = canonical
+    return canonical
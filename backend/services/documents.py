@@ -1,4 +1,4 @@
-import shutil
+import hashlib
 import uuid
 from pathlib import Path
 from fastapi import HTTPException, UploadFile
@@ -8,6 +8,8 @@ try:
 except Exception:  # fallback when running as backend.app
     from backend.core.config import UPLOAD_DIR
 
+COPY_BUFSIZE = 1024 * 1024
+
 
 def save_upload(file: UploadFile) -> dict:
     if not file or not file.filename:
@@ -21,17 +23,28 @@ def save_upload(file: UploadFile) -> dict:
     doc_id = uuid.uuid4().hex
     dest = UPLOAD_DIR / f"{doc_id}{ext}"
 
+    # Hash while streaming to disk so duplicate uploads can be detected without a second read
+    digest = hashlib.sha256()
     try:
         with dest.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            while True:
+                block = file.file.read(COPY_BUFSIZE)
+                if not block:
+                    break
+                digest.update(block)
+                buffer.write(block)
     except Exception as exc:
         raise HTTPException(status_code=500, detail=str(exc)) from exc
 
-    return {"doc_id": doc_id, "filename": dest.name, "path": str(dest)}
+    return {"doc_id": doc_id, "filename": dest.name, "path": str(dest), "sha256": digest.hexdigest()}
+
 
+def process_document(file_path: str, doc_id: str, logger, progress=None) -> None:
+    """Process a queued document - extract insights and index.
 
-def process_document(file_path: str, doc_id: str, logger) -> None:
-    """Process a document in the background - extract insights and index."""
+    `progress(percent)` is forwarded to ingestion. Errors are logged and re-raised
+    so the job queue can retry the document.
+    """
     try:
         # Ensure environment is configured
         try:
@@ -45,8 +58,18 @@ def process_document(file_path: str, doc_id: str, logger) -> None:
                 logger.warning(f"Could not load config: {config_err}")
         
         from rag.insights import extract_insights
-        result = extract_insights(file_path, doc_id)
+        result = extract_insights(file_path, doc_id, progress=progress)
         logger.info(f"Document {doc_id} processed successfully. Insights summary: {result.get('insights', {}).get('summary', '')[:100]}")
     except Exception as exc:
         logger.exception(f"Failed to process document {doc_id}: {exc}")
-        # Don't raise - background tasks should complete gracefully
+        raise
+
+
+def warmup_embeddings(logger) -> None:
+    """Load the shared embedding model once at startup so the first query is not cold."""
+    try:
+        from rag.embedding_registry import warmup
+        elapsed = warmup()
+        logger.info(f"Embedding model warmed up in {elapsed:.2f}s")
+    except Exception as exc:
+        logger.warning(f"Embedding warmup failed, models will load on first use: {exc}")
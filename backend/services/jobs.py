@@ -0,0 +1,391 @@
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: every app process may start workers there
+    fcntl = None
+
+try:
+    from core.config import (
+        INGEST_LEASE_SECONDS,
+        INGEST_MAX_ATTEMPTS,
+        INGEST_POLL_INTERVAL,
+        INGEST_RETRY_DELAY,
+        INGEST_WORKERS,
+        JOBS_DB_PATH,
+    )
+    from core.logging import setup_logging
+except Exception:  # fallback when running as backend.app
+    from backend.core.config import (
+        INGEST_LEASE_SECONDS,
+        INGEST_MAX_ATTEMPTS,
+        INGEST_POLL_INTERVAL,
+        INGEST_RETRY_DELAY,
+        INGEST_WORKERS,
+        JOBS_DB_PATH,
+    )
+    from backend.core.logging import setup_logging
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Longest wait between retries when the queue itself keeps failing (e.g. "database is locked")
+QUEUE_ERROR_MAX_BACKOFF = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    doc_id TEXT NOT NULL UNIQUE,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    error TEXT,
+    worker_pid INTEGER,
+    progress REAL NOT NULL DEFAULT 0,
+    lease_until REAL,
+    available_at REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+def _connect(db_path=None) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path or JOBS_DB_PATH), timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_SCHEMA)
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    if "progress" not in columns:  # databases created before progress reporting
+        conn.execute("ALTER TABLE jobs ADD COLUMN progress REAL NOT NULL DEFAULT 0")
+    if "lease_until" not in columns:  # databases created before leases
+        conn.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+    return conn
+
+
+def enqueue(doc_id: str, file_path: str, max_attempts: int = INGEST_MAX_ATTEMPTS, db_path=None) -> None:
+    """Queue `file_path` for ingestion under `doc_id`. Re-enqueueing resets the job."""
+    now = time.time()
+    conn = _connect(db_path)
+    try:
+        conn.execute(
+            """
+            INSERT INTO jobs (doc_id, file_path, status, attempts, max_attempts, available_at, created_at, updated_at)
+            VALUES (?, ?, ?, 0, ?, ?, ?, ?)
+            ON CONFLICT(doc_id) DO UPDATE SET
+                file_path = excluded.file_path, status = excluded.status, attempts = 0,
+                max_attempts = excluded.max_attempts, error = NULL, worker_pid = NULL, progress = 0, lease_until = NULL,
+                available_at = excluded.available_at, updated_at = excluded.updated_at
+            """,
+            (doc_id, file_path, QUEUED, max(1, max_attempts), now, now, now),
+        )
+    finally:
+        conn.close()
+
+
+def claim_next(worker_pid: int, db_path=None, lease_seconds: float = INGEST_LEASE_SECONDS) -> Optional[Dict]:
+    """Atomically move the oldest runnable queued job to running and return it.
+
+    Running jobs whose lease expired - their worker died without finishing - are
+    requeued first. The claimed job is leased for `lease_seconds`; the worker
+    keeps it with `renew_lease`.
+    """
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _requeue_expired(conn)
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? AND available_at <= ? ORDER BY id LIMIT 1",
+            (QUEUED, time.time()),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        now = time.time()
+        conn.execute(
+            "UPDATE jobs SET status = ?, attempts = attempts + 1, worker_pid = ?, progress = 0, lease_until = ?, "
+            "updated_at = ? WHERE id = ?",
+            (RUNNING, worker_pid, now + lease_seconds, now, row["id"]),
+        )
+        conn.execute("COMMIT")
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def renew_lease(doc_id: str, worker_pid: int, lease_seconds: float = INGEST_LEASE_SECONDS, db_path=None) -> bool:
+    """Extend the lease of a job this worker runs. False if the job was taken away (lease expired)."""
+    conn = _connect(db_path)
+    try:
+        cursor = conn.execute(
+            "UPDATE jobs SET lease_until = ? WHERE doc_id = ? AND status = ? AND worker_pid = ?",
+            (time.time() + lease_seconds, doc_id, RUNNING, worker_pid),
+        )
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def _owner_clause(worker_pid: Optional[int]) -> Tuple[str, tuple]:
+    """Restrict an update to the worker holding the job, if given (its lease may have been taken over)."""
+    if worker_pid is None:
+        return "", ()
+    return " AND status = ? AND worker_pid = ?", (RUNNING, worker_pid)
+
+
+def complete(doc_id: str, db_path=None, worker_pid: Optional[int] = None) -> None:
+    owner, params = _owner_clause(worker_pid)
+    conn = _connect(db_path)
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = NULL, worker_pid = NULL, lease_until = NULL, progress = 100, "
+            "updated_at = ? WHERE doc_id = ?" + owner,
+            (DONE, time.time(), doc_id) + params,
+        )
+    finally:
+        conn.close()
+
+
+def set_progress(doc_id: str, percent: float, db_path=None) -> None:
+    """Record how far a running job has got (0-100)."""
+    conn = _connect(db_path)
+    try:
+        conn.execute(
+            "UPDATE jobs SET progress = ?, updated_at = ? WHERE doc_id = ? AND status = ?",
+            (max(0.0, min(100.0, percent)), time.time(), doc_id, RUNNING),
+        )
+    finally:
+        conn.close()
+
+
+def _fail(conn: sqlite3.Connection, doc_id: str, error: str, retry_delay: float,
+          worker_pid: Optional[int] = None) -> None:
+    owner, params = _owner_clause(worker_pid)
+    row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE doc_id = ?" + owner, (doc_id,) + params).fetchone()
+    if row is None:
+        return
+    now = time.time()
+    if row["attempts"] < row["max_attempts"]:
+        delay = retry_delay * (2 ** max(0, row["attempts"] - 1))
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, worker_pid = NULL, lease_until = NULL, available_at = ?, "
+            "updated_at = ? WHERE doc_id = ?",
+            (QUEUED, error, now + delay, now, doc_id),
+        )
+    else:
+        conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, worker_pid = NULL, lease_until = NULL, updated_at = ? WHERE doc_id = ?",
+            (FAILED, error, now, doc_id),
+        )
+
+
+def fail(doc_id: str, error: str, retry_delay: float = INGEST_RETRY_DELAY, db_path=None,
+         worker_pid: Optional[int] = None) -> None:
+    """Record a failed attempt: requeue with exponential backoff, or mark failed once attempts run out."""
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _fail(conn, doc_id, error, retry_delay, worker_pid)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def _requeue_expired(conn: sqlite3.Connection) -> int:
+    """Fail the attempts of running jobs whose lease expired (call inside a write transaction)."""
+    now = time.time()
+    rows = conn.execute(
+        # Rows from before leases have none: judge those by their last update
+        "SELECT doc_id FROM jobs WHERE status = ? AND COALESCE(lease_until, updated_at + ?) < ?",
+        (RUNNING, INGEST_LEASE_SECONDS, now),
+    ).fetchall()
+    for row in rows:
+        _fail(conn, row["doc_id"], "worker stopped renewing its lease (crashed or killed)", retry_delay=0)
+    return len(rows)
+
+
+def requeue_expired(db_path=None) -> int:
+    """Recover running jobs whose worker died (crash, OOM kill, restart). Returns how many."""
+    conn = _connect(db_path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        count = _requeue_expired(conn)
+        conn.execute("COMMIT")
+        return count
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+
+def get_job(doc_id: str, db_path=None) -> Optional[Dict]:
+    """Return the job for `doc_id` with its 1-based `queue_position` while queued."""
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE doc_id = ?", (doc_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["queue_position"] = None
+        if job["status"] == QUEUED:
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND id < ?", (QUEUED, job["id"])
+            ).fetchone()[0]
+            job["queue_position"] = ahead + 1
+        return job
+    finally:
+        conn.close()
+
+
+def _progress_reporter(doc_id: str, db_path: str):
+    """Progress callback for one job that only writes whole-percent changes."""
+    last = [-1]
+
+    def report(percent: float) -> None:
+        if int(percent) != last[0]:
+            last[0] = int(percent)
+            set_progress(doc_id, percent, db_path)
+
+    return report
+
+
+class _LeaseKeeper:
+    """Renews a job's lease from a background thread while the worker processes it."""
+
+    def __init__(self, doc_id: str, worker_pid: int, db_path: str, logger, lease_seconds: float = INGEST_LEASE_SECONDS):
+        self.doc_id = doc_id
+        self.worker_pid = worker_pid
+        self.db_path = db_path
+        self.logger = logger
+        self.lease_seconds = lease_seconds
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="documind-lease", daemon=True)
+
+    def _run(self) -> None:
+        while not self._done.wait(self.lease_seconds / 3):
+            try:
+                if not renew_lease(self.doc_id, self.worker_pid, self.lease_seconds, self.db_path):
+                    self.logger.warning(f"Worker {self.worker_pid} lost the lease on {self.doc_id}")
+                    return
+            except Exception as exc:
+                self.logger.warning(f"Lease renewal for {self.doc_id} failed: {exc}")
+
+    def __enter__(self) -> "_LeaseKeeper":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._done.set()
+        self._thread.join()
+
+
+def _worker_loop(stop_event, db_path: str, poll_interval: float) -> None:
+    """Entry point of a worker process: claim jobs until `stop_event` is set."""
+    try:
+        from services.documents import process_document
+    except ImportError:
+        from backend.services.documents import process_document
+
+    logger = setup_logging()
+    pid = os.getpid()
+    logger.info(f"Ingestion worker {pid} started")
+    errors = 0
+    while not stop_event.is_set():
+        try:
+            _work_once(stop_event, db_path, poll_interval, pid, logger, process_document)
+        except Exception as exc:
+            # Queue errors must not end the worker: a job whose outcome wasn't recorded
+            # is requeued once its lease expires
+            errors += 1
+            delay = min(QUEUE_ERROR_MAX_BACKOFF, max(poll_interval, 0.1) * 2 ** min(errors, 10))
+            logger.exception(f"Worker {pid} queue error ({errors} in a row), retrying in {delay:.1f}s: {exc}")
+            stop_event.wait(delay)
+        else:
+            errors = 0
+    logger.info(f"Ingestion worker {pid} stopped")
+
+
+def _work_once(stop_event, db_path: str, poll_interval: float, pid: int, logger, process_document) -> None:
+    """Claim and process one job, or wait a poll interval when the queue is empty."""
+    job = claim_next(pid, db_path)
+    if job is None:
+        stop_event.wait(poll_interval)
+        return
+
+    doc_id = job["doc_id"]
+    logger.info(f"Worker {pid} processing {doc_id} (attempt {job['attempts']}/{job['max_attempts']})")
+    try:
+        with _LeaseKeeper(doc_id, pid, db_path, logger):
+            process_document(job["file_path"], doc_id, logger, progress=_progress_reporter(doc_id, db_path))
+    except Exception as exc:
+        fail(doc_id, str(exc)[:500], db_path=db_path, worker_pid=pid)
+    else:
+        complete(doc_id, db_path, worker_pid=pid)
+
+
+class WorkerPool:
+    """Ingestion worker processes, kept out of the web process so parsing and embedding don't compete with requests."""
+
+    def __init__(self, workers: int = INGEST_WORKERS, db_path=None, poll_interval: float = INGEST_POLL_INTERVAL):
+        self.workers = workers
+        self.db_path = str(db_path or JOBS_DB_PATH)
+        self.poll_interval = poll_interval
+        # spawn: never fork a process that already holds model/thread state
+        self._ctx = multiprocessing.get_context("spawn")
+        self._stop = self._ctx.Event()
+        self._processes = []
+
+    def start(self) -> None:
+        requeue_expired(self.db_path)
+        for _ in range(self.workers):
+            # Not daemonic - ingestion may start its own process pool
+            process = self._ctx.Process(
+                target=_worker_loop,
+                args=(self._stop, self.db_path, self.poll_interval),
+                name="documind-ingest",
+            )
+            process.start()
+            self._processes.append(process)
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
+
+
+def elect_app_workers(db_path=None):
+    """Make this process the one app process that runs ingestion workers.
+
+    Returns a lock handle to keep open while the workers run, or None if another
+    process holds it. The lock goes away with its holder, so a restarted app
+    process can take over.
+    """
+    if fcntl is None:
+        return True
+    handle = open(f"{db_path or JOBS_DB_PATH}.workers.lock", "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
@@ -0,0 +1,43 @@
+"""Standalone ingestion workers.
+
+Run with `INGEST_WORKERS=0` on the web process to keep ingestion on separate machines/containers:
+
+    python -m backend.worker --workers 2
+"""
+import argparse
+import signal
+import sys
+import threading
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from backend.core.config import INGEST_WORKERS, configure_api_env, init_storage
+from backend.core.logging import setup_logging
+from backend.services.jobs import WorkerPool
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DocuMind ingestion workers")
+    parser.add_argument("--workers", type=int, default=max(1, INGEST_WORKERS))
+    args = parser.parse_args()
+
+    logger = setup_logging()
+    configure_api_env()
+    init_storage()
+
+    pool = WorkerPool(args.workers)
+    pool.start()
+    logger.info(f"Started {args.workers} ingestion worker(s)")
+
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    signal.signal(signal.SIGINT, lambda *_: stopped.set())
+    stopped.wait()
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""ann_recall.py
+
+Recall@k vs latency of the FaissVectorDB index types against exact (flat) search
+on synthetic clustered corpora.
+
+Vectors are drawn around random cluster centres, which is closer to real chunk
+embeddings than uniform noise. Latency is per single query, as `/query` issues
+them. The 1M corpus needs ~1.5 GB at dim 384 plus ground-truth time on the
+flat index; drop it from `--sizes` on small machines.
+
+Usage (from repo root):
+    python benchmarks/ann_recall.py --sizes 10000,100000,1000000 --queries 200
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+
+def synthetic_corpus(n: int, dim: int, rng, clusters: int = None) -> np.ndarray:
+    clusters = clusters or max(16, n // 1000)
+    centres = rng.standard_normal((clusters, dim)).astype("float32")
+    data = np.empty((n, dim), dtype="float32")
+    step = 100_000
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        labels = rng.integers(0, clusters, stop - start)
+        data[start:stop] = centres[labels] + 0.6 * rng.standard_normal((stop - start, dim)).astype("float32")
+    return data
+
+
+def per_query_latency(index, queries: np.ndarray, k: int) -> list:
+    latencies = []
+    for row in queries:
+        start = time.perf_counter()
+        index.search(row.reshape(1, -1), k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--nprobe", default="1,4,16,64")
+    parser.add_argument("--ef-search", default="16,64,256")
+    args = parser.parse_args()
+
+    import faiss
+    from rag.vectordb import FaissVectorDB, choose_index_type
+
+    rng = np.random.default_rng(0)
+    nprobes = [int(v) for v in args.nprobe.split(",")]
+    efs = [int(v) for v in args.ef_search.split(",")]
+
+    for n in [int(v) for v in args.sizes.split(",")]:
+        corpus = synthetic_corpus(n, args.dim, rng)
+        queries = corpus[rng.choice(n, args.queries, replace=False)] + 0.1 * rng.standard_normal(
+            (args.queries, args.dim)).astype("float32")
+        faiss.normalize_L2(queries)
+        texts = [""] * n
+        print(f"\n== n={n} dim={args.dim} (auto -> {choose_index_type(n)})")
+        print(f"{'index':<10} {'param':<14} {'build s':>8} {'recall@' + str(args.k):>10} {'p50 ms':>8} {'p99 ms':>8}")
+
+        truth = None
+        for index_type, sweep in (("flat", [None]), ("ivf_flat", nprobes), ("ivf_pq", nprobes), ("hnsw", efs)):
+            start = time.perf_counter()
+            db = FaissVectorDB(args.dim, index_type=index_type)
+            db.add(corpus, texts)
+            build = time.perf_counter() - start
+            for value in sweep:
+                label = "-"
+                if index_type.startswith("ivf"):
+                    db.set_search_params(nprobe=value)
+                    label = f"nprobe={value}"
+                elif index_type == "hnsw":
+                    db.set_search_params(ef_search=value)
+                    label = f"efSearch={value}"
+                _, found = db.index.search(queries, args.k)
+                if truth is None:
+                    truth = found
+                latencies = sorted(per_query_latency(db.index, queries, args.k))
+                p99 = latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))]
+                print(f"{db.index_type:<10} {label:<14} {build:8.2f} {recall(found, truth):10.3f} "
+                      f"{statistics.median(latencies):8.3f} {p99:8.3f}")
+            del db
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""embedding_throughput.py
+
+Embedding throughput on CPU: ingest chunks/sec per batch size, and query
+embeddings/sec at several concurrency levels with and without the micro-batcher.
+
+Usage (from repo root):
+    python benchmarks/embedding_throughput.py --chunks 512 --queries 256
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+# Keep the comparison on CPU even where a GPU is visible.
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")
+
+
+def chunk_texts(count: int) -> list:
+    sentence = "Quarterly revenue grew in the northern region while operating costs stayed flat. "
+    return [f"Chunk {i}. " + sentence * (4 + i % 6) for i in range(count)]
+
+
+def query_texts(count: int) -> list:
+    return [f"What happened to revenue in region {i}?" for i in range(count)]
+
+
+def bench_ingest(inner, chunks: list, batch_sizes: list) -> None:
+    from rag.embedding_service import BatchedEmbeddings
+
+    print(f"ingest: {len(chunks)} chunks")
+    for batch_size in batch_sizes:
+        service = BatchedEmbeddings(inner, batch_size=batch_size, window_ms=0)
+        start = time.perf_counter()
+        service.embed_documents(chunks)
+        elapsed = time.perf_counter() - start
+        print(f"  batch_size={batch_size:<4} {len(chunks) / elapsed:8.1f} chunks/sec")
+
+
+def bench_queries(inner, questions: list, concurrency_levels: list, window_ms: float) -> None:
+    from rag.embedding_service import BatchedEmbeddings
+
+    print(f"queries: {len(questions)} questions, batcher window {window_ms} ms")
+    for concurrency in concurrency_levels:
+        row = []
+        for label, window in (("single", 0), ("batched", window_ms)):
+            service = BatchedEmbeddings(inner, window_ms=window)
+            service.embed_query("warmup")
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                start = time.perf_counter()
+                list(pool.map(service.embed_query, questions))
+                elapsed = time.perf_counter() - start
+            extra = ""
+            if service.batcher is not None:
+                extra = f" (avg batch {service.batcher.stats()['avg_batch']})"
+            row.append(f"{label} {len(questions) / elapsed:8.1f} q/s{extra}")
+        print(f"  concurrency={concurrency:<3} " + " | ".join(row))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--batch-sizes", default="1,8,32,64,128")
+    parser.add_argument("--concurrency", default="1,4,16,64")
+    parser.add_argument("--window-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    from rag.embedding_registry import get_embeddings, warmup
+
+    print(f"model load + warmup: {warmup() * 1000:.1f} ms")
+    inner = get_embeddings()
+
+    bench_ingest(inner, chunk_texts(args.chunks), [int(b) for b in args.batch_sizes.split(",")])
+    bench_queries(inner, query_texts(args.queries), [int(c) for c in args.concurrency.split(",")], args.window_ms)
+
+
+if __name__ == "__main__":
+    main()
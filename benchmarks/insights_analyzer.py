@@ -0,0 +1,118 @@
+"""insights_analyzer.py
+
+Rule-based insights on large synthetic documents: the streaming single-pass
+`TextAnalyzer` against the multi-pass analyzer it replaced, which scanned the
+joined text once per feature.
+
+Usage (from repo root):
+    python benchmarks/insights_analyzer.py --pages 100,500,2000
+"""
+import argparse
+import random
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+SENTENCES = [
+    "Quarterly revenue at Northwind Traders grew while operating costs stayed flat.",
+    "The board of Contoso Ltd met on March 14, 2023 to review the audit findings.",
+    "Management should renegotiate the supplier contracts before the next fiscal year.",
+    "Dr Maria Lopez of Stanford University presented the results on 04/11/2023.",
+    "Action: the finance team will publish the restated figures by the end of the month.",
+    "Shipping volumes through the Rotterdam hub fell sharply in the third quarter.",
+    "Analysts at Fabrikam Inc expect margins to recover as input prices normalise.",
+    "the appendix lists every regional office together with its headcount and budget.",
+]
+
+
+def synthetic_pages(count: int, words_per_page: int = 450, seed: int = 7) -> list:
+    rng = random.Random(seed)
+    pages = []
+    for number in range(count):
+        sentences, words = [f"Page {number + 1} of the Annual Report."], 0
+        while words < words_per_page:
+            sentence = rng.choice(SENTENCES)
+            sentences.append(sentence)
+            words += sentence.count(" ") + 1
+        pages.append(" ".join(sentences))
+    return pages
+
+
+def legacy_insights(text: str) -> dict:
+    """The multi-pass analyzer replaced by `TextAnalyzer` (one scan of the joined text per feature)."""
+    sentences = [s.strip() for s in re.split(r'[.!?]+', text) if len(s.strip()) > 20]
+    summary = '. '.join(sentences[:3]) + '.' if sentences else "Document processed successfully."
+    word_freq = {}
+    for w in re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', text):
+        if len(w) > 3:
+            word_freq[w] = word_freq.get(w, 0) + 1
+    topics = sorted(word_freq, key=lambda x: word_freq[x], reverse=True)[:5]
+    dates = []
+    for pattern in (r"\b\d{1,2}/\d{1,2}/\d{2,4}\b", r"\b\d{1,2}-\d{1,2}-\d{2,4}\b",
+                    r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b"):
+        dates.extend(re.findall(pattern, text))
+    orgs = []
+    for sentence in text.split('.')[:10]:
+        for keyword in ["Inc", "Corp", "Ltd", "LLC", "Company", "University", "Institute", "Center"]:
+            if keyword in sentence:
+                words = sentence.split()
+                idx = next((i for i, w in enumerate(words) if keyword in w), -1)
+                if idx >= 0:
+                    orgs.append(' '.join(words[max(0, idx - 2): idx + 1]).strip())
+    actions = []
+    for pattern in (r'(?:should|must|need to|required to|recommend|suggest)[^.]*\.',
+                    r'(?:action|task|todo|step)[\s:]+[^.]*\.'):
+        actions.extend(m.strip()[:100] for m in re.findall(pattern, text, re.IGNORECASE)[:2])
+    reading_words = len(text.split())
+    words = text.split()
+    avg_len = sum(len(word) for word in words) / len(words) if words else 0
+    return {"summary": summary, "key_topics": topics, "dates": list(dict.fromkeys(dates))[:3],
+            "organizations": list(dict.fromkeys(orgs))[:3], "action_items": actions[:5],
+            "words": reading_words, "avg_len": avg_len}
+
+
+def measure(label: str, run) -> tuple:
+    start = time.perf_counter()
+    result = run()
+    elapsed = time.perf_counter() - start
+    # Separate run for memory: tracing slows Python code down several times
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return label, elapsed, peak, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--pages", default="100,500,2000")
+    parser.add_argument("--words-per-page", type=int, default=450)
+    parser.add_argument("--show", action="store_true", help="print both analyzers' topics and entities")
+    args = parser.parse_args()
+
+    from rag.text_analyzer import analyze_text
+
+    for count in [int(p) for p in args.pages.split(",")]:
+        pages = synthetic_pages(count, args.words_per_page)
+        size_mb = sum(map(len, pages)) / 1e6
+        print(f"{count} pages ({size_mb:.1f} MB)")
+        runs = [
+            # The legacy analyzer needs the joined text, so joining counts against it
+            measure("multi-pass", lambda: legacy_insights("\n\n".join(pages))),
+            measure("single-pass", lambda: analyze_text(iter(pages)).result()),
+        ]
+        for label, elapsed, peak, result in runs:
+            print(f"  {label:<12} {elapsed * 1000:9.1f} ms  {size_mb / elapsed:7.1f} MB/s  peak {peak / 1e6:7.1f} MB")
+            if args.show:
+                entities = result.get("entities") or {k: result[k] for k in ("dates", "organizations")}
+                print(f"    topics {result['key_topics']}\n    entities {entities}\n    actions {result['action_items']}")
+
+
+if __name__ == "__main__":
+    main()
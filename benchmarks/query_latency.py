@@ -0,0 +1,89 @@
+"""query_latency.py
+
+Cold vs warm `/query` latency benchmark for the embedding registry.
+
+"cold" clears the registry before every request, which reproduces the old
+behaviour of building HuggingFaceEmbeddings on each call. "warm" reuses the
+model loaded once at startup.
+
+Usage (from repo root):
+    python benchmarks/query_latency.py --requests 20
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+# Measure the warmup explicitly below instead of inside the app import.
+os.environ["EMBEDDING_WARMUP"] = "false"
+
+
+def percentile(values, pct: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[idx]
+
+
+def run(client, doc_id: str, question: str, requests: int, cold: bool) -> list:
+    from rag import embedding_registry, embedding_service
+
+    latencies = []
+    for _ in range(requests):
+        if cold:
+            embedding_registry.clear()
+            embedding_service.clear()
+        start = time.perf_counter()
+        resp = client.post("/query", data={"question": question, "doc_id": doc_id})
+        latencies.append((time.perf_counter() - start) * 1000)
+        resp.raise_for_status()
+    return latencies
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--pdf", default=str(ROOT_DIR / "rag" / "uploads" / "test_document.pdf"))
+    parser.add_argument("--question", default="What topics does the document discuss?")
+    parser.add_argument("--requests", type=int, default=20)
+    args = parser.parse_args()
+
+    from fastapi.testclient import TestClient
+    from backend.app import app
+    from rag import embedding_registry, embedding_service, query
+    from rag.ingest import ingest_pdf
+
+    # Retrieval only - keep the LLM round trip out of the numbers.
+    os.environ.pop("OPENAI_API_KEY", None)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        doc_id = "bench-query-latency"
+        ingest_pdf(args.pdf, doc_id, persist_dir=tmp)
+        query.DB_DIR = Path(tmp)
+
+        embedding_registry.clear()
+        embedding_service.clear()
+        startup = embedding_registry.warmup()
+
+        client = TestClient(app)
+        results = {
+            "cold": run(client, doc_id, args.question, args.requests, cold=True),
+            "warm": run(client, doc_id, args.question, args.requests, cold=False),
+        }
+
+    print(f"startup warmup: {startup * 1000:.1f} ms")
+    print(f"{'mode':<6} {'n':>4} {'p50 ms':>10} {'p99 ms':>10} {'mean ms':>10}")
+    for mode, values in results.items():
+        print(f"{mode:<6} {len(values):>4} {percentile(values, 50):>10.1f} "
+              f"{percentile(values, 99):>10.1f} {statistics.mean(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
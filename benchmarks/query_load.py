@@ -0,0 +1,91 @@
+"""query_load.py
+
+Concurrent `/query` load test: async execution path vs the old blocking handler.
+
+Runs the app in-process against the stub LLM server (fixed generation delay) and
+fires requests at several concurrency levels. The blocking variant calls
+`query_doc` straight from the event loop, so its throughput stays flat; the async
+`/query` should scale with concurrency.
+
+Usage (from repo root):
+    python benchmarks/query_load.py --delay 0.5 --levels 1 4 16
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+BENCH_DIR = Path(__file__).resolve().parent
+if str(BENCH_DIR) not in sys.path:
+    sys.path.insert(0, str(BENCH_DIR))
+
+
+async def fire(client, path: str, doc_id: str, question: str, concurrency: int, requests: int):
+    latencies = []
+
+    async def worker(n):
+        for _ in range(n):
+            start = time.perf_counter()
+            resp = await client.post(path, data={"question": question, "doc_id": doc_id})
+            resp.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    per_worker = max(1, requests // concurrency)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(per_worker) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, statistics.median(latencies)
+
+
+async def run(args) -> None:
+    import httpx
+    from fastapi import Form
+    from stub_llm_server import serve
+
+    server = serve(delay=args.delay)
+    os.environ["OPENAI_API_KEY"] = "stub"
+    os.environ["OPENAI_API_BASE"] = f"http://127.0.0.1:{server.server_port}/v1"
+
+    from backend.app import app
+    from rag import query
+    from rag.ingest import ingest_pdf
+
+    @app.post("/query_blocking")
+    async def query_blocking(question: str = Form(...), doc_id: str = Form(...)):
+        return query.query_doc(doc_id, question)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        doc_id = "bench-query-load"
+        ingest_pdf(args.pdf, doc_id, persist_dir=tmp)
+        query.DB_DIR = Path(tmp)
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            print(f"{'handler':<15} {'conc':>5} {'req/s':>8} {'p50 s':>8}")
+            for path in ("/query_blocking", "/query"):
+                for level in args.levels:
+                    rps, p50 = await fire(client, path, doc_id, args.question, level, level * args.per_level)
+                    print(f"{path:<15} {level:>5} {rps:>8.2f} {p50:>8.2f}")
+    server.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Concurrent /query load test")
+    parser.add_argument("--pdf", default=str(ROOT_DIR / "rag" / "uploads" / "test_document.pdf"))
+    parser.add_argument("--question", default="What topics does the document discuss?")
+    parser.add_argument("--delay", type=float, default=0.5, help="stub LLM latency in seconds")
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--per-level", type=int, default=4, help="requests per concurrent client")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""stub_llm_server.py
+
+Minimal OpenAI-compatible chat completions server for local benchmarks.
+
+Every request sleeps `--delay` seconds to simulate generation latency and then
+answers with a fixed completion (word by word over SSE when `stream` is set).
+A `--fail-rate` share of requests gets a 503 instead, to exercise retries;
+`--model-delay name=seconds` and `--fail-model name` make single models slow or
+down, to exercise model routing. The
+server counts `requests` and TCP `connections`, so tests can check that clients
+keep connections alive. Point the app at it with:
+
+    OPENAI_API_KEY=stub OPENAI_API_BASE=http://127.0.0.1:8900/v1
+
+Usage:
+    python benchmarks/stub_llm_server.py --port 8900 --delay 0.5
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Optional
+import argparse
+import json
+import random
+import threading
+import time
+
+ANSWER = "This is a stubbed answer generated for benchmarking."
+
+
+def make_handler(delay: float, fail_rate: float = 0.0, model_delays: Optional[Dict[str, float]] = None,
+                 failing_models: Iterable[str] = ()):
+    model_delays = model_delays or {}
+    failing_models = set(failing_models)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def setup(self):
+            super().setup()
+            with self.server.stats_lock:
+                self.server.connections += 1
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            model = request.get("model", "stub")
+            with self.server.stats_lock:
+                self.server.requests += 1
+                self.server.model_requests[model] = self.server.model_requests.get(model, 0) + 1
+            if model in failing_models or (fail_rate and random.random() < fail_rate):
+                self._fail()
+                return
+            if request.get("stream"):
+                self._stream(request)
+                return
+            time.sleep(model_delays.get(model, delay))
+            body = json.dumps({
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": ANSWER},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _fail(self):
+            body = json.dumps({"error": {"message": "stub overloaded", "type": "server_error"}}).encode()
+            self.send_response(503)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _stream(self, request):
+            """Send the answer word by word as SSE chunks, spreading `delay` across them."""
+            words = ANSWER.split(" ")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+            for i, word in enumerate(words + [None]):
+                time.sleep(model_delays.get(request.get("model"), delay) / (len(words) + 1))
+                chunk = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": request.get("model", "stub"),
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": word + " " if i < len(words) - 1 else word} if word else {},
+                        "finish_reason": None if word else "stop",
+                    }],
+                }
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+    return Handler
+
+
+def make_server(port: int = 0, delay: float = 0.5, fail_rate: float = 0.0,
+                model_delays: Optional[Dict[str, float]] = None, failing_models: Iterable[str] = ()) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(delay, fail_rate, model_delays, failing_models))
+    server.daemon_threads = True
+    server.stats_lock = threading.Lock()
+    server.requests = 0
+    server.model_requests = {}
+    server.connections = 0
+    return server
+
+
+def serve(port: int = 0, delay: float = 0.5, fail_rate: float = 0.0,
+          model_delays: Optional[Dict[str, float]] = None, failing_models: Iterable[str] = ()) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread and return the server (`server.server_port` has the port)."""
+    server = make_server(port, delay, fail_rate, model_delays, failing_models)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub OpenAI-compatible LLM server")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--delay", type=float, default=0.5)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of requests answered with a 503")
+    parser.add_argument("--model-delay", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="per-model delay, repeatable")
+    parser.add_argument("--fail-model", action="append", default=[], metavar="MODEL",
+                        help="model that always answers 503, repeatable")
+    args = parser.parse_args()
+    model_delays = {name: float(seconds) for name, seconds in (item.rsplit("=", 1) for item in args.model_delay)}
+    print(f"Stub LLM listening on http://127.0.0.1:{args.port}/v1 (delay {args.delay}s, fail rate {args.fail_rate})")
+    make_server(args.port, args.delay, args.fail_rate, model_delays, args.fail_model).serve_forever()
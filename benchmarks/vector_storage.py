@@ -0,0 +1,105 @@
+"""vector_storage.py
+
+Memory and recall of FaissVectorDB vector storage modes (float32 / fp16 / int8)
+and of the compact chunk-text store against a plain list of strings.
+
+Recall@k is measured against exact float32 search on a synthetic clustered
+corpus (see ann_recall.py). Index memory is the serialized index size, which
+for these index types is what stays resident.
+
+Usage (from repo root):
+    python benchmarks/vector_storage.py --n 100000 --dim 384
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from ann_recall import per_query_latency, recall, synthetic_corpus  # noqa: E402
+
+
+def mb(nbytes: int) -> float:
+    return nbytes / (1024 * 1024)
+
+
+def bench_vectors(corpus: np.ndarray, queries: np.ndarray, k: int) -> None:
+    import faiss
+    from rag.vectordb import FaissVectorDB
+
+    texts = [""] * len(corpus)
+    print(f"{'index':<6} {'storage':<8} {'MB':>8} {'recall@' + str(k):>10} {'p50 ms':>8}")
+    truth = None
+    for index_type in ("flat", "hnsw"):
+        for storage in ("float32", "fp16", "int8"):
+            db = FaissVectorDB(corpus.shape[1], index_type=index_type, storage=storage)
+            db.add(corpus, texts)
+            _, found = db.index.search(queries, k)
+            if truth is None:
+                truth = found  # flat float32 runs first: exact results
+            size = len(faiss.serialize_index(db.index))
+            latency = statistics.median(per_query_latency(db.index, queries, k))
+            print(f"{index_type:<6} {storage:<8} {mb(size):8.1f} {recall(found, truth):10.3f} {latency:8.3f}")
+
+
+def bench_texts(n: int, chunk_chars: int) -> None:
+    from rag.vectordb import ChunkStore
+
+    base = "Revenue in the northern region grew while costs stayed flat; see table 4. "
+    chunks = [(f"[{i}] " + base * (chunk_chars // len(base) + 1))[:chunk_chars] for i in range(n)]
+
+    tracemalloc.start()
+    as_list = list(chunks)
+    list_bytes = sys.getsizeof(as_list) + sum(sys.getsizeof(c) for c in as_list)
+    store = ChunkStore.from_texts(chunks)
+    del chunks, as_list
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store.save(tmp)
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        mapped = ChunkStore.load(tmp, mmap=True)
+        load_ms = (time.perf_counter() - start) * 1000
+        mapped_heap = tracemalloc.get_traced_memory()[0] - before
+        assert mapped[n - 1] == store[n - 1]
+        del mapped
+    tracemalloc.stop()
+
+    print(f"\nchunk texts: {n} x {chunk_chars} chars")
+    print(f"  list[str]          {mb(list_bytes):8.1f} MB")
+    print(f"  ChunkStore         {mb(store.nbytes):8.1f} MB")
+    print(f"  ChunkStore (mmap)  {mb(mapped_heap):8.1f} MB on the heap, opened in {load_ms:.2f} ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[2])
+    parser.add_argument("--n", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--chunk-chars", type=int, default=800)
+    args = parser.parse_args()
+
+    import faiss
+
+    rng = np.random.default_rng(0)
+    corpus = synthetic_corpus(args.n, args.dim, rng)
+    queries = corpus[rng.choice(args.n, args.queries, replace=False)].copy()
+    faiss.normalize_L2(queries)
+
+    print(f"vectors: n={args.n} dim={args.dim}")
+    bench_vectors(corpus, queries, args.k)
+    bench_texts(args.n, args.chunk_chars)
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ export default function InsightsSection({ docId }) {
   const [metadata, setMetadata] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
+  const [progress, setProgress] = useState(null);
 
   useEffect(() => {
     let timer;
@@ -23,8 +24,12 @@ export default function InsightsSection({ docId }) {
           setInsights(data.insights);
           setMetadata(data.metadata);
           setStatus('ready');
+        } else if (data.status === 'failed') {
+          setStatus('error');
+          setError(data.error || 'Document processing failed.');
         } else {
           setStatus('processing');
+          setProgress(typeof data.progress === 'number' ? data.progress : null);
           timer = setTimeout(pollInsights, POLL_INTERVAL);
         }
       } catch (err) {
@@ -72,7 +77,11 @@ export default function InsightsSection({ docId }) {
           <div className="flex justify-center">
             <div className="w-10 h-10 border-4 border-purple-400 border-t-transparent rounded-full animate-spin" />
           </div>
-          <p className="text-gray-400 mt-4">This can take a few seconds depending on document size.</p>
+          <p className="text-gray-400 mt-4">
+            {progress
+              ? `${Math.round(progress)}% indexed - you can already ask questions about the pages processed so far.`
+              : 'This can take a few seconds depending on document size.'}
+          </p>
         </div>
       </div>
     );
@@ -0,0 +1,159 @@
+"""answer_cache.py
+
+Per-document answer cache for repeated questions.
+
+Answers are keyed on `(doc_id, normalized question)`. With a similarity threshold
+set, a near-duplicate question (cosine similarity of the question embeddings) is
+served from the cache too. A hit skips both retrieval and generation.
+
+Entries carry the document's ingest version (see `chroma_pool.read_version`), so a
+re-ingest in any process makes older answers stale.
+"""
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+import json
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+
+DEFAULT_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_SIZE", "1024"))
+DEFAULT_MAX_BYTES = int(float(os.getenv("ANSWER_CACHE_MAX_MB", "32")) * 1024 * 1024)
+DEFAULT_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+# 0 disables near-duplicate matching (exact normalized question only)
+DEFAULT_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    return _WHITESPACE.sub(" ", question.strip().lower()).rstrip("?.! ")
+
+
+class _Entry:
+    __slots__ = ("answer", "version", "embedding", "created", "size")
+
+    def __init__(self, answer: Dict, version: int, embedding: Optional[np.ndarray]):
+        self.answer = answer
+        self.version = version
+        self.embedding = embedding
+        self.created = time.monotonic()
+        self.size = len(json.dumps(answer, default=str)) + (embedding.nbytes if embedding is not None else 0)
+
+
+class AnswerCache:
+    """Thread-safe LRU with TTL, an entry cap and a byte budget."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, max_bytes: int = DEFAULT_MAX_BYTES,
+                 ttl: float = DEFAULT_TTL, similarity_threshold: float = DEFAULT_SIMILARITY):
+        self.max_entries = max(1, max_entries)
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, key: Tuple[str, str]) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def _fresh(self, entry: _Entry, version: int) -> bool:
+        return entry.version == version and (self.ttl <= 0 or time.monotonic() - entry.created < self.ttl)
+
+    def lookup(self, doc_id: str, question: str, version: int,
+               embed: Optional[Callable[[str], list]] = None,
+               count_miss: bool = True) -> Tuple[Optional[Dict], Optional[np.ndarray]]:
+        """Return `(answer, embedding)`.
+
+        `embed` is only called for the near-duplicate check; the embedding is handed
+        back so retrieval can reuse it on a miss. Pass `count_miss=False` for an
+        exact-match probe that a near-duplicate lookup of the same question follows.
+        """
+        key = (doc_id, normalize_question(question))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if self._fresh(entry, version):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return dict(entry.answer), None
+                self._remove(key)
+
+        if self.similarity_threshold <= 0 or embed is None:
+            if count_miss:
+                with self._lock:
+                    self.misses += 1
+            return None, None
+
+        embedding = _unit(embed(question))
+        with self._lock:
+            best_key, best_score = None, self.similarity_threshold
+            for other_key, other in self._entries.items():
+                if other_key[0] != doc_id or other.embedding is None or not self._fresh(other, version):
+                    continue
+                score = float(np.dot(embedding, other.embedding))
+                if score >= best_score:
+                    best_key, best_score = other_key, score
+            if best_key is not None:
+                self._entries.move_to_end(best_key)
+                self.semantic_hits += 1
+                return dict(self._entries[best_key].answer), embedding
+            self.misses += 1
+        return None, embedding
+
+    def put(self, doc_id: str, question: str, version: int, answer: Dict,
+            embedding: Optional[np.ndarray] = None) -> None:
+        key = (doc_id, normalize_question(question))
+        entry = _Entry(dict(answer), version, _unit(embedding) if embedding is not None else None)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += entry.size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, doc_id: str) -> None:
+        """Drop every cached answer for `doc_id` (called on re-ingest)."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == doc_id]:
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+def _unit(vector) -> np.ndarray:
+    vec = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> AnswerCache:
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = AnswerCache()
+    return _cache
@@ -0,0 +1,244 @@
+"""chroma_pool.py
+
+Shared Chroma clients and collection handles.
+
+Opening a persistent Chroma store re-reads its SQLite metadata, which costs more
+than the similarity search itself. One client is kept per persist directory and
+collection handles live in an LRU keyed by `(persist_dir, doc_id)`.
+
+Re-ingesting a document writes a version stamp next to the store, so handles
+cached by any process (e.g. other uvicorn workers) are reopened on next use.
+Ingestion also stamps after every batch it writes. Chroma keeps a collection's
+vector segment in memory once opened and doesn't see vectors other processes
+add later, so a stale handle is reopened on a new client (chromadb System) for
+its persist directory. Handles to other documents stay on the client they were
+opened with. A replaced client is stopped once no pooled handle uses it any
+more (after `RETIRED_GRACE_SECONDS`, for callers still holding a handle).
+"""
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import os
+import threading
+import time
+
+try:
+    import chromadb
+    from chromadb.api import ServerAPI
+    from chromadb.api.client import Client as ChromaClient
+    from chromadb.config import Settings, System
+except Exception:
+    chromadb = None
+
+try:
+    from langchain_community.vectorstores import Chroma
+except ImportError:
+    from langchain.vectorstores import Chroma
+
+from .embedding_service import get_embedding_service
+
+
+DEFAULT_POOL_SIZE = int(os.getenv("CHROMA_POOL_SIZE", "64"))
+# Shared collection holding every document's chunks, tagged with a `doc_id` metadata field
+CORPUS_COLLECTION = "documind_corpus"
+VERSIONS_DIR = ".versions"
+# Seconds a replaced client stays open after its last pooled handle is gone
+RETIRED_GRACE_SECONDS = 30.0
+
+
+def _version_path(persist_dir: str, doc_id: str) -> Path:
+    return Path(persist_dir) / VERSIONS_DIR / doc_id
+
+
+def read_version(persist_dir: str, doc_id: str) -> int:
+    """Return the ingest stamp of `doc_id` (0 if it was never stamped)."""
+    try:
+        return _version_path(persist_dir, doc_id).stat().st_mtime_ns
+    except OSError:
+        return 0
+
+
+def bump_version(persist_dir: str, doc_id: str) -> None:
+    path = _version_path(persist_dir, doc_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(str(time.time_ns()), encoding="utf-8")
+
+
+class _Generation:
+    """One chromadb client (and its System) for a persist directory, with the pooled handles on it."""
+
+    def __init__(self, persist_dir: str):
+        # A System of our own rather than the one chromadb shares per path, so it can be replaced alone
+        self.system = System(Settings(is_persistent=True, persist_directory=persist_dir))
+        self.system.instance(ServerAPI)
+        self.system.start()
+        self.client = ChromaClient.from_system(self.system)
+        self.handles = 0
+        self.idle_since: Optional[float] = None
+
+    def stop(self) -> None:
+        try:
+            self.system.stop()
+        except Exception:
+            pass
+
+
+class ChromaPool:
+    """Thread-safe LRU of Chroma collection handles with a size cap."""
+
+    def __init__(self, max_size: int = DEFAULT_POOL_SIZE):
+        self.max_size = max(1, max_size)
+        self._lock = threading.Lock()
+        self._clients: Dict[str, _Generation] = {}
+        self._retired: List[_Generation] = []
+        self._handles: "OrderedDict[Tuple[str, str], Tuple[Chroma, int, Optional[_Generation]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.refreshes = 0
+
+    @staticmethod
+    def _key(persist_dir: str, doc_id: str) -> Tuple[str, str]:
+        return str(Path(persist_dir).resolve()), doc_id
+
+    def _generation(self, persist_dir: str) -> Optional[_Generation]:
+        generation = self._clients.get(persist_dir)
+        if generation is None and chromadb is not None:
+            generation = _Generation(persist_dir)
+            self._clients[persist_dir] = generation
+        return generation
+
+    def _client(self, persist_dir: str):
+        generation = self._generation(persist_dir)
+        return generation.client if generation is not None else None
+
+    def _open(self, persist_dir: str, doc_id: str) -> Tuple[Chroma, Optional[_Generation]]:
+        generation = self._generation(persist_dir)
+        if generation is None:
+            return Chroma(
+                persist_directory=persist_dir,
+                embedding_function=get_embedding_service(),
+                collection_name=doc_id,
+            ), None
+        generation.handles += 1
+        return Chroma(
+            client=generation.client,
+            embedding_function=get_embedding_service(),
+            collection_name=doc_id,
+        ), generation
+
+    def _release(self, entry: Tuple) -> None:
+        """A pooled handle is gone (lock held); note when a replaced client has none left."""
+        generation = entry[2]
+        if generation is not None:
+            generation.handles -= 1
+            if generation.handles <= 0 and generation in self._retired:
+                generation.idle_since = time.monotonic()
+
+    def _renew_client(self, persist_dir: str) -> None:
+        """Open a new client for `persist_dir`, which loads segments from disk (lock held)."""
+        old = self._clients.pop(persist_dir, None)
+        if old is not None:
+            self._retired.append(old)
+            if old.handles <= 0:
+                old.idle_since = time.monotonic()
+        self.refreshes += 1
+
+    def _reap(self) -> None:
+        """Stop replaced clients without pooled handles once the grace period is over (lock held)."""
+        now = time.monotonic()
+        for generation in list(self._retired):
+            if generation.handles <= 0 and generation.idle_since is not None \
+                    and now - generation.idle_since >= RETIRED_GRACE_SECONDS:
+                self._retired.remove(generation)
+                generation.stop()
+
+    def get(self, persist_dir: str, doc_id: str) -> Chroma:
+        """Return a (possibly cached) Chroma handle for collection `doc_id`."""
+        key = self._key(persist_dir, doc_id)
+        version = read_version(key[0], doc_id)
+        with self._lock:
+            entry = self._handles.get(key)
+            if entry is not None and entry[1] == version:
+                self._handles.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            if entry is not None:
+                # Written to since we opened it, possibly by another process
+                self._release(self._handles.pop(key))
+                self._renew_client(key[0])
+            handle, generation = self._open(key[0], doc_id)
+            self._handles[key] = (handle, version, generation)
+            self._handles.move_to_end(key)
+            while len(self._handles) > self.max_size:
+                self._release(self._handles.popitem(last=False)[1])
+                self.evictions += 1
+            self._reap()
+            return handle
+
+    def read_collection(self, persist_dir: str, doc_id: str):
+        """Return the raw chromadb collection behind the pooled handle for `doc_id`.
+
+        Refreshed like `get`; for reads with precomputed embeddings, such as one
+        query for many vectors.
+        """
+        return self.get(persist_dir, doc_id)._collection
+
+    def collection(self, persist_dir: str, name: str):
+        """Return the raw chromadb collection `name` for writes with precomputed embeddings."""
+        key = self._key(persist_dir, name)
+        with self._lock:
+            client = self._client(key[0])
+        if client is None:
+            raise RuntimeError("chromadb not installed. pip install chromadb")
+        return client.get_or_create_collection(name, embedding_function=None)
+
+    def invalidate(self, persist_dir: str, doc_id: str) -> None:
+        """Drop the cached handle for `doc_id` in this process."""
+        with self._lock:
+            entry = self._handles.pop(self._key(persist_dir, doc_id), None)
+            if entry is not None:
+                self._release(entry)
+
+    def reset(self, persist_dir: str, doc_id: str) -> None:
+        """Delete the collection before a re-ingest and invalidate every cached handle to it."""
+        key = self._key(persist_dir, doc_id)
+        with self._lock:
+            entry = self._handles.pop(key, None)
+            if entry is not None:
+                self._release(entry)
+            client = self._client(key[0])
+            if client is not None:
+                try:
+                    client.delete_collection(doc_id)
+                except Exception:
+                    pass  # first ingest - nothing to delete
+        bump_version(key[0], doc_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "size": len(self._handles),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "refreshes": self.refreshes,
+                "retired_clients": len(self._retired),
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ChromaPool:
+    """Return the process-wide pool shared by ingestion and querying."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ChromaPool()
+    return _pool
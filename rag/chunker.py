@@ -1,23 +1,145 @@
 """chunker.py
 
-Simple text chunking utilities for RAG.
+Token-aware text chunking shared by ingestion and the FAISS QA flow.
+
+Chunks are sized in the embedding model's own tokens, so none overflows its
+input window (all-MiniLM-L6-v2 silently truncates past 256 tokens), and are cut
+on sentence and paragraph boundaries. Consecutive chunks share up to
+`overlap_tokens` tokens of whole sentences.
+
+`iter_chunk_spans` walks the text lazily and yields `(start, end)` offsets, so a
+multi-MB text is never copied into a full list of chunks; sentences are
+tokenized in batches rather than one call each.
 """
-from typing import List
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+import os
+import re
+import threading
+
+from .embedding_registry import DEFAULT_MODEL, get_sentence_transformer
+
+
+DEFAULT_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+DEFAULT_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+# Sentence ends (followed by whitespace) and blank lines
+_BOUNDARY = re.compile(r"(?<=[.!?])[\"')\]]*\s+|\n\s*\n")
+_WORD = re.compile(r"\S+")
+
+# Sentences tokenized per call; the fast tokenizers encode a batch in parallel
+COUNT_BATCH = 512
 
+_lock = threading.Lock()
+_counters: Dict[str, Tuple[Callable[[List[str]], List[int]], Optional[int]]] = {}
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 200) -> List[str]:
-    """Break text into chunks of approximately `chunk_size` characters with `overlap`.
 
-    This is a simple, tokenizer-agnostic approach suitable for quick demos.
+def _approx_tokens(texts: List[str]) -> List[int]:
+    # ~4 characters per token for English with WordPiece/BPE vocabularies
+    return [len(text) // 4 + 1 for text in texts]
+
+
+def token_counter(model_name: str = DEFAULT_MODEL) -> Tuple[Callable[[List[str]], List[int]], Optional[int]]:
+    """Return `(count_tokens, window)` for `model_name`'s tokenizer.
+
+    `count_tokens` maps a list of texts to their token counts. `window` is the
+    model's max sequence length without special tokens, or None when the
+    tokenizer can't be loaded and counts are approximated.
     """
-    if len(text) <= chunk_size:
-        return [text]
+    entry = _counters.get(model_name)
+    if entry is not None:
+        return entry
+
+    with _lock:
+        entry = _counters.get(model_name)
+        if entry is None:
+            try:
+                model = get_sentence_transformer(model_name)
+                tokenizer = model.tokenizer
+
+                def count(texts: List[str]) -> List[int]:
+                    if not texts:
+                        return []
+                    encoded = tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]
+                    return [len(ids) for ids in encoded]
+
+                window = getattr(model, "max_seq_length", None)
+                entry = (count, window - 2 if window else None)
+            except Exception as e:
+                print(f"Tokenizer for {model_name} unavailable ({e}), approximating token counts")
+                entry = (_approx_tokens, None)
+            _counters[model_name] = entry
+    return entry
 
-    chunks = []
+
+def _sentences(text: str) -> Iterator[Tuple[int, int]]:
     start = 0
-    L = len(text)
-    while start < L:
-        end = min(start + chunk_size, L)
-        chunks.append(text[start:end])
-        start = max(start + chunk_size - overlap, end)
-    return chunks
+    for match in _BOUNDARY.finditer(text):
+        if match.start() > start:
+            yield start, match.start()
+        start = match.end()
+    if start < len(text):
+        yield start, len(text)
+
+
+def _counted_sentences(text: str, count: Callable[[List[str]], List[int]]) -> Iterator[Tuple[int, int, int]]:
+    """Yield `(start, end, tokens)` per sentence, tokenizing COUNT_BATCH at a time."""
+    spans = []
+    for span in _sentences(text):
+        spans.append(span)
+        if len(spans) == COUNT_BATCH:
+            yield from ((s, e, n) for (s, e), n in zip(spans, count([text[s:e] for s, e in spans])))
+            spans = []
+    yield from ((s, e, n) for (s, e), n in zip(spans, count([text[s:e] for s, e in spans])))
+
+
+def _split_long(text: str, start: int, end: int, max_tokens: int,
+                count: Callable[[List[str]], List[int]]) -> Iterator[Tuple[int, int, int]]:
+    """Cut a sentence longer than `max_tokens` on word boundaries."""
+    words = [(m.start(), m.end()) for m in _WORD.finditer(text, start, end)]
+    piece_start, piece_end, tokens = None, None, 0
+    for (w_start, w_end), n in zip(words, count([text[s:e] for s, e in words])):
+        if piece_start is not None and tokens + n > max_tokens:
+            yield piece_start, piece_end, tokens
+            piece_start, tokens = None, 0
+        if piece_start is None:
+            piece_start = w_start
+        piece_end = w_end
+        tokens += n
+    if piece_start is not None:
+        yield piece_start, piece_end, tokens
+
+
+def iter_chunk_spans(text: str, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+                     model_name: str = DEFAULT_MODEL) -> Iterator[Tuple[int, int]]:
+    """Yield `(start, end)` offsets of chunks of at most `max_tokens` tokens."""
+    count, window = token_counter(model_name)
+    if window:
+        max_tokens = min(max_tokens, window)
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    current: List[Tuple[int, int, int]] = []  # (start, end, tokens) of whole sentences
+    total = 0
+    for sentence in _counted_sentences(text, count):
+        pieces = [sentence] if sentence[2] <= max_tokens else _split_long(text, sentence[0], sentence[1], max_tokens, count)
+        for piece in pieces:
+            if current and total + piece[2] > max_tokens:
+                yield current[0][0], current[-1][1]
+                # Carry trailing sentences into the next chunk as overlap
+                while current and (total > overlap_tokens or total + piece[2] > max_tokens):
+                    total -= current.pop(0)[2]
+            current.append(piece)
+            total += piece[2]
+    if current:
+        yield current[0][0], current[-1][1]
+
+
+def iter_chunks(text: str, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+                model_name: str = DEFAULT_MODEL) -> Iterator[str]:
+    for start, end in iter_chunk_spans(text, max_tokens, overlap_tokens, model_name):
+        yield text[start:end]
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_MAX_TOKENS, overlap_tokens: int = DEFAULT_OVERLAP_TOKENS) -> List[str]:
+    """Break text into chunks of at most `max_tokens` model tokens with sentence overlap."""
+    chunks = list(iter_chunks(text, max_tokens, overlap_tokens))
+    return chunks or [text]
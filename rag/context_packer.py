@@ -0,0 +1,157 @@
+"""context_packer.py
+
+Builds the LLM context from retrieved chunks under a token budget.
+
+Adjacent chunks overlap by design (see chunker.py), so joining them sends the
+shared sentences twice. `pack_context` instead:
+- takes chunks in relevance order while they fit in `max_tokens`, counting only
+  text that is not already in the context (the last one may be cut short)
+- merges chunks from the same page into contiguous spans, dropping the overlap
+- emits the spans in reading order: document, page, position
+
+Ingested chunks carry their character offset in the page (`start`), which makes
+the overlap exact; chunks without it are trimmed by matching text against their
+neighbours. Tokens are counted with the embedding model's tokenizer, which
+splits at least as finely as the chat models' BPE vocabularies, so the budget
+errs on the safe side.
+"""
+from typing import Dict, List, Tuple
+import os
+
+from .chunker import token_counter
+from .embedding_registry import DEFAULT_MODEL
+
+
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+# Budget for the context returned as-is when no LLM is configured
+CONTEXT_FALLBACK_TOKENS = int(os.getenv("CONTEXT_FALLBACK_TOKENS", "384"))
+# A chunk is only cut short to fill the budget if at least this much of it fits
+MIN_PARTIAL_TOKENS = 32
+SEPARATOR = "\n\n"
+
+
+def _page_key(doc) -> Tuple:
+    metadata = doc.metadata
+    return metadata.get("doc_id") or metadata.get("source"), metadata.get("page")
+
+
+def _uncovered(spans: List[Tuple[int, int]], start: int, end: int) -> List[Tuple[int, int]]:
+    """Parts of [start, end) not covered by the sorted, disjoint `spans`."""
+    parts = []
+    for s, e in spans:
+        if e <= start:
+            continue
+        if s >= end:
+            break
+        if s > start:
+            parts.append((start, s))
+        start = max(start, e)
+    if start < end:
+        parts.append((start, end))
+    return parts
+
+
+def _overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b`."""
+    probe = b[:32]
+    if not probe:
+        return 0
+    i = a.find(probe, max(0, len(a) - len(b)))
+    while i != -1:
+        if b.startswith(a[i:]):
+            return len(a) - i
+        i = a.find(probe, i + 1)
+    return 0
+
+
+def _truncate(text: str, max_tokens: int, count) -> str:
+    """Longest word-boundary prefix of `text` within `max_tokens` (binary search on length)."""
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count([text[:mid]])[0] <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    cut = text[:lo]
+    if lo < len(text) and " " in cut:
+        cut = cut[:cut.rindex(" ")]
+    return cut.rstrip()
+
+
+def pack_context(docs: List, max_tokens: int = CONTEXT_MAX_TOKENS,
+                 model_name: str = DEFAULT_MODEL) -> Tuple[str, List]:
+    """Return `(context, used_docs)`: the packed context and the chunks it draws on, best first."""
+    count = token_counter(model_name)[0]
+    remaining = max_tokens
+    spans: Dict[Tuple, List[Tuple[int, int]]] = {}  # page -> covered [start, end), sorted
+    pieces: Dict[Tuple, List[Tuple[float, str]]] = {}  # page -> (position, text)
+    loose: Dict[Tuple, Dict[int, str]] = {}  # page -> chunk index -> text, for chunks without offsets
+    page_order: Dict[Tuple, int] = {}
+    used = []
+
+    for doc in docs:
+        if remaining <= 0:
+            break
+        key = _page_key(doc)
+        text = doc.page_content
+        start = doc.metadata.get("start")
+        if isinstance(start, int):
+            new = [(s, e) for s, e in _uncovered(spans.get(key, []), start, start + len(text))
+                   if text[s - start:e - start].strip()]
+            candidates = [(s, text[s - start:e - start]) for s, e in new]
+        else:
+            index = doc.metadata.get("chunk")
+            trimmed = text
+            if isinstance(index, int):
+                neighbours = loose.get(key, {})
+                head = _overlap(neighbours.get(index - 1, ""), text)
+                tail = _overlap(text[head:], neighbours.get(index + 1, ""))
+                trimmed = text[head:len(text) - tail]
+            position = index if isinstance(index, int) else float("inf")
+            candidates = [(position, trimmed)] if trimmed.strip() else []
+
+        if not candidates:
+            used.append(doc)  # already fully in the context
+            continue
+        costs = count([piece for _, piece in candidates])
+        if sum(costs) > remaining:
+            if len(candidates) > 1 or remaining < MIN_PARTIAL_TOKENS:
+                continue
+            position, piece = candidates[0]
+            piece = _truncate(piece, remaining, count)
+            if not piece:
+                continue
+            candidates, costs = [(position, piece)], [remaining]
+
+        remaining -= sum(costs)
+        used.append(doc)
+        page_order.setdefault(key, len(page_order))
+        for position, piece in candidates:
+            pieces.setdefault(key, []).append((position, piece))
+            if isinstance(start, int):
+                spans[key] = sorted(spans.get(key, []) + [(position, position + len(piece))])
+            else:
+                loose.setdefault(key, {})[doc.metadata.get("chunk")] = piece
+
+    # Reading order: documents by their best chunk, then page, then position in the page
+    first_seen: Dict = {}
+    for key in page_order:
+        first_seen.setdefault(key[0], len(first_seen))
+
+    def page_sort(key: Tuple) -> Tuple:
+        page = key[1]
+        return first_seen[key[0]], page if isinstance(page, int) else float("inf"), page_order[key]
+
+    blocks = []
+    for key in sorted(pieces, key=page_sort):
+        block, end = "", None
+        for position, piece in sorted(pieces[key], key=lambda p: p[0]):
+            if block and not (isinstance(position, int) and position == end and key in spans):
+                blocks.append(block)
+                block = ""
+            block += piece
+            end = position + len(piece) if isinstance(position, int) else None
+        if block:
+            blocks.append(block)
+    return SEPARATOR.join(block.strip() for block in blocks), used
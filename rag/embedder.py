@@ -5,17 +5,13 @@ Embeddings wrapper using SentenceTransformers.
 from typing import List
 import numpy as np
 
-try:
-    from sentence_transformers import SentenceTransformer
-except Exception:
-    SentenceTransformer = None
+from .embedding_registry import DEFAULT_MODEL, get_sentence_transformer
 
 
 class Embedder:
-    def __init__(self, model_name: str = 'all-MiniLM-L6-v2'):
-        if SentenceTransformer is None:
-            raise RuntimeError('sentence-transformers not installed. pip install sentence-transformers')
-        self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name: str = DEFAULT_MODEL):
+        # Shared per process - constructing an Embedder no longer reloads the weights.
+        self.model = get_sentence_transformer(model_name)
 
     def embed(self, texts: List[str]) -> np.ndarray:
         """Return embeddings as a 2D numpy array."""
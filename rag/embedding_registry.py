@@ -0,0 +1,117 @@
+"""embedding_registry.py
+
+Process-wide registry of embedding models.
+
+Loading a SentenceTransformer takes seconds, so every model is loaded once per
+worker process and then shared by ingestion, querying and the FAISS demo flow.
+"""
+from typing import Dict
+import os
+import threading
+import time
+
+try:
+    from langchain_community.embeddings import HuggingFaceEmbeddings
+except ImportError:
+    HuggingFaceEmbeddings = None
+
+try:
+    from langchain_openai import OpenAIEmbeddings
+except ImportError:
+    try:
+        from langchain.embeddings import OpenAIEmbeddings
+    except ImportError:
+        OpenAIEmbeddings = None
+
+try:
+    from sentence_transformers import SentenceTransformer
+except Exception:
+    SentenceTransformer = None
+
+
+DEFAULT_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+_lock = threading.Lock()
+_embeddings: Dict[str, object] = {}
+_models: Dict[str, object] = {}
+
+
+def _build_embeddings(model_name: str):
+    """Build a LangChain embeddings object - HuggingFace first, then OpenAI if configured."""
+    # Try free HuggingFace embeddings first (more reliable for embeddings task)
+    if HuggingFaceEmbeddings:
+        try:
+            return HuggingFaceEmbeddings(model_name=model_name)
+        except Exception as e:
+            print(f"HuggingFace embeddings failed: {e}, falling back to OpenAI")
+
+    if OpenAIEmbeddings is None:
+        raise RuntimeError("No embeddings provider available")
+
+    # Fall back to OpenAI if key exists
+    if os.getenv("OPENAI_API_KEY"):
+        try:
+            return OpenAIEmbeddings()
+        except Exception as e:
+            print(f"OpenAI embeddings failed: {e}")
+
+    # Last resort: try OpenAI anyway (will fail if no key)
+    try:
+        return OpenAIEmbeddings()
+    except Exception:
+        # If all else fails, return HuggingFace even if it seemed to fail
+        if HuggingFaceEmbeddings:
+            return HuggingFaceEmbeddings(model_name=model_name)
+        raise RuntimeError("No embeddings provider available")
+
+
+def get_embeddings(model_name: str = DEFAULT_MODEL):
+    """Return the shared LangChain embeddings object for `model_name`, loading it on first use."""
+    embeddings = _embeddings.get(model_name)
+    if embeddings is not None:
+        return embeddings
+
+    with _lock:
+        embeddings = _embeddings.get(model_name)
+        if embeddings is None:
+            embeddings = _build_embeddings(model_name)
+            _embeddings[model_name] = embeddings
+    return embeddings
+
+
+def get_sentence_transformer(model_name: str = DEFAULT_MODEL):
+    """Return the shared raw SentenceTransformer for `model_name`.
+
+    Reuses the model already held by a cached HuggingFaceEmbeddings so the weights
+    are only resident once per process.
+    """
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    with _lock:
+        model = _models.get(model_name)
+        if model is None:
+            client = getattr(_embeddings.get(model_name), "client", None)
+            if SentenceTransformer is not None and isinstance(client, SentenceTransformer):
+                model = client
+            elif SentenceTransformer is None:
+                raise RuntimeError('sentence-transformers not installed. pip install sentence-transformers')
+            else:
+                model = SentenceTransformer(model_name)
+            _models[model_name] = model
+    return model
+
+
+def warmup(model_name: str = DEFAULT_MODEL) -> float:
+    """Load `model_name` and run one encode so the first request is not cold. Returns seconds taken."""
+    start = time.perf_counter()
+    get_embeddings(model_name).embed_query("warmup")
+    return time.perf_counter() - start
+
+
+def clear() -> None:
+    """Drop every cached model (used by benchmarks to reproduce a cold start)."""
+    with _lock:
+        _embeddings.clear()
+        _models.clear()
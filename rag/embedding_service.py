@@ -0,0 +1,224 @@
+"""embedding_service.py
+
+Batched embedding on top of the shared models in `embedding_registry`.
+
+Ingestion encodes chunks in explicit batches of `EMBED_BATCH_SIZE` instead of
+whatever size the vector store hands over. Question embeddings from concurrent
+requests are collected by a micro-batcher for up to `QUERY_BATCH_WINDOW_MS` and
+encoded with a single call, which keeps the CPU busy with one large matmul
+rather than many tiny ones. A failed encode fails only its batch; if the
+batcher thread itself stops, waiting questions fail and new ones are encoded
+directly.
+"""
+from concurrent.futures import Future, InvalidStateError
+from typing import Callable, Dict, List
+import os
+import queue
+import threading
+import time
+
+try:
+    from langchain_core.embeddings import Embeddings
+except ImportError:
+    from langchain.embeddings.base import Embeddings
+
+from .embedding_registry import DEFAULT_MODEL, SentenceTransformer, get_embeddings
+
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+# 0 disables the micro-batcher (each question is encoded on its own)
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX = int(os.getenv("QUERY_BATCH_MAX", "32"))
+
+
+class BatcherStopped(RuntimeError):
+    """The batcher thread is gone; encode directly instead."""
+
+
+def _settle(future: Future, result=None, exc: BaseException = None) -> None:
+    """Complete `future` unless it is already done (e.g. cancelled by its caller)."""
+    try:
+        if exc is not None:
+            future.set_exception(exc)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class QueryBatcher:
+    """Group concurrent single-text encodes into one call within a short window."""
+
+    def __init__(self, encode: Callable[[List[str]], List[List[float]]],
+                 window_ms: float = QUERY_BATCH_WINDOW_MS, max_batch: int = QUERY_BATCH_MAX):
+        self._encode = encode
+        self.window = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue" = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+        self.batches = 0
+        self.queries = 0
+        self.largest_batch = 0
+        self._last_batch = 0
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="query-embed-batcher", daemon=True)
+                self._thread.start()
+
+    @property
+    def alive(self) -> bool:
+        """False once the batcher thread has stopped (it is started on the first submit)."""
+        return not self._stopped and (self._thread is None or self._thread.is_alive())
+
+    def submit(self, text: str) -> Future:
+        self._ensure_started()
+        future: Future = Future()
+        with self._lock:
+            if self._stopped:
+                future.set_exception(BatcherStopped("query embedding batcher stopped"))
+            else:
+                self._queue.put((text, future))
+        return future
+
+    def embed(self, text: str) -> List[float]:
+        """Blocking: embed `text` together with whatever else arrives in the window."""
+        return self.submit(text).result()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        # A lone caller with nothing else in flight shouldn't pay the window
+        window = self.window if self._last_batch > 1 or not self._queue.empty() else 0.0
+        deadline = time.monotonic() + window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        batch = []
+        try:
+            while True:
+                batch = self._collect()
+                try:
+                    self._encode_batch(batch)
+                except Exception as exc:
+                    for _, future in batch:
+                        _settle(future, exc=exc)
+                batch = []
+        finally:
+            # Only reached if the thread itself fails: nobody would answer these
+            with self._lock:
+                self._stopped = True
+            error = BatcherStopped("query embedding batcher stopped")
+            for _, future in batch:
+                _settle(future, exc=error)
+            while True:
+                try:
+                    _settle(self._queue.get_nowait()[1], exc=error)
+                except queue.Empty:
+                    break
+
+    def _encode_batch(self, batch: list) -> None:
+        # Identical questions in one window are encoded once
+        unique = list(dict.fromkeys(text for text, _ in batch))
+        vectors = dict(zip(unique, self._encode(unique)))
+
+        self._last_batch = len(batch)
+        self.batches += 1
+        self.queries += len(batch)
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for text, future in batch:
+            _settle(future, vectors[text])
+
+    def stats(self) -> Dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "batches": self.batches,
+            "queries": self.queries,
+            "largest_batch": self.largest_batch,
+            "avg_batch": round(self.queries / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+class BatchedEmbeddings(Embeddings):
+    """LangChain embeddings that encode documents in fixed batches and micro-batch queries.
+
+    Drop-in for the registry's embeddings object, so Chroma's `add_documents` and
+    `similarity_search` go through it without changes.
+    """
+
+    def __init__(self, inner, batch_size: int = EMBED_BATCH_SIZE,
+                 window_ms: float = QUERY_BATCH_WINDOW_MS, max_batch: int = QUERY_BATCH_MAX):
+        self.inner = inner
+        self.batch_size = max(1, batch_size)
+        self.batcher = QueryBatcher(self._encode, window_ms, max_batch) if window_ms > 0 else None
+
+    def _encode(self, texts: List[str]) -> List[List[float]]:
+        client = getattr(self.inner, "client", None)
+        if SentenceTransformer is not None and isinstance(client, SentenceTransformer):
+            # Same preprocessing as HuggingFaceEmbeddings, but with our batch size
+            kwargs = dict(getattr(self.inner, "encode_kwargs", None) or {})
+            kwargs["batch_size"] = self.batch_size
+            texts = [text.replace("\n", " ") for text in texts]
+            return client.encode(texts, show_progress_bar=False, **kwargs).tolist()
+        return self.inner.embed_documents(texts)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors: List[List[float]] = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._encode(texts[start:start + self.batch_size]))
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        if self.batcher is not None and self.batcher.alive:
+            try:
+                return self.batcher.embed(text)
+            except BatcherStopped:
+                pass
+        return self._encode([text])[0]
+
+    def stats(self) -> Dict:
+        return {
+            "batch_size": self.batch_size,
+            "query_batcher": self.batcher.stats() if self.batcher is not None else None,
+        }
+
+
+_services: Dict[str, BatchedEmbeddings] = {}
+_services_lock = threading.Lock()
+
+
+def get_embedding_service(model_name: str = DEFAULT_MODEL) -> BatchedEmbeddings:
+    """Return the process-wide batched embeddings for `model_name`."""
+    service = _services.get(model_name)
+    if service is not None:
+        return service
+
+    with _services_lock:
+        service = _services.get(model_name)
+        if service is None:
+            service = BatchedEmbeddings(get_embeddings(model_name))
+            _services[model_name] = service
+    return service
+
+
+def stats() -> Dict:
+    """Counters for every service loaded in this process (never loads a model)."""
+    with _services_lock:
+        return {name: service.stats() for name, service in _services.items()}
+
+
+def clear() -> None:
+    """Drop the cached services (benchmarks use this with `embedding_registry.clear`)."""
+    with _services_lock:
+        _services.clear()
@@ -1,95 +1,121 @@
-from typing import Dict
+from typing import Callable, Dict, Optional
 from pathlib import Path
 import os
+import time
 
-# Try new imports first, fallback to old
-try:
-    from langchain_community.document_loaders import PyPDFLoader
-    from langchain_community.vectorstores import Chroma
-except ImportError:
-    from langchain.document_loaders import PyPDFLoader
-    from langchain.vectorstores import Chroma
+from .answer_cache import get_answer_cache
+from .chroma_pool import CORPUS_COLLECTION, bump_version, get_pool
+from .chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, iter_chunk_spans
+from .embedding_service import get_embedding_service
+from . import lexical
+from .loader import Document, ParsedDocument, ParsedPage, open_pdf
 
-try:
-    from langchain_openai import OpenAIEmbeddings
-except ImportError:
-    from langchain.embeddings import OpenAIEmbeddings
 
-# Try new text splitter imports first, fallback to old
-try:
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-except ImportError:
-    try:
-        from langchain.text_splitter import RecursiveCharacterTextSplitter
-    except ImportError:
-        from langchain.text_splitters import RecursiveCharacterTextSplitter
-
-# Use free sentence-transformers if no OpenAI key
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-except ImportError:
-    HuggingFaceEmbeddings = None
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DB_DIR = ROOT_DIR / "rag" / "db"
 
+# Chunks embedded and written per batch; each batch becomes searchable when written
+INGEST_BATCH_CHUNKS = int(os.getenv("INGEST_BATCH_CHUNKS", "256"))
+# Every corpus stamp reopens corpus handles and drops cached corpus answers in all
+# processes, so during an ingest the corpus is stamped at most this often
+INGEST_CORPUS_STAMP_SECONDS = float(os.getenv("INGEST_CORPUS_STAMP_SECONDS", "30"))
 
-def get_embeddings():
-    """Return embeddings - use HuggingFace free embeddings first, then try OpenAI if configured."""
-    # Try free HuggingFace embeddings first (more reliable for embeddings task)
-    if HuggingFaceEmbeddings:
-        try:
-            return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        except Exception as e:
-            print(f"HuggingFace embeddings failed: {e}, falling back to OpenAI")
-    
-    # Fall back to OpenAI if key exists
-    if os.getenv("OPENAI_API_KEY"):
-        try:
-            return OpenAIEmbeddings()
-        except Exception as e:
-            print(f"OpenAI embeddings failed: {e}")
-    
-    # Last resort: try OpenAI anyway (will fail if no key)
-    try:
-        return OpenAIEmbeddings()
-    except Exception:
-        # If all else fails, return HuggingFace even if it seemed to fail
-        if HuggingFaceEmbeddings:
-            return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        raise RuntimeError("No embeddings provider available")
 
+def ingest_pdf(pdf_path: str, doc_id: str, persist_dir: str = None, parsed: Optional[ParsedDocument] = None,
+               progress: Optional[Callable[[int, int], None]] = None, batch_chunks: int = INGEST_BATCH_CHUNKS,
+               on_page: Optional[Callable[[ParsedPage], None]] = None) -> Dict:
+    """Stream a PDF into Chroma under collection `doc_id`: parse, split, embed and write in batches.
 
-ROOT_DIR = Path(__file__).resolve().parent.parent
-DB_DIR = ROOT_DIR / "rag" / "db"
+    Pages are split with the token-aware `chunker`, so every chunk fits the
+    embedding model's window.
 
+    Chunks are embedded once and also written to the shared `CORPUS_COLLECTION`
+    tagged with `doc_id`, which is what cross-document queries search. A BM25
+    index of the chunks is saved alongside (see `lexical`).
 
-def ingest_pdf(pdf_path: str, doc_id: str, persist_dir: str = None) -> Dict:
-    """Load a PDF, split into chunks, embed once and persist to Chroma under collection `doc_id`.
+    This should be run once per document (on upload). Pages are consumed from
+    `parsed` (default `open_pdf(pdf_path, keep_pages=False)`) as they are
+    extracted, and every batch of `batch_chunks` chunks is written and stamped as
+    soon as it is embedded, so queries see partial results and memory stays
+    bounded (unless `parsed` keeps its pages). `on_page(page)` sees each page as
+    it is chunked. `progress(pages_done, total_pages)` is called after each batch. Cross-document
+    queries see the new chunks when the document is done, and every
+    `INGEST_CORPUS_STAMP_SECONDS` before that.
 
-    This should be run once per document (on upload).
+    The result lists every chunk as `(page, start, end)` under `spans`, with
+    offsets into the stripped page text, for insights to work from.
     """
     if persist_dir is None:
         persist_dir = str(DB_DIR)
     
-    loader = PyPDFLoader(pdf_path)
-    docs = loader.load()
+    if parsed is None:
+        parsed = open_pdf(pdf_path, keep_pages=False)
+    total_pages = parsed.total_pages or len(parsed.pages)
+
+    # Re-ingesting replaces the collection and invalidates pooled handles and cached answers
+    pool = get_pool()
+    pool.reset(persist_dir, doc_id)
+    get_answer_cache().invalidate(doc_id)
+    collection = pool.collection(persist_dir, doc_id)
+    corpus = pool.collection(persist_dir, CORPUS_COLLECTION)
+    corpus.delete(where={"doc_id": doc_id})
+    bump_version(persist_dir, CORPUS_COLLECTION)
+    embeddings = get_embedding_service()
+    lexical.remove(persist_dir, doc_id)
+    lexical_index = lexical.LexicalIndexBuilder()
 
-    splitter = RecursiveCharacterTextSplitter(chunk_size=800, chunk_overlap=150)
-    chunks = splitter.split_documents(docs)
+    num_chunks = 0
+    pages_done = 0
+    batch = []
+    spans = []
+    corpus_stamped = time.monotonic()
 
-    embeddings = get_embeddings()
-    vectordb = Chroma(
-        persist_directory=persist_dir,
-        embedding_function=embeddings,
-        collection_name=doc_id,
-    )
+    def flush():
+        nonlocal num_chunks, batch, corpus_stamped
+        if batch:
+            texts = [chunk.page_content for chunk in batch]
+            records = {
+                "ids": [f"{doc_id}-{num_chunks + i}" for i in range(len(batch))],
+                "embeddings": embeddings.embed_documents(texts),
+                "documents": texts,
+                "metadatas": [{**chunk.metadata, "doc_id": doc_id, "chunk": num_chunks + i} for i, chunk in enumerate(batch)],
+            }
+            collection.add(**records)
+            corpus.add(**records)
+            lexical_index.add(texts)
+            num_chunks += len(batch)
+            batch = []
+            # New stamp: other processes reopen the collection and drop answers from fewer chunks
+            bump_version(persist_dir, doc_id)
+            if time.monotonic() - corpus_stamped >= INGEST_CORPUS_STAMP_SECONDS:
+                bump_version(persist_dir, CORPUS_COLLECTION)
+                corpus_stamped = time.monotonic()
+        if progress is not None:
+            progress(pages_done, total_pages)
 
-    vectordb.add_documents(chunks)
-    try:
-        vectordb.persist()
-    except Exception:
-        pass  # Newer Chroma versions auto-persist
+    start = time.perf_counter()
+    for page in parsed.iter_pages():
+        if on_page is not None:
+            on_page(page)
+        text = page.text.strip()
+        metadata = parsed.page_metadata(page)
+        for chunk_start, chunk_end in iter_chunk_spans(text, DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS):
+            # `start` is the chunk's character offset within the page text
+            batch.append(Document(page_content=text[chunk_start:chunk_end], metadata={**metadata, "start": chunk_start}))
+            spans.append((page.number, chunk_start, chunk_end))
+        pages_done += 1
+        if len(batch) >= batch_chunks:
+            flush()
+    flush()
+    lexical_index.save(persist_dir, doc_id)
+    bump_version(persist_dir, doc_id)  # readers pick up the lexical index
+    bump_version(persist_dir, CORPUS_COLLECTION)
 
+    elapsed = time.perf_counter() - start
+    print(f"Ingested {doc_id}: {pages_done} pages, {num_chunks} chunks in {elapsed:.2f}s")
     return {
         "doc_id": doc_id,
-        "num_chunks": len(chunks),
-        "page_count": len(docs),
+        "num_chunks": num_chunks,
+        "page_count": pages_done,
+        "spans": spans,
     }
@@ -1,21 +1,12 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 import json
-import re
 import os
+import time
 
-# Try new imports first, fallback to old
-try:
-    from langchain_openai import ChatOpenAI
-except ImportError:
-    try:
-        from langchain.chat_models import ChatOpenAI
-    except Exception:
-        ChatOpenAI = None
-
-# Try to import PromptTemplate and LLMChain with multiple fallbacks
+# Try to import PromptTemplate with multiple fallbacks
 PromptTemplate = None
-LLMChain = None
 
 try:
     from langchain.prompts import PromptTemplate
@@ -25,15 +16,7 @@ except Exception:
     except Exception:
         pass
 
-try:
-    from langchain.chains import LLMChain
-except Exception:
-    try:
-        from langchain_core.chains import LLMChain
-    except Exception:
-        pass
-
-# If we still don't have PromptTemplate and LLMChain, create simple versions
+# If we still don't have PromptTemplate, create a simple version
 if not PromptTemplate:
     class PromptTemplate:
         def __init__(self, input_variables, template):
@@ -46,49 +29,82 @@ if not PromptTemplate:
                 result = result.replace("{" + key + "}", str(value))
             return result
 
-if not LLMChain:
-    class LLMChain:
-        def __init__(self, llm, prompt):
-            self.llm = llm
-            self.prompt = prompt
-        
-        def invoke(self, inputs):
-            formatted_prompt = self.prompt.format(**inputs)
-            result = self.llm.invoke(formatted_prompt)
-            if hasattr(result, 'content'):
-                return {"text": result.content}
-            return {"text": str(result)}
-        
-        def run(self, **kwargs):
-            formatted_prompt = self.prompt.format(**kwargs)
-            result = self.llm.invoke(formatted_prompt)
-            if hasattr(result, 'content'):
-                return result.content
-            return str(result)
-
-from .ingest import get_embeddings, ingest_pdf
-from .loader import load_pdf_text
+from .chroma_pool import get_pool
+from .ingest import ingest_pdf
+from .model_router import get_router
+from .loader import open_pdf
+from .map_reduce import INSIGHTS_MAX_MAP_CALLS, PartialResults, condense
+from .text_analyzer import TextAnalyzer, analyze_text
 
 INSIGHTS_DIR = Path(__file__).resolve().parent / 'insights_cache'
 INSIGHTS_DIR.mkdir(parents=True, exist_ok=True)
 
-
-def extract_insights(pdf_path: str, doc_id: str, persist_dir: str = "rag/db") -> Dict:
-    """Ingest the document, persist the vectors, and extract AI insights."""
-    ingestion = ingest_pdf(pdf_path, doc_id, persist_dir)
-    full_text = load_pdf_text(pdf_path)
-
-    insights_payload = _analyze_document_content(full_text)
+# Max field prompts in flight per document, and whether to ask for all fields in one JSON call
+INSIGHTS_MAX_CONCURRENCY = int(os.getenv("INSIGHTS_MAX_CONCURRENCY", "5"))
+INSIGHTS_COMBINED_PROMPT = os.getenv("INSIGHTS_COMBINED_PROMPT", "false").lower() in ("1", "true", "yes")
+# Share of job progress reserved for the LLM insights step after indexing
+INSIGHTS_PROGRESS_SHARE = 10
+# Text the prompts see when there are no section summaries
+HEAD_CHARS = 3000
+
+
+def extract_insights(pdf_path: str, doc_id: str, persist_dir: str = "rag/db",
+                     progress: Optional[Callable[[float], None]] = None) -> Dict:
+    """Ingest the document, persist the vectors, and extract AI insights.
+
+    `progress(percent)` is reported while pages are indexed; insights take the last
+    `INSIGHTS_PROGRESS_SHARE` percent. Insights cover the whole document: they are
+    built from section summaries of the indexed chunks (see map_reduce.py).
+
+    Pages are parsed once and not kept: the rule-based analyzer reads each page as
+    it is indexed, only the first `HEAD_CHARS` are held, and the section
+    summaries read their chunks back from the collection.
+    """
+    parsed = open_pdf(pdf_path, keep_pages=False)
+    analysis = TextAnalyzer()
+    head: List[str] = []
+    head_chars = 0
+
+    def read_page(page) -> None:
+        nonlocal head_chars
+        analysis.feed(page.text)
+        if head_chars < HEAD_CHARS:
+            head.append(page.text)
+            head_chars += len(page.text) + 2
+
+    def report(pages_done: int, total_pages: int) -> None:
+        if progress is not None and total_pages:
+            progress((100 - INSIGHTS_PROGRESS_SHARE) * pages_done / total_pages)
+
+    ingestion = ingest_pdf(pdf_path, doc_id, persist_dir, parsed=parsed, progress=report, on_page=read_page)
+    timing = parsed.timing()
+    print(f"Parsed {doc_id}: {timing['page_count']} pages in {timing['total_ms']} ms, slowest {timing['slowest_pages'][:3]}")
+
+    def report_insights(fraction: float) -> None:
+        if progress is not None:
+            progress(100 - INSIGHTS_PROGRESS_SHARE * (1 - fraction))
+
+    insights_payload = _analyze_document_content(
+        head,
+        spans=ingestion.get("spans"),
+        doc_id=doc_id,
+        progress=report_insights,
+        analysis=analysis,
+        chunk_texts=_chunk_reader(persist_dir, doc_id),
+    )
 
     payload = {
         "doc_id": doc_id,
         "num_chunks": ingestion.get("num_chunks"),
         "page_count": ingestion.get("page_count"),
-        "word_count": len(full_text.split()),
+        "word_count": parsed.word_count,
+        "parse_timing": timing,
         "insights": insights_payload,
     }
 
     _save_insights(doc_id, payload)
+    # Only a failed run needs the finished section summaries
+    _partial_path(doc_id).unlink(missing_ok=True)
     return payload
 
 
@@ -100,308 +116,272 @@ def get_saved_insights(doc_id: str) -> Optional[Dict]:
         return json.load(fh)
 
 
+def _partial_path(doc_id: str) -> Path:
+    return INSIGHTS_DIR / f"{doc_id}.partial.json"
+
+
+def _partial_results(doc_id: Optional[str]) -> PartialResults:
+    """Section summaries already computed for `doc_id`; the file is deleted once its insights are saved."""
+    return PartialResults(_partial_path(doc_id) if doc_id else None)
+
+
+def _chunk_reader(persist_dir: str, doc_id: str) -> Callable[[List[int]], List[str]]:
+    """Read chunk texts back from the document's collection, by chunk number."""
+    def read(indices: List[int]) -> List[str]:
+        ids = [f"{doc_id}-{i}" for i in indices]
+        found = get_pool().collection(persist_dir, doc_id).get(ids=ids, include=["documents"])
+        texts = dict(zip(found["ids"], found["documents"]))
+        return [texts.get(chunk_id, "") for chunk_id in ids]
+    return read
+
+
+def _page_chunk_reader(pages: List[str], spans: List) -> Callable[[List[int]], List[str]]:
+    """Chunk texts cut from the page texts, for callers that still hold the pages."""
+    stripped = {}
+
+    def read(indices: List[int]) -> List[str]:
+        texts = []
+        for i in indices:
+            page, start, end = spans[i]
+            if page not in stripped:
+                stripped[page] = pages[page].strip()
+            texts.append(stripped[page][start:end])
+        return texts
+    return read
+
+
 def _save_insights(doc_id: str, payload: Dict) -> None:
     path = INSIGHTS_DIR / f"{doc_id}.json"
     with path.open('w', encoding='utf-8') as fh:
         json.dump(payload, fh, indent=2, ensure_ascii=False)
 
 
-def _analyze_document_content(text: str) -> Dict:
-    # Ensure environment is configured
-    try:
-        from backend.core.config import configure_api_env
-        configure_api_env()
-    except:
-        try:
-            from core.config import configure_api_env
-            configure_api_env()
-        except:
-            pass
-    
-    # Check if LLM is available and API key exists
-    api_key = os.getenv("OPENAI_API_KEY")
-    api_base = os.getenv("OPENAI_API_BASE")
-    has_llm = ChatOpenAI and PromptTemplate and LLMChain and api_key
-    
-    if not has_llm:
-        print(f"LLM not available. ChatOpenAI={bool(ChatOpenAI)}, PromptTemplate={bool(PromptTemplate)}, LLMChain={bool(LLMChain)}, API_KEY={bool(api_key)}")
-        return _smart_insights(text)
-
-    try:
-        # Try Featherless model first (openai/gpt-oss-120b)
-        model_names = ["openai/gpt-oss-120b", "gpt-4-turbo", "gpt-4", "claude-3.5-sonnet", "mistral-large"]
-        llm = None
-        for model_name in model_names:
-            try:
-                if api_base:
-                    llm = ChatOpenAI(
-                        temperature=0.1,
-                        model=model_name,
-                        base_url=api_base,
-                        api_key=api_key
-                    )
-                else:
-                    llm = ChatOpenAI(temperature=0.1, model=model_name, api_key=api_key)
-                print(f"Using model: {model_name}")
-                break
-            except Exception as e:
-                print(f"Model {model_name} setup failed: {str(e)[:80]}")
-                continue
-        
-        if not llm:
-            print("No LLM model available, falling back to text analysis")
-            return _smart_insights(text)
-
-        summary_prompt = PromptTemplate(
-            input_variables=["text"],
-            template="""Provide a concise 2-3 sentence summary of the following document:
+_FIELD_TEMPLATES = {
+    "summary": """Provide a concise 2-3 sentence summary of the following document:
 
 {text}
 
-Summary:"""
-        )
-
-        topics_prompt = PromptTemplate(
-            input_variables=["text"],
-            template="""Extract the main topics and themes from this document. List 3-5 key topics:
+Summary:""",
+    "topics": """Extract the main topics and themes from this document. List 3-5 key topics:
 
 {text}
 
-Key Topics (comma-separated):"""
-        )
-
-        entities_prompt = PromptTemplate(
-            input_variables=["text"],
-            template="""Extract important entities (people, organizations, dates, locations) from this document:
+Key Topics (comma-separated):""",
+    "entities": """Extract important entities (people, organizations, dates, locations) from this document:
 
 {text}
 
 Format as JSON with keys: people, organizations, dates, locations
 If a category has no items, use empty array.
 
-JSON:"""
-        )
+JSON:""",
+    "actions": """Extract any action items, recommendations, or next steps mentioned in this document:
 
-        actions_prompt = PromptTemplate(
-            input_variables=["text"],
-            template="""Extract any action items, recommendations, or next steps mentioned in this document:
+{text}
+
+Action Items (one per line, or 'None found' if none):""",
+    "sentiment": """Analyze the overall sentiment and tone of this document:
 
 {text}
 
-Action Items (one per line, or 'None found' if none):"""
-        )
+Respond with one word: Positive, Negative, Neutral, or Mixed""",
+}
 
-        sentiment_prompt = PromptTemplate(
-            input_variables=["text"],
-            template="""Analyze the overall sentiment and tone of this document:
+_COMBINED_TEMPLATE = """Analyze the following document and respond with a single JSON object using these keys:
+- "summary": a concise 2-3 sentence summary
+- "key_topics": a list of 3-5 main topics and themes
+- "entities": an object with keys people, organizations, dates, locations (use an empty array for a category with no items)
+- "action_items": a list of action items, recommendations, or next steps (empty list if none)
+- "sentiment": one word - Positive, Negative, Neutral, or Mixed
 
 {text}
 
-Respond with one word: Positive, Negative, Neutral, or Mixed""",
-        )
+JSON:"""
 
-        summary_chain = LLMChain(llm=llm, prompt=summary_prompt)
-        topics_chain = LLMChain(llm=llm, prompt=topics_prompt)
-        entities_chain = LLMChain(llm=llm, prompt=entities_prompt)
-        actions_chain = LLMChain(llm=llm, prompt=actions_prompt)
-        sentiment_chain = LLMChain(llm=llm, prompt=sentiment_prompt)
 
-        # Trim text to avoid token limits
-        text_sample = text[:3000]
+def _analyze_document_content(text: Union[str, Iterable[str]], combined: Optional[bool] = None,
+                              max_concurrency: Optional[int] = None, spans: Optional[List] = None,
+                              doc_id: Optional[str] = None,
+                              progress: Optional[Callable[[float], None]] = None,
+                              analysis: Optional[TextAnalyzer] = None,
+                              chunk_texts: Optional[Callable[[List[int]], List[str]]] = None) -> Dict:
+    """Generate insights with an LLM, falling back to the rule-based analyzer per field.
+
+    `text` is the document text or its page texts in order. With the ingest chunk
+    `spans`, the prompts see section summaries of the whole document (finished
+    summaries are cached under `doc_id`, and `progress(fraction)` reports them);
+    without, only its first `HEAD_CHARS` characters. By default the five field
+    prompts run in parallel (bounded by `max_concurrency`); with `combined` a
+    single prompt returns every field as JSON.
+
+    A caller that streamed the pages passes only the first ones as `text`,
+    together with the `analysis` already fed the whole document and a
+    `chunk_texts` reader for the sections (see `extract_insights`).
+    """
+    pages = [text] if isinstance(text, str) else list(text)
+    if analysis is None:
+        # One pass for the document stats and any fields the LLM fails to produce
+        analysis = analyze_text(pages)
+    if chunk_texts is None and spans:
+        chunk_texts = _page_chunk_reader(pages, spans)
 
+    # Ensure environment is configured
+    try:
+        from backend.core.config import configure_api_env
+        configure_api_env()
+    except:
         try:
-            # Try new API first (.invoke)
-            summary = summary_chain.invoke({"text": text_sample}).get("text", "").strip()
-        except:
-            try:
-                # Fallback to old API (.run)
-                summary = summary_chain.run(text=text_sample).strip()
-            except Exception as e:
-                print(f"Summary generation failed: {e}")
-                summary = text_sample[:200] + "..."
-        
-        try:
-            topics_raw = topics_chain.invoke({"text": text_sample}).get("text", "").strip()
-        except:
-            try:
-                topics_raw = topics_chain.run(text=text_sample).strip()
-            except Exception as e:
-                print(f"Topics generation failed: {e}")
-                topics_raw = ""
-        
-        try:
-            entities_raw = entities_chain.invoke({"text": text_sample}).get("text", "").strip()
-        except:
-            try:
-                entities_raw = entities_chain.run(text=text_sample).strip()
-            except Exception as e:
-                print(f"Entities generation failed: {e}")
-                entities_raw = ""
-        
-        try:
-            actions_raw = actions_chain.invoke({"text": text_sample}).get("text", "").strip()
+            from core.config import configure_api_env
+            configure_api_env()
         except:
-            try:
-                actions_raw = actions_chain.run(text=text_sample).strip()
-            except Exception as e:
-                print(f"Actions generation failed: {e}")
-                actions_raw = ""
+            pass
+
+    if combined is None:
+        combined = INSIGHTS_COMBINED_PROMPT
+    if max_concurrency is None:
+        max_concurrency = INSIGHTS_MAX_CONCURRENCY
+
+    try:
+        # LLM_MODEL (Featherless openai/gpt-oss-120b by default), then LLM_FALLBACK_MODELS by health
+        llm = get_router(temperature=0.1)
+        if llm:
+            print(f"Using models: {', '.join(llm.models)}")
         
-        try:
-            sentiment = sentiment_chain.invoke({"text": text_sample}).get("text", "").strip() or "Neutral"
-        except:
+        if not llm:
+            print("No LLM model available, falling back to text analysis")
+            return analysis.result()
+
+        coverage = None
+        text_sample = None
+        if spans and INSIGHTS_MAX_MAP_CALLS > 0:
             try:
-                sentiment = sentiment_chain.run(text=text_sample).strip() or "Neutral"
+                text_sample, coverage = condense(llm, chunk_texts, spans, _partial_results(doc_id), progress=progress)
+                print(f"Insight sections for {doc_id}: {coverage}")
             except Exception as e:
-                print(f"Sentiment generation failed: {e}")
-                sentiment = "Neutral"
-
-        topics = [t.strip() for t in topics_raw.split(',') if t.strip()]
-        action_items = [line.strip() for line in actions_raw.split('\n') if line.strip() and not line.lower().startswith("none")]
-
-        try:
-            entities = json.loads(entities_raw)
-        except Exception:
-            entities = {
-                "people": _extract_entities(text, "people"),
-                "organizations": _extract_entities(text, "organizations"),
-                "dates": _extract_entities(text, "dates"),
-                "locations": _extract_entities(text, "locations"),
-            }
+                print(f"Section summaries failed, using the start of the document: {e}")
+        if not text_sample:
+            # Trim text to avoid token limits
+            text_sample = _head(pages, HEAD_CHARS)
+
+        if combined:
+            fields, timings = _run_combined(llm, text_sample)
+        else:
+            fields, timings = _run_fields_concurrently(llm, text_sample, max_concurrency)
+        print(f"Insight timings (ms): {timings}")
+
+        failed = [name for name, value in fields.items() if value is None]
+        if failed:
+            fallback = analysis.result()
+            for name in failed:
+                fields[name] = fallback[name]
 
         return {
-            "summary": summary[:500] if summary else text_sample[:200],
-            "key_topics": topics[:5],
-            "entities": entities,
-            "action_items": action_items[:5],
-            "sentiment": sentiment,
-            "document_stats": {
-                "estimated_reading_time": _estimate_reading_time(text),
-                "complexity_score": _calculate_complexity(text),
-            },
+            "summary": fields["summary"][:500] if fields["summary"] else text_sample[:200],
+            "key_topics": fields["key_topics"][:5],
+            "entities": fields["entities"],
+            "action_items": fields["action_items"][:5],
+            "sentiment": fields["sentiment"] or "Neutral",
+            "document_stats": analysis.document_stats(),
+            "timings_ms": timings,
+            "coverage": coverage,
         }
 
     except Exception as e:
         print(f"LLM-based insights generation failed: {e}")
-        return _smart_insights(text)
-
-
-def _smart_insights(text: str) -> Dict:
-    """Generate insights without LLM using text analysis."""
-    # Extract first few sentences as summary
-    sentences = re.split(r'[.!?]+', text)
-    sentences = [s.strip() for s in sentences if len(s.strip()) > 20]
-    summary = '. '.join(sentences[:3]) + '.' if sentences else "Document processed successfully."
-    if len(summary) > 500:
-        summary = summary[:500] + '...'
-    
-    # Extract key topics from frequent capitalized words
-    words = re.findall(r'\b[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b', text)
-    word_freq = {}
-    for w in words:
-        if len(w) > 3:
-            word_freq[w] = word_freq.get(w, 0) + 1
-    topics = sorted(word_freq.keys(), key=lambda x: word_freq[x], reverse=True)[:5]
-    if not topics:
-        topics = ["Document Analysis", "Information Processing"]
-    
-    # Extract entities
-    entities = {
-        "people": _extract_entities(text, "people"),
-        "organizations": _extract_entities(text, "organizations"),
-        "dates": _extract_entities(text, "dates"),
-        "locations": _extract_entities(text, "locations"),
-    }
-    
-    # Simple action item extraction
-    action_patterns = [
-        r'(?:should|must|need to|required to|recommend|suggest)[^.]*\.',
-        r'(?:action|task|todo|step)[\s:]+[^.]*\.',
-    ]
-    action_items = []
-    for pattern in action_patterns:
-        matches = re.findall(pattern, text, re.IGNORECASE)
-        action_items.extend([m.strip()[:100] for m in matches[:2]])
-    action_items = action_items[:5]
-    
-    return {
-        "summary": summary,
-        "key_topics": topics,
-        "entities": entities,
-        "action_items": action_items,
-        "sentiment": "Neutral",
-        "document_stats": {
-            "estimated_reading_time": _estimate_reading_time(text),
-            "complexity_score": _calculate_complexity(text),
-        },
-    }
+        return analysis.result()
 
 
-def _minimal_insights(text: str) -> Dict:
-    return {
-        "summary": "Document processed successfully.",
-        "key_topics": ["Document Analysis"],
-        "entities": {"people": [], "organizations": [], "dates": [], "locations": []},
-        "action_items": [],
-        "sentiment": "Neutral",
-        "document_stats": {
-            "estimated_reading_time": _estimate_reading_time(text),
-            "complexity_score": _calculate_complexity(text),
-        },
+def _head(pages: List[str], max_chars: int) -> str:
+    """The first `max_chars` characters of the document, joining only the pages needed."""
+    head = []
+    size = 0
+    for page in pages:
+        head.append(page)
+        size += len(page) + 2
+        if size >= max_chars:
+            break
+    return "\n\n".join(head)[:max_chars]
+
+
+def _run_chain(llm, template: str, text_sample: str) -> str:
+    prompt = PromptTemplate(input_variables=["text"], template=template).format(text=text_sample)
+    return llm.invoke(prompt).strip()
+
+
+def _run_fields_concurrently(llm, text_sample: str, max_concurrency: int) -> Tuple[Dict, Dict]:
+    """Send the five field prompts in parallel. Failed fields come back as None."""
+    timings = {}
+
+    def run_field(field: str):
+        start = time.perf_counter()
+        try:
+            return field, _run_chain(llm, _FIELD_TEMPLATES[field], text_sample)
+        except Exception as e:
+            print(f"{field.capitalize()} generation failed: {e}")
+            return field, None
+        finally:
+            timings[field] = round((time.perf_counter() - start) * 1000, 1)
+
+    workers = max(1, min(max_concurrency, len(_FIELD_TEMPLATES)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insights") as executor:
+        raw = dict(executor.map(run_field, _FIELD_TEMPLATES))
+
+    fields = {
+        "summary": raw["summary"],
+        "key_topics": None,
+        "entities": None,
+        "action_items": None,
+        "sentiment": raw["sentiment"],
     }
+    if raw["topics"] is not None:
+        fields["key_topics"] = [t.strip() for t in raw["topics"].split(',') if t.strip()]
+    if raw["actions"] is not None:
+        fields["action_items"] = [line.strip() for line in raw["actions"].split('\n') if line.strip() and not line.lower().startswith("none")]
+    if raw["entities"] is not None:
+        try:
+            fields["entities"] = json.loads(raw["entities"])
+        except Exception:
+            pass
+    return fields, timings
 
 
-def _extract_entities(text: str, entity_type: str) -> list:
-    if entity_type == "dates":
-        patterns = [
-            r"\b\d{1,2}/\d{1,2}/\d{2,4}\b",
-            r"\b\d{1,2}-\d{1,2}-\d{2,4}\b",
-            r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b",
-        ]
-        found = []
-        for pattern in patterns:
-            found.extend(re.findall(pattern, text))
-        return list(dict.fromkeys(found))[:3]
-
-    if entity_type == "organizations":
-        keywords = ["Inc", "Corp", "Ltd", "LLC", "Company", "University", "Institute", "Center"]
-        sentences = text.split('.')[:10]
-        orgs = []
-        for sentence in sentences:
-            for keyword in keywords:
-                if keyword in sentence:
-                    words = sentence.split()
-                    idx = next((i for i, w in enumerate(words) if keyword in w), -1)
-                    if idx >= 0:
-                        snippet = ' '.join(words[max(0, idx - 2): idx + 1])
-                        if len(snippet) > 3:
-                            orgs.append(snippet.strip())
-        return list(dict.fromkeys(orgs))[:3]
-
-    return []
-
-
-def _estimate_reading_time(text: str) -> str:
-    words = len(text.split())
-    if not words:
-        return "< 1 minute"
-    minutes = words / 200
-    if minutes < 1:
-        return "< 1 minute"
-    if minutes < 60:
-        return f"{int(minutes)} minutes"
-    hours = int(minutes // 60)
-    mins = int(minutes % 60)
-    return f"{hours}h {mins}m"
-
-
-def _calculate_complexity(text: str) -> str:
-    words = text.split()
-    if not words:
-        return "Unknown"
-    avg_len = sum(len(word) for word in words) / len(words)
-    if avg_len > 6:
-        return "High"
-    if avg_len > 4.5:
-        return "Medium"
-    return "Low"
+def _run_combined(llm, text_sample: str) -> Tuple[Dict, Dict]:
+    """Ask for every field in one JSON response. Missing or malformed fields come back as None."""
+    start = time.perf_counter()
+    try:
+        data = _parse_json_object(_run_chain(llm, _COMBINED_TEMPLATE, text_sample))
+    except Exception as e:
+        print(f"Combined insights generation failed: {e}")
+        data = {}
+    timings = {"combined": round((time.perf_counter() - start) * 1000, 1)}
+
+    def text_field(key):
+        value = data.get(key)
+        return value.strip() if isinstance(value, str) else None
+
+    def list_field(key):
+        value = data.get(key)
+        if not isinstance(value, list):
+            return None
+        return [str(item).strip() for item in value if str(item).strip()]
+
+    entities = data.get("entities")
+    fields = {
+        "summary": text_field("summary"),
+        "key_topics": list_field("key_topics"),
+        "entities": entities if isinstance(entities, dict) else None,
+        "action_items": list_field("action_items"),
+        "sentiment": text_field("sentiment"),
+    }
+    return fields, timings
+
+
+def _parse_json_object(raw: str) -> Dict:
+    """Parse the first JSON object in an LLM response, tolerating code fences and chatter."""
+    start, end = raw.find('{'), raw.rfind('}')
+    if start < 0 or end <= start:
+        raise ValueError("no JSON object in response")
+    data = json.loads(raw[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("response is not a JSON object")
+    return data
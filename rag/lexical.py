@@ -0,0 +1,180 @@
+"""lexical.py
+
+BM25 over a document's chunks, stored as a compact inverted index.
+
+The index is built during ingestion and written next to the Chroma store as
+flat NumPy arrays (CSR postings), so loading memory-maps it instead of
+unpickling Python objects:
+
+    vocab.txt   sorted terms, one per line
+    term_ptr    int64[V + 1]  postings of term t are [term_ptr[t], term_ptr[t + 1])
+    post_docs   int32[P]      chunk positions, ascending within a term
+    post_tf     int32[P]      term frequency in that chunk
+    doc_len     int32[N]      tokens per chunk
+
+Exact identifiers, part numbers and names are where dense retrieval is weakest,
+so the tokenizer keeps them whole (`zx-00012`) and also indexes their parts.
+"""
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import math
+import re
+import shutil
+import threading
+
+import numpy as np
+
+from .chroma_pool import read_version
+
+
+LEXICAL_DIR = ".lexical"
+BM25_K1 = 1.2
+BM25_B = 0.75
+CACHE_SIZE = 64
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+
+def words(text: str) -> List[str]:
+    """The whole tokens of `text`, without the parts `tokenize` adds."""
+    return _TOKEN.findall(text.lower())
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in words(text):
+        tokens.append(token)
+        parts = _PART.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def is_identifier(token: str) -> bool:
+    """Tokens mixing digits with letters or separators, e.g. `zx-00012`, `v2.3`, `a4`."""
+    return any(c.isdigit() for c in token) and (any(c.isalpha() for c in token) or not token.isdigit())
+
+
+def index_dir(persist_dir: str, doc_id: str) -> Path:
+    return Path(persist_dir) / LEXICAL_DIR / doc_id
+
+
+class LexicalIndexBuilder:
+    """Accumulates chunks during ingestion; `save` writes the arrays."""
+
+    def __init__(self):
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._doc_len: List[int] = []
+
+    def add(self, texts: Sequence[str]) -> None:
+        for text in texts:
+            position = len(self._doc_len)
+            counts = Counter(tokenize(text))
+            self._doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self._postings.setdefault(term, []).append((position, tf))
+
+    def save(self, persist_dir: str, doc_id: str) -> None:
+        vocab = sorted(self._postings)
+        term_ptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum([len(self._postings[t]) for t in vocab], out=term_ptr[1:])
+        post_docs = np.empty(term_ptr[-1], dtype=np.int32)
+        post_tf = np.empty(term_ptr[-1], dtype=np.int32)
+        for i, term in enumerate(vocab):
+            postings = self._postings[term]
+            post_docs[term_ptr[i]:term_ptr[i + 1]] = [p for p, _ in postings]
+            post_tf[term_ptr[i]:term_ptr[i + 1]] = [tf for _, tf in postings]
+
+        target = index_dir(persist_dir, doc_id)
+        tmp = target.with_name(f".{doc_id}.tmp")
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        (tmp / "vocab.txt").write_text("\n".join(vocab), encoding="utf-8")
+        np.save(tmp / "term_ptr.npy", term_ptr)
+        np.save(tmp / "post_docs.npy", post_docs)
+        np.save(tmp / "post_tf.npy", post_tf)
+        np.save(tmp / "doc_len.npy", np.asarray(self._doc_len, dtype=np.int32))
+        shutil.rmtree(target, ignore_errors=True)
+        tmp.rename(target)
+
+
+class LexicalIndex:
+    def __init__(self, directory: Path):
+        vocab = (directory / "vocab.txt").read_text(encoding="utf-8")
+        self.terms = {term: i for i, term in enumerate(vocab.split("\n"))} if vocab else {}
+        self.term_ptr = np.load(directory / "term_ptr.npy", mmap_mode="r")
+        self.post_docs = np.load(directory / "post_docs.npy", mmap_mode="r")
+        self.post_tf = np.load(directory / "post_tf.npy", mmap_mode="r")
+        self.doc_len = np.load(directory / "doc_len.npy")
+        self.avgdl = float(self.doc_len.mean()) if len(self.doc_len) else 0.0
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    def document_frequency(self, term: str) -> int:
+        t = self.terms.get(term)
+        return 0 if t is None else int(self.term_ptr[t + 1] - self.term_ptr[t])
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[int, float]]:
+        """Return up to `k` `(chunk_position, bm25_score)` pairs, best first."""
+        n = len(self.doc_len)
+        if not n:
+            return []
+        scores = np.zeros(n, dtype=np.float32)
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len / self.avgdl)
+        for term in set(tokenize(query)):
+            t = self.terms.get(term)
+            if t is None:
+                continue
+            start, end = self.term_ptr[t], self.term_ptr[t + 1]
+            docs = self.post_docs[start:end]
+            tf = self.post_tf[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + norm[docs])
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+        return [(int(i), float(scores[i])) for i in hits]
+
+
+_lock = threading.Lock()
+_indexes: "OrderedDict[Tuple[str, str], Tuple[LexicalIndex, int]]" = OrderedDict()
+
+
+def get_lexical_index(persist_dir: str, doc_id: str) -> Optional[LexicalIndex]:
+    """Return the (cached) index for `doc_id`, or None if it was ingested without one."""
+    directory = index_dir(persist_dir, doc_id)
+    key = (str(directory.resolve()), doc_id)
+    version = read_version(persist_dir, doc_id)
+    with _lock:
+        entry = _indexes.get(key)
+        if entry is not None and entry[1] == version:
+            _indexes.move_to_end(key)
+            return entry[0]
+    if not (directory / "doc_len.npy").exists():
+        return None
+    index = LexicalIndex(directory)
+    with _lock:
+        _indexes[key] = (index, version)
+        _indexes.move_to_end(key)
+        while len(_indexes) > CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return index
+
+
+def remove(persist_dir: str, doc_id: str) -> None:
+    shutil.rmtree(index_dir(persist_dir, doc_id), ignore_errors=True)
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Tuple[Sequence, float]], k: int = 60) -> List:
+    """Fuse ranked lists of keys, each with a weight: sum of weight / (k + rank)."""
+    scores: Dict = {}
+    for keys, weight in rankings:
+        for rank, key in enumerate(keys, start=1):
+            scores[key] = scores.get(key, 0.0) + weight / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,375 @@
+"""llm_clients.py
+
+Process-wide registry of chat model clients.
+
+Every client built here shares one keep-alive HTTP connection pool to the
+OpenAI-compatible endpoint, so a question reuses an open (TLS) connection
+instead of dialling a new one. Requests have a timeout and are retried with
+exponential backoff on timeouts, connection errors, 429 and 5xx responses, and
+each model has its own concurrency limit on top of the per-worker LLM semaphore.
+
+`configure()` is called from `configure_api_env()` and rebuilds the clients
+when the key, base URL or settings change; new requests go to new pools and
+each old one (sync, or async on its event loop) is closed when its last request
+ends. Point `OPENAI_API_BASE` at
+`benchmarks/stub_llm_server.py` to run against a local stub.
+
+Each event loop gets its own async pool (httpx clients can't cross loops). Run
+coroutines on a short-lived loop with `run()` so its pool is closed with it.
+"""
+from contextlib import asynccontextmanager, contextmanager
+from typing import AsyncIterator, Awaitable, Dict, Iterator, Optional, Set, Tuple, TypeVar
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    from langchain_openai import ChatOpenAI
+except ImportError:
+    try:
+        from langchain.chat_models import ChatOpenAI
+    except Exception:
+        ChatOpenAI = None
+
+
+DEFAULT_LLM_MODEL = os.getenv("LLM_MODEL", "openai/gpt-oss-120b")
+
+_lock = threading.Lock()
+_settings: Optional[Dict] = None
+_http_pool: Optional["_SyncPool"] = None
+_async_http: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()  # event loop -> _AsyncPool
+_closing: Set = set()  # aclose() tasks of replaced async pools, kept until they finish
+_clients: Dict[Tuple[str, float], "LLMClient"] = {}
+
+
+def _read_settings() -> Dict:
+    return {
+        "api_key": os.getenv("OPENAI_API_KEY"),
+        "base_url": os.getenv("OPENAI_API_BASE") or os.getenv("OPENAI_BASE_URL"),
+        "timeout": float(os.getenv("LLM_TIMEOUT", "60")),
+        "connect_timeout": float(os.getenv("LLM_CONNECT_TIMEOUT", "5")),
+        "max_retries": int(os.getenv("LLM_MAX_RETRIES", "2")),
+        "retry_backoff": float(os.getenv("LLM_RETRY_BACKOFF", "0.5")),
+        "model_concurrency": int(os.getenv("LLM_MODEL_CONCURRENCY", "8")),
+        "pool_size": int(os.getenv("LLM_POOL_SIZE", "32")),
+        "keepalive_expiry": float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60")),
+    }
+
+
+def _http_options(settings: Dict) -> Dict:
+    return {
+        "timeout": httpx.Timeout(settings["timeout"], connect=settings["connect_timeout"]),
+        "limits": httpx.Limits(
+            max_connections=settings["pool_size"],
+            max_keepalive_connections=settings["pool_size"],
+            keepalive_expiry=settings["keepalive_expiry"],
+        ),
+    }
+
+
+class _SyncPool:
+    """The shared sync connection pool and the requests using it (counted under `_lock`)."""
+
+    def __init__(self, settings: Dict):
+        self.client = httpx.Client(**_http_options(settings))
+        self.users = 0
+        self.retired = False
+
+
+class _AsyncPool:
+    """One event loop's async connection pool and the requests using it (counted under `_lock`)."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, settings: Dict):
+        self.loop = weakref.ref(loop)  # the pool must not keep its loop's registry entry alive
+        self.client = httpx.AsyncClient(**_http_options(settings))
+        self.users = 0
+        self.retired = False
+
+    def close_soon(self) -> None:
+        """Close the client on its own loop, from any thread (httpx clients can't cross loops)."""
+        loop = self.loop()
+        if loop is None or loop.is_closed():
+            return
+
+        def start() -> None:
+            task = loop.create_task(self.client.aclose())
+            _closing.add(task)
+            task.add_done_callback(_closing.discard)
+        try:
+            loop.call_soon_threadsafe(start)
+        except RuntimeError:
+            pass  # the loop closed meanwhile
+
+
+def configure() -> None:
+    """(Re)read the LLM settings from the environment; clients are rebuilt if anything changed."""
+    global _settings, _http_pool
+    settings = _read_settings()
+    with _lock:
+        if settings == _settings:
+            return
+        _settings = settings
+        old = _http_pool
+        _http_pool = _SyncPool(settings) if httpx is not None else None
+        old_async = list(_async_http.values())
+        _async_http.clear()
+        _clients.clear()
+        # Requests still running on an old pool close it when the last one ends
+        close = old is not None and old.users == 0
+        if old is not None:
+            old.retired = True
+        for pool in old_async:
+            pool.retired = True
+        idle_async = [pool for pool in old_async if pool.users == 0]
+    if close:
+        old.client.close()
+    for pool in idle_async:
+        pool.close_soon()
+
+
+@contextmanager
+def _using_sync_pool() -> Iterator[Optional[_SyncPool]]:
+    """Hold the current sync pool for one request, so `configure()` doesn't close it underneath."""
+    with _lock:
+        pool = _http_pool
+        if pool is not None:
+            pool.users += 1
+    try:
+        yield pool
+    finally:
+        if pool is not None:
+            with _lock:
+                pool.users -= 1
+                close = pool.retired and pool.users == 0
+            if close:
+                pool.client.close()
+
+
+def _current_settings() -> Dict:
+    if _settings is None:
+        configure()
+    return _settings
+
+
+@asynccontextmanager
+async def _using_async_pool() -> AsyncIterator[Optional[_AsyncPool]]:
+    """Hold the running loop's async pool for one request, as `_using_sync_pool` does."""
+    if httpx is None:
+        yield None
+        return
+    loop = asyncio.get_running_loop()
+    settings = _current_settings()
+    with _lock:
+        pool = _async_http.get(loop)
+        if pool is None:
+            pool = _AsyncPool(loop, settings)
+            _async_http[loop] = pool
+        pool.users += 1
+    try:
+        yield pool
+    finally:
+        with _lock:
+            pool.users -= 1
+            close = pool.retired and pool.users == 0
+        if close:
+            await pool.client.aclose()
+
+
+T = TypeVar("T")
+
+
+def run(coro: Awaitable[T]) -> T:
+    """`asyncio.run(coro)`, closing the async pool the new loop opened."""
+    async def main() -> T:
+        try:
+            return await coro
+        finally:
+            await aclose()
+    return asyncio.run(main())
+
+
+def _retryable(exc: Exception) -> bool:
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in (408, 409, 429) or status >= 500
+    if httpx is not None and isinstance(exc, httpx.TransportError):
+        return True
+    return isinstance(exc, (TimeoutError, ConnectionError)) or type(exc).__name__ in (
+        "APITimeoutError", "APIConnectionError",
+    )
+
+
+def _text(result) -> str:
+    return result.content if hasattr(result, "content") else str(result)
+
+
+class LLMClient:
+    """One chat model on the shared pool, with a concurrency limit, retries and counters."""
+
+    def __init__(self, model: str, temperature: float, settings: Dict):
+        self.model = model
+        self.temperature = temperature
+        self.settings = settings
+        self._slots = threading.BoundedSemaphore(max(1, settings["model_concurrency"]))
+        self._async_slots: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._chat: Tuple = (None, None)  # (sync pool, chat model on it)
+        self._async_chats: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._stats_lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+        self.in_flight = 0
+
+    def _build(self, **http):
+        options = {"temperature": self.temperature, "model": self.model, "api_key": self.settings["api_key"],
+                   "timeout": self.settings["timeout"], "max_retries": 0}  # retries are ours
+        if self.settings["base_url"]:
+            options["base_url"] = self.settings["base_url"]
+        return ChatOpenAI(**options, **{k: v for k, v in http.items() if v is not None})
+
+    def _sync_chat(self, pool: Optional[_SyncPool]):
+        built_for, chat = self._chat
+        if chat is None or built_for is not pool:
+            chat = self._build(http_client=pool.client if pool is not None else None)
+            self._chat = (pool, chat)
+        return chat
+
+    def chat(self):
+        """The LangChain chat model on the current shared sync pool (e.g. for chains)."""
+        return self._sync_chat(_http_pool)
+
+    def _achat(self, pool: Optional[_AsyncPool]):
+        loop = asyncio.get_running_loop()
+        built_for, chat = self._async_chats.get(loop, (None, None))
+        if chat is None or built_for is not pool:
+            sync_pool = _http_pool
+            chat = self._build(http_client=sync_pool.client if sync_pool is not None else None,
+                               http_async_client=pool.client if pool is not None else None)
+            self._async_chats[loop] = (pool, chat)
+        return chat
+
+    def _aslots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        slots = self._async_slots.get(loop)
+        if slots is None:
+            slots = asyncio.Semaphore(max(1, self.settings["model_concurrency"]))
+            self._async_slots[loop] = slots
+        return slots
+
+    def _delay(self, attempt: int) -> float:
+        # Exponential backoff with jitter, capped at 8s
+        return min(8.0, self.settings["retry_backoff"] * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+    def _count(self, **deltas) -> None:
+        with self._stats_lock:
+            for name, delta in deltas.items():
+                setattr(self, name, getattr(self, name) + delta)
+
+    def invoke(self, prompt: str) -> str:
+        with self._slots:
+            self._count(requests=1, in_flight=1)
+            try:
+                for attempt in range(self.settings["max_retries"] + 1):
+                    try:
+                        with _using_sync_pool() as pool:
+                            return _text(self._sync_chat(pool).invoke(prompt))
+                    except Exception as e:
+                        if attempt >= self.settings["max_retries"] or not _retryable(e):
+                            self._count(errors=1)
+                            raise
+                        self._count(retries=1)
+                        time.sleep(self._delay(attempt))
+            finally:
+                self._count(in_flight=-1)
+
+    async def ainvoke(self, prompt: str) -> str:
+        async with self._aslots():
+            self._count(requests=1, in_flight=1)
+            try:
+                for attempt in range(self.settings["max_retries"] + 1):
+                    try:
+                        async with _using_async_pool() as pool:
+                            return _text(await self._achat(pool).ainvoke(prompt))
+                    except Exception as e:
+                        if attempt >= self.settings["max_retries"] or not _retryable(e):
+                            self._count(errors=1)
+                            raise
+                        self._count(retries=1)
+                        await asyncio.sleep(self._delay(attempt))
+            finally:
+                self._count(in_flight=-1)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield answer text as it arrives; only retried before the first chunk."""
+        async with self._aslots():
+            self._count(requests=1, in_flight=1)
+            try:
+                for attempt in range(self.settings["max_retries"] + 1):
+                    started = False
+                    try:
+                        async with _using_async_pool() as pool:
+                            async for chunk in self._achat(pool).astream(prompt):
+                                text = _text(chunk)
+                                if text:
+                                    started = True
+                                    yield text
+                        return
+                    except Exception as e:
+                        if started or attempt >= self.settings["max_retries"] or not _retryable(e):
+                            self._count(errors=1)
+                            raise
+                        self._count(retries=1)
+                        await asyncio.sleep(self._delay(attempt))
+            finally:
+                self._count(in_flight=-1)
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {"requests": self.requests, "retries": self.retries, "errors": self.errors,
+                    "in_flight": self.in_flight}
+
+
+def get_llm_client(model: str = DEFAULT_LLM_MODEL, temperature: float = 0.0) -> Optional[LLMClient]:
+    """Return the shared client for `model`, or None when no API key is configured."""
+    settings = _current_settings()
+    if not (settings["api_key"] and ChatOpenAI):
+        return None
+    key = (model, temperature)
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = LLMClient(model, temperature, settings)
+                _clients[key] = client
+    return client
+
+
+async def aclose() -> None:
+    """Close the async pool of the running event loop (app shutdown), or after its last request ends."""
+    with _lock:
+        pool = _async_http.pop(asyncio.get_running_loop(), None)
+        if pool is None:
+            return
+        pool.retired = True
+        close = pool.users == 0
+    if close:
+        await pool.client.aclose()
+
+
+def stats() -> Dict:
+    """Per-model request counters for /metrics."""
+    models: Dict[str, Dict] = {}
+    for (model, _), client in list(_clients.items()):
+        totals = models.setdefault(model, {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0})
+        for name, value in client.stats().items():
+            totals[name] += value
+    return {"configured": bool(_settings and _settings["api_key"]), "models": models}
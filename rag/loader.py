@@ -1,9 +1,25 @@
 """loader.py
 
 Functions to load PDF content into plain text.
+
+`parse_pdf` is the single parse stage of upload processing: it reads every page
+once into a `ParsedDocument` that the splitter, the word counter and the insights
+analyzer all share, and records per-page timings to spot slow PDFs.
+
+`open_pdf` is the streaming form used by ingestion: pages are extracted on
+demand - across a process pool for large PDFs - so indexing can start on the
+first pages while later ones are still being parsed. With `keep_pages=False`
+each page is handed on without being held, so a consumer that is done with a
+page (like `extract_insights`) keeps memory flat however long the PDF is.
 """
-from typing import List
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional, Tuple
 from pathlib import Path
+import multiprocessing
+import os
+import time
 
 try:
     from pypdf import PdfReader
@@ -11,12 +27,142 @@ except Exception:
     # fallback: pypdf might not be installed in the environment yet
     PdfReader = None
 
+try:
+    from langchain_core.documents import Document
+except ImportError:
+    try:
+        from langchain.schema import Document
+    except ImportError:
+        Document = None
 
-def load_pdf_text(path: str) -> str:
-    """Load a PDF and return the extracted text as a single string.
 
-    Note: Uses pypdf (install via `pip install pypdf`) for lightweight extraction.
-    For more robust extraction (layout / images) consider `pdfplumber`.
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0"))  # 0 = one per CPU
+# Below this many pages, spawning a pool costs more than it saves
+PARSE_PARALLEL_MIN_PAGES = int(os.getenv("PARSE_PARALLEL_MIN_PAGES", "64"))
+PARSE_SLICE_PAGES = 16
+
+
+@dataclass
+class ParsedPage:
+    number: int  # 0-based, same as PyPDFLoader's "page" metadata
+    label: str
+    text: str
+    parse_ms: float
+
+
+@dataclass
+class ParsedDocument:
+    path: str
+    pages: List[ParsedPage]
+    metadata: Dict[str, str] = field(default_factory=dict)
+    parse_ms: float = 0.0
+    total_pages: int = 0
+    _pending: Optional[Iterator[ParsedPage]] = field(default=None, repr=False, compare=False)
+    keep_pages: bool = True
+    # (number, parse_ms, words) of the pages streamed without being kept
+    _dropped: List[Tuple[int, float, int]] = field(default_factory=list, repr=False, compare=False)
+
+    def iter_pages(self) -> Iterator[ParsedPage]:
+        """Yield pages in order, extracting any not parsed yet (see `open_pdf`)."""
+        yield from list(self.pages)
+        if self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        for page in pending:
+            # Sum page times: wall time here would include whatever the consumer does between pages
+            self.parse_ms += page.parse_ms
+            if self.keep_pages:
+                self.pages.append(page)
+            else:
+                self._dropped.append((page.number, page.parse_ms, len(page.text.split())))
+            yield page
+
+    @property
+    def text(self) -> str:
+        return "\n\n".join(p.text for p in self.pages)
+
+    @property
+    def word_count(self) -> int:
+        return sum(len(p.text.split()) for p in self.pages) + sum(words for _, _, words in self._dropped)
+
+    def page_metadata(self, page: ParsedPage) -> Dict:
+        """Metadata in the shape PyPDFLoader produced (the frontend shows title/page_label/source)."""
+        return {
+            **self.metadata,
+            "source": self.path,
+            "total_pages": self.total_pages or len(self.pages),
+            "page": page.number,
+            "page_label": page.label,
+        }
+
+    def to_documents(self) -> List:
+        """Return one LangChain Document per page for the text splitter."""
+        if Document is None:
+            raise RuntimeError("langchain-core not available. Install with `pip install langchain-core`.")
+        return [Document(page_content=p.text.strip(), metadata=self.page_metadata(p)) for p in self.pages]
+
+    def timing(self, slowest: int = 5) -> Dict:
+        times = [(p.number, p.parse_ms) for p in self.pages] + [(number, ms) for number, ms, _ in self._dropped]
+        times.sort(key=lambda t: t[1], reverse=True)
+        return {
+            "total_ms": round(self.parse_ms, 1),
+            "page_count": len(self.pages) + len(self._dropped),
+            "slowest_pages": [{"page": number + 1, "ms": round(ms, 1)} for number, ms in times[:slowest]],
+        }
+
+
+def _read_header(path: str) -> Tuple[int, Dict[str, str]]:
+    reader = PdfReader(path)
+    metadata = {}
+    for key, value in (reader.metadata or {}).items():
+        metadata[key.lstrip('/').lower()] = str(value).strip()
+    return len(reader.pages), metadata
+
+
+def _iter_pages(path: str, start: int = 0, stop: Optional[int] = None) -> Iterator[ParsedPage]:
+    reader = PdfReader(path)
+    try:
+        labels = reader.page_labels
+    except Exception:
+        labels = []
+
+    stop = len(reader.pages) if stop is None else min(stop, len(reader.pages))
+    for i in range(start, stop):
+        page_start = time.perf_counter()
+        try:
+            text = reader.pages[i].extract_text() or ''
+        except Exception:
+            text = ''
+        label = labels[i] if i < len(labels) else str(i + 1)
+        yield ParsedPage(i, label, text, (time.perf_counter() - page_start) * 1000)
+
+
+def _extract_pages(path: str, start: int, stop: int) -> List[ParsedPage]:
+    """Extract pages `[start, stop)`; runs in pool workers, so it reopens the file."""
+    return list(_iter_pages(path, start, stop))
+
+
+def _parallel_pages(path: str, page_count: int, workers: int) -> Iterator[ParsedPage]:
+    slices = [(start, start + PARSE_SLICE_PAGES) for start in range(0, page_count, PARSE_SLICE_PAGES)]
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+        # Keep a bounded window in flight so a slow consumer doesn't buffer the whole PDF
+        window = deque()
+        for start, stop in slices:
+            window.append(executor.submit(_extract_pages, path, start, stop))
+            if len(window) >= workers * 2:
+                yield from window.popleft().result()
+        while window:
+            yield from window.popleft().result()
+
+
+def open_pdf(path: str, workers: Optional[int] = None, keep_pages: bool = True) -> ParsedDocument:
+    """Open a PDF for streaming: metadata now, pages as `iter_pages()` is consumed.
+
+    PDFs with at least `PARSE_PARALLEL_MIN_PAGES` pages are extracted in slices
+    across `workers` processes (default `PARSE_WORKERS`, 0 = CPU count). With
+    `keep_pages=False`, pages are not added to `pages` as they stream, and
+    `iter_pages()` can only be consumed once.
     """
     path = Path(path)
     if not path.exists():
@@ -25,12 +171,30 @@ def load_pdf_text(path: str) -> str:
     if PdfReader is None:
         raise RuntimeError("pypdf not available. Install with `pip install pypdf`.")
 
-    reader = PdfReader(str(path))
-    pages = []
-    for p in reader.pages:
-        try:
-            pages.append(p.extract_text() or '')
-        except Exception:
-            pages.append('')
+    start = time.perf_counter()
+    page_count, metadata = _read_header(str(path))
+    if workers is None:
+        workers = PARSE_WORKERS or os.cpu_count() or 1
+    if workers > 1 and page_count >= PARSE_PARALLEL_MIN_PAGES:
+        pending = _parallel_pages(str(path), page_count, workers)
+    else:
+        pending = _iter_pages(str(path))
+    return ParsedDocument(str(path), [], metadata, (time.perf_counter() - start) * 1000, page_count, pending,
+                          keep_pages)
+
+
+def parse_pdf(path: str, workers: Optional[int] = None) -> ParsedDocument:
+    """Parse a PDF once into per-page text, metadata and timings."""
+    parsed = open_pdf(path, workers)
+    for _ in parsed.iter_pages():
+        pass
+    return parsed
+
+
+def load_pdf_text(path: str) -> str:
+    """Load a PDF and return the extracted text as a single string.
 
-    return "\n\n".join(pages)
+    Note: Uses pypdf (install via `pip install pypdf`) for lightweight extraction.
+    For more robust extraction (layout / images) consider `pdfplumber`.
+    """
+    return parse_pdf(path).text
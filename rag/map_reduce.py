@@ -0,0 +1,253 @@
+"""map_reduce.py
+
+Condenses a whole document into notes for the insight prompts.
+
+The insight prompts only fit a few thousand characters. Instead of showing them
+the first page, the chunks `ingest_pdf` produced are grouped into at most
+`INSIGHTS_MAX_MAP_CALLS` contiguous sections. Each section is summarized by the
+LLM (map, `INSIGHTS_MAP_CONCURRENCY` calls at a time), then the notes are merged
+in batches until they fit `INSIGHTS_REDUCE_CHARS` (reduce). Documents that
+already fit are passed through whole, with no map calls.
+
+When the call cap makes a section longer than `INSIGHTS_SECTION_CHARS`, evenly
+spaced chunks of it are summarized instead, so every part of the document is
+still seen. Only the chunks a section uses are read (`extract_insights` reads
+them back from the document's collection), so the pages need not be kept: the
+text held is at most about `INSIGHTS_MAX_MAP_CALLS * INSIGHTS_SECTION_CHARS`.
+
+Every finished call is saved to `<doc_id>.partial.json` next to the insights,
+keyed by a hash of its prompt, so a re-run after a crash or a failed call only
+repeats the calls that are missing. `extract_insights` deletes the file once the
+insights are saved.
+"""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import hashlib
+import json
+import math
+import os
+import threading
+import time
+
+
+# Cost/latency budget: most section summaries per document (0 = only the first 3000 characters)
+INSIGHTS_MAX_MAP_CALLS = int(os.getenv("INSIGHTS_MAX_MAP_CALLS", "24"))
+INSIGHTS_MAP_CONCURRENCY = int(os.getenv("INSIGHTS_MAP_CONCURRENCY", "4"))
+INSIGHTS_SECTION_CHARS = int(os.getenv("INSIGHTS_SECTION_CHARS", "12000"))
+INSIGHTS_REDUCE_CHARS = int(os.getenv("INSIGHTS_REDUCE_CHARS", "12000"))
+
+_MAP_TEMPLATE = """Summarize this part ({label}) of a longer document in at most 120 words. Keep the names of people, organizations and places, dates, key figures, and any recommendations, action items or next steps.
+
+{text}
+
+Notes:"""
+
+_REDUCE_TEMPLATE = """Merge these notes on consecutive parts of a document into one set of notes of at most 200 words. Keep the names, dates, key figures and action items.
+
+{text}
+
+Notes:"""
+
+
+class PartialResults:
+    """Finished LLM calls for one document, persisted after each call."""
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = path
+        self._lock = threading.Lock()
+        self.results: Dict[str, str] = {}
+        self.used = set()
+        if path is not None and path.exists():
+            try:
+                with path.open('r', encoding='utf-8') as fh:
+                    self.results = json.load(fh)
+            except (OSError, ValueError):
+                self.results = {}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            value = self.results.get(key)
+            if value is not None:
+                self.used.add(key)
+            return value
+
+    def put(self, key: str, value: str) -> None:
+        with self._lock:
+            self.results[key] = value
+            self.used.add(key)
+            self._write()
+
+    def prune(self) -> None:
+        """Drop results this run did not use (e.g. from an older version of the file)."""
+        with self._lock:
+            if set(self.results) - self.used:
+                self.results = {key: self.results[key] for key in self.used if key in self.results}
+                self._write()
+
+    def _write(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        with tmp.open('w', encoding='utf-8') as fh:
+            json.dump(self.results, fh, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+def _key(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+def _label(first: int, last: int) -> str:
+    return f"page {first + 1}" if first == last else f"pages {first + 1}-{last + 1}"
+
+
+def build_sections(chunk_texts: Callable[[List[int]], List[str]], spans: List[Tuple[int, int, int]],
+                   max_sections: int = INSIGHTS_MAX_MAP_CALLS,
+                   section_chars: int = INSIGHTS_SECTION_CHARS) -> List[Dict]:
+    """Group ingest chunks `(page, start, end)` into at most `max_sections` contiguous sections.
+
+    Offsets are into the stripped page text, as in `ingest_pdf`; chunk `i` is
+    `spans[i]`, and `chunk_texts(indices)` returns the text of those chunks in
+    order. Returns `{"first_page", "last_page", "text", "sampled"}` dicts in document order.
+    """
+    # Adjacent chunks overlap: keep only the part of each chunk past the previous one on its page
+    units = []  # (page, start, end, chunk index, chunk start)
+    last_page, last_end = None, 0
+    for index, (page, chunk_start, end) in enumerate(spans):
+        if page != last_page:
+            last_page, last_end = page, 0
+        start = max(chunk_start, last_end)
+        if end > start:
+            units.append((page, start, end, index, chunk_start))
+        last_end = max(last_end, end)
+    if not units:
+        return []
+
+    total = sum(unit[2] - unit[1] for unit in units)
+    count = max(1, min(max_sections, math.ceil(total / section_chars)))
+    groups: List[List[Tuple[int, int, int, int, int]]] = [[]]
+    size = 0
+    for unit in units:
+        if size >= total * len(groups) / count and len(groups) < count:
+            groups.append([])
+        groups[-1].append(unit)
+        size += unit[2] - unit[1]
+
+    sections = []
+    for group in groups:
+        group_chars = sum(unit[2] - unit[1] for unit in group)
+        sampled = group_chars > section_chars
+        if sampled:
+            group = group[::math.ceil(group_chars / section_chars)]
+        texts = chunk_texts([unit[3] for unit in group])
+        ranges: List[List] = []  # [page, end, parts] of contiguous text
+        for (page, start, end, _, chunk_start), text in zip(group, texts):
+            part = text[start - chunk_start:end - chunk_start]
+            if ranges and ranges[-1][0] == page and ranges[-1][1] == start:
+                ranges[-1][1] = end
+                ranges[-1][2].append(part)
+            else:
+                ranges.append([page, end, [part]])
+        sections.append({
+            "first_page": group[0][0],
+            "last_page": group[-1][0],
+            "text": "\n\n".join("".join(parts).strip() for _, _, parts in ranges),
+            "sampled": sampled,
+        })
+    return sections
+
+
+def _run_calls(llm, prompts: List[str], cache: PartialResults, max_concurrency: int, stats: Dict,
+               progress: Optional[Callable[[float], None]] = None) -> List[Optional[str]]:
+    """Results of `prompts` in order, from the cache or the LLM; failed calls come back as None."""
+    results: List[Optional[str]] = [None] * len(prompts)
+    todo = []
+    for i, prompt in enumerate(prompts):
+        results[i] = cache.get(_key(prompt))
+        if results[i] is None:
+            todo.append(i)
+        else:
+            stats["cached"] += 1
+    if not todo:
+        return results
+
+    def call(i: int) -> Tuple[int, Optional[str]]:
+        try:
+            text = llm.invoke(prompts[i]).strip()
+        except Exception as e:
+            print(f"Section summary failed: {e}")
+            return i, None
+        if text:
+            cache.put(_key(prompts[i]), text)
+        return i, text or None
+
+    workers = max(1, min(max_concurrency, len(todo)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="insights-map") as executor:
+        futures = [executor.submit(call, i) for i in todo]
+        for done, future in enumerate(as_completed(futures), 1):
+            i, text = future.result()
+            results[i] = text
+            stats["calls"] += 1
+            stats["failed"] += text is None
+            if progress is not None:
+                progress(done / len(todo))
+    return results
+
+
+def _batches(notes: List[Tuple[int, int, str]], max_chars: int) -> List[List[Tuple[int, int, str]]]:
+    """Consecutive notes in batches of at most `max_chars` (at least two per batch, so every round shrinks)."""
+    batches = [[]]
+    size = 0
+    for note in notes:
+        if len(batches[-1]) >= 2 and size + len(note[2]) > max_chars:
+            batches.append([])
+            size = 0
+        batches[-1].append(note)
+        size += len(note[2]) + 2
+    return batches
+
+
+def _format(notes: List[Tuple[int, int, str]]) -> str:
+    return "\n\n".join(f"[{_label(first, last).capitalize()}] {text}" for first, last, text in notes)
+
+
+def condense(llm, chunk_texts: Callable[[List[int]], List[str]], spans: List[Tuple[int, int, int]],
+             cache: Optional[PartialResults] = None,
+             max_calls: int = INSIGHTS_MAX_MAP_CALLS, max_concurrency: int = INSIGHTS_MAP_CONCURRENCY,
+             reduce_chars: int = INSIGHTS_REDUCE_CHARS,
+             progress: Optional[Callable[[float], None]] = None) -> Tuple[str, Dict]:
+    """Return `(text, stats)`: the whole document, or notes covering it, within `reduce_chars`."""
+    cache = cache or PartialResults()
+    stats = {"sections": 0, "sampled": 0, "calls": 0, "cached": 0, "failed": 0, "reduce_rounds": 0}
+    sections = build_sections(chunk_texts, spans, max_calls)
+    stats["sections"] = len(sections)
+    whole = "\n\n".join(section["text"] for section in sections)
+    if len(whole) <= reduce_chars:
+        return whole, stats
+    stats["sampled"] = sum(section["sampled"] for section in sections)
+
+    start = time.perf_counter()
+    prompts = [
+        _MAP_TEMPLATE.format(label=_label(s["first_page"], s["last_page"]), text=s["text"]) for s in sections
+    ]
+    results = _run_calls(llm, prompts, cache, max_concurrency, stats, progress)
+    notes = [(s["first_page"], s["last_page"], text) for s, text in zip(sections, results) if text]
+    stats["map_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    if not notes:
+        raise RuntimeError("every section summary failed")
+
+    start = time.perf_counter()
+    while len(_format(notes)) > reduce_chars and len(notes) > 1:
+        batches = _batches(notes, reduce_chars)
+        merged = _run_calls(llm, [_REDUCE_TEMPLATE.format(text=_format(b)) for b in batches],
+                            cache, max_concurrency, stats)
+        stats["reduce_rounds"] += 1
+        # A failed merge keeps the batch's notes, cut to its share of the budget
+        notes = [
+            (batch[0][0], batch[-1][1], text or _format(batch)[:reduce_chars // len(batches)])
+            for batch, text in zip(batches, merged)
+        ]
+    stats["reduce_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    cache.prune()
+    return _format(notes)[:reduce_chars], stats
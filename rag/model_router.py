@@ -0,0 +1,335 @@
+"""model_router.py
+
+Routes LLM calls across a chain of models by health and speed.
+
+Each model's calls feed a shared health record: a latency EWMA, the outcomes of
+its last `ROUTER_WINDOW` calls, and a circuit breaker. After
+`ROUTER_FAILURE_THRESHOLD` consecutive failures, or an error rate of
+`ROUTER_ERROR_RATE` over the window, the circuit opens and the model gets no
+traffic for `ROUTER_OPEN_SECONDS`; then a single trial call decides whether it
+closes again.
+
+Calls go to the fastest healthy model (models not measured yet keep their
+configured order, after measured ones) and fall back down the chain on failure.
+Every `ROUTER_EXPLORE_EVERY`th call goes to the least used healthy model
+instead, so the latency of every model stays known.
+With `ROUTER_HEDGE_MS` set, an async call still running after that long is
+raced against the next model and the first answer wins.
+
+Routing and hedging are opt-in: both need a chain, which only exists once
+`LLM_FALLBACK_MODELS` names models to try after `LLM_MODEL`. Without it every
+call goes to `LLM_MODEL` alone, still behind its circuit breaker.
+"""
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+import asyncio
+import os
+import threading
+import time
+
+from .llm_clients import DEFAULT_LLM_MODEL, get_llm_client
+
+
+# Models tried after LLM_MODEL, comma-separated. Empty (the default) turns routing and hedging off
+LLM_FALLBACK_MODELS = [m.strip() for m in os.getenv("LLM_FALLBACK_MODELS", "").split(",") if m.strip()]
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+ROUTER_ERROR_RATE = float(os.getenv("ROUTER_ERROR_RATE", "0.5"))
+ROUTER_WINDOW = int(os.getenv("ROUTER_WINDOW", "20"))
+ROUTER_MIN_CALLS = 5  # calls in the window before the error rate can open the circuit
+ROUTER_OPEN_SECONDS = float(os.getenv("ROUTER_OPEN_SECONDS", "30"))
+# Launch a hedge request on the next model after this many ms (0 = no hedging)
+ROUTER_HEDGE_MS = float(os.getenv("ROUTER_HEDGE_MS", "0"))
+ROUTER_EXPLORE_EVERY = int(os.getenv("ROUTER_EXPLORE_EVERY", "50"))
+LATENCY_ALPHA = 0.2
+RECENT_DECISIONS = 20
+
+
+class NoHealthyModel(RuntimeError):
+    pass
+
+
+class ModelHealth:
+    """Latency, recent outcomes and circuit state of one model (shared by every router)."""
+
+    def __init__(self, model: str):
+        self.model = model
+        self._lock = threading.Lock()
+        self.latency_ms: Optional[float] = None
+        self.outcomes = deque(maxlen=ROUTER_WINDOW)
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self.calls = 0
+        self.failures = 0
+        self.opens = 0
+
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= ROUTER_OPEN_SECONDS else "open"
+
+    def acquire(self) -> bool:
+        """May a request go to this model now? A half-open circuit lets one trial through."""
+        with self._lock:
+            state = self.state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._trial:
+                self._trial = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """The request was abandoned (e.g. a cancelled hedge) - no outcome to record."""
+        with self._lock:
+            self._trial = False
+
+    def record(self, ok: bool, latency_ms: Optional[float] = None) -> None:
+        with self._lock:
+            self.calls += 1
+            self.outcomes.append(ok)
+            trial, self._trial = self._trial, False
+            if ok:
+                self.consecutive_failures = 0
+                self.opened_at = None
+                if latency_ms is not None:
+                    self.latency_ms = latency_ms if self.latency_ms is None else (
+                        (1 - LATENCY_ALPHA) * self.latency_ms + LATENCY_ALPHA * latency_ms
+                    )
+                return
+            self.failures += 1
+            self.consecutive_failures += 1
+            errors = self.outcomes.count(False)
+            if (trial or self.consecutive_failures >= ROUTER_FAILURE_THRESHOLD
+                    or (len(self.outcomes) >= ROUTER_MIN_CALLS and errors / len(self.outcomes) >= ROUTER_ERROR_RATE)):
+                if self.opened_at is None or trial:
+                    self.opens += 1
+                self.opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.state(),
+                "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+                "error_rate": round(self.outcomes.count(False) / len(self.outcomes), 3) if self.outcomes else 0.0,
+                "calls": self.calls,
+                "failures": self.failures,
+                "opens": self.opens,
+            }
+
+
+_lock = threading.Lock()
+_health: Dict[str, ModelHealth] = {}
+_routers: Dict[float, "ModelRouter"] = {}
+
+
+def _health_of(model: str) -> ModelHealth:
+    health = _health.get(model)
+    if health is None:
+        with _lock:
+            health = _health.setdefault(model, ModelHealth(model))
+    return health
+
+
+class ModelRouter:
+    """Same call interface as `LLMClient` (`invoke` / `ainvoke` / `astream`), over a model chain."""
+
+    def __init__(self, models: List[str], temperature: float = 0.0, hedge_ms: float = ROUTER_HEDGE_MS):
+        self.models = list(dict.fromkeys(models))
+        self.temperature = temperature
+        self.hedge_ms = hedge_ms
+        self._lock = threading.Lock()
+        self.routed: Dict[str, int] = {}
+        self.fallbacks = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.unavailable = 0
+        self.explored = 0
+        self._calls = 0
+        self.recent = deque(maxlen=RECENT_DECISIONS)
+
+    def candidates(self) -> List[ModelHealth]:
+        """Models not behind an open circuit, fastest measured first, then unmeasured in chain order."""
+        healths = [_health_of(model) for model in self.models]
+        order = {h.model: i for i, h in enumerate(healths)}
+        healthy = sorted((h for h in healths if h.state() != "open"),
+                         key=lambda h: (h.latency_ms is None, h.latency_ms or 0.0, order[h.model]))
+        with self._lock:
+            self._calls += 1
+            explore = ROUTER_EXPLORE_EVERY > 0 and self._calls % ROUTER_EXPLORE_EVERY == 0 and len(healthy) > 1
+            if explore:
+                self.explored += 1
+        if explore:
+            least = min(healthy, key=lambda h: h.calls)
+            healthy.remove(least)
+            healthy.insert(0, least)
+        return healthy
+
+    def _client(self, model: str):
+        client = get_llm_client(model, self.temperature)
+        if client is None:
+            raise NoHealthyModel("No LLM API key configured")
+        return client
+
+    def _decide(self, model: str, outcome: str, first: bool, ms: Optional[float] = None) -> None:
+        with self._lock:
+            if first:
+                self.routed[model] = self.routed.get(model, 0) + 1
+            elif outcome == "ok":
+                self.fallbacks += 1
+            self.recent.append({"model": model, "outcome": outcome, "ms": round(ms, 1) if ms is not None else None})
+
+    def _unavailable(self, errors: List[str]) -> NoHealthyModel:
+        with self._lock:
+            self.unavailable += 1
+        return NoHealthyModel("No healthy model: " + ("; ".join(errors) if errors else "all circuits open"))
+
+    def invoke(self, prompt: str) -> str:
+        errors = []
+        for health in self.candidates():
+            if not health.acquire():
+                continue
+            first = not errors
+            start = time.perf_counter()
+            try:
+                text = self._client(health.model).invoke(prompt)
+            except Exception as e:
+                health.record(False)
+                self._decide(health.model, "failed", first)
+                errors.append(f"{health.model}: {str(e)[:80]}")
+                continue
+            ms = (time.perf_counter() - start) * 1000
+            health.record(True, ms)
+            self._decide(health.model, "ok", first, ms)
+            return text
+        raise self._unavailable(errors)
+
+    async def _timed(self, health: ModelHealth, prompt: str) -> str:
+        start = time.perf_counter()
+        try:
+            text = await self._client(health.model).ainvoke(prompt)
+        except asyncio.CancelledError:
+            health.release()
+            raise
+        except Exception:
+            health.record(False)
+            raise
+        health.record(True, (time.perf_counter() - start) * 1000)
+        return text
+
+    async def ainvoke(self, prompt: str) -> str:
+        queue = iter(self.candidates())
+        pending: Dict[asyncio.Task, ModelHealth] = {}
+        started: Dict[asyncio.Task, float] = {}
+        errors = []
+        primary: List[ModelHealth] = []
+        hedged = False
+
+        def launch() -> bool:
+            for health in queue:
+                if health.acquire():
+                    primary.append(health)
+                    task = asyncio.ensure_future(self._timed(health, prompt))
+                    pending[task] = health
+                    started[task] = time.perf_counter()
+                    return True
+            return False
+
+        launch()
+        try:
+            while pending:
+                wait = self.hedge_ms / 1000 if self.hedge_ms > 0 and not hedged and len(pending) == 1 else None
+                done, _ = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Slow answer: race it against the next model
+                    hedged = True
+                    if launch():
+                        with self._lock:
+                            self.hedges += 1
+                    continue
+                for task in done:
+                    health = pending.pop(task)
+                    first = health is primary[0]
+                    ms = (time.perf_counter() - started.pop(task)) * 1000
+                    try:
+                        text = task.result()
+                    except Exception as e:
+                        self._decide(health.model, "failed", first)
+                        errors.append(f"{health.model}: {str(e)[:80]}")
+                        if not pending:
+                            launch()
+                        continue
+                    hedge_won = not first and not errors
+                    if hedge_won:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    self._decide(health.model, "hedge_won" if hedge_won else "ok", first, ms)
+                    return text
+        finally:
+            for task in pending:
+                task.cancel()
+        raise self._unavailable(errors)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """Stream from the best model; falls back down the chain only before the first chunk."""
+        errors = []
+        for health in self.candidates():
+            if not health.acquire():
+                continue
+            first = not errors
+            start = time.perf_counter()
+            started = False
+            try:
+                async for text in self._client(health.model).astream(prompt):
+                    started = True
+                    yield text
+            except asyncio.CancelledError:
+                health.release()
+                raise
+            except Exception as e:
+                health.record(False)
+                self._decide(health.model, "failed", first)
+                if started:
+                    raise
+                errors.append(f"{health.model}: {str(e)[:80]}")
+                continue
+            # Streams count for health but not for latency (their duration is the answer's length)
+            health.record(True)
+            self._decide(health.model, "ok", first, (time.perf_counter() - start) * 1000)
+            return
+        raise self._unavailable(errors)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "models": self.models,
+                "routed": dict(self.routed),
+                "fallbacks": self.fallbacks,
+                "hedges": self.hedges,
+                "hedge_wins": self.hedge_wins,
+                "unavailable": self.unavailable,
+                "explored": self.explored,
+                "recent": list(self.recent),
+            }
+
+
+def get_router(temperature: float = 0.0) -> Optional[ModelRouter]:
+    """Router over `LLM_MODEL` and `LLM_FALLBACK_MODELS`, or None when no API key is configured."""
+    if get_llm_client(DEFAULT_LLM_MODEL, temperature) is None:
+        return None
+    router = _routers.get(temperature)
+    if router is None:
+        with _lock:
+            if not _routers and not LLM_FALLBACK_MODELS and ROUTER_HEDGE_MS > 0:
+                print("ROUTER_HEDGE_MS is set but LLM_FALLBACK_MODELS is empty: there is no model to hedge against")
+            router = _routers.setdefault(temperature, ModelRouter([DEFAULT_LLM_MODEL] + LLM_FALLBACK_MODELS, temperature))
+    return router
+
+
+def stats() -> Dict:
+    """Model health and routing decisions for /metrics."""
+    return {
+        "routing": bool(LLM_FALLBACK_MODELS),
+        "health": {model: health.stats() for model, health in list(_health.items())},
+        "routers": {str(temperature): router.stats() for temperature, router in list(_routers.items())},
+    }
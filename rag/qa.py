@@ -8,13 +8,97 @@ This module exposes a `answer_question_from_pdf` convenience function that:
 - embeds chunks and builds/uses a FAISS index
 - retrieves top contexts and (optionally) calls an LLM to generate a final answer
 
-For hackathon/demo speed we keep this self-contained and simple.
+The index is built once per document and saved under `INDEX_DIR`, keyed by the
+file's content hash, so later questions only embed the question and search.
 """
-from typing import List
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Tuple
+import hashlib
+import os
+import shutil
+import threading
+
 from .loader import load_pdf_text
-from .chunker import chunk_text
+from .chunker import DEFAULT_MAX_TOKENS, DEFAULT_OVERLAP_TOKENS, chunk_text
 from .embedder import Embedder
-from .vectordb import FaissVectorDB
+from .embedding_registry import DEFAULT_MODEL
+from .vectordb import INDEX_FILE, FaissVectorDB
+
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+INDEX_DIR = Path(os.getenv("QA_INDEX_DIR", str(ROOT_DIR / "rag" / "faiss_index")))
+# Opened indexes kept per process; each is memory-mapped, so this mostly bounds file handles
+INDEX_CACHE_SIZE = int(os.getenv("QA_INDEX_CACHE_SIZE", "8"))
+
+# In embedding-model tokens (see chunker.py)
+CHUNK_TOKENS = DEFAULT_MAX_TOKENS
+CHUNK_OVERLAP_TOKENS = DEFAULT_OVERLAP_TOKENS
+
+_lock = threading.Lock()
+_hashes: Dict[Tuple[str, int, int], str] = {}
+_indexes: "OrderedDict[str, FaissVectorDB]" = OrderedDict()
+
+
+def file_hash(path: str) -> str:
+    """SHA-256 of the file contents, memoized on (path, size, mtime)."""
+    stat = os.stat(path)
+    stamp = (str(Path(path).resolve()), stat.st_size, stat.st_mtime_ns)
+    digest = _hashes.get(stamp)
+    if digest is None:
+        hasher = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                hasher.update(block)
+        digest = hasher.hexdigest()
+        _hashes[stamp] = digest
+    return digest
+
+
+def _index_key(pdf_path: str) -> str:
+    # The model and chunking settings are part of the key - changing either needs a rebuild
+    settings = f"{file_hash(pdf_path)}|{DEFAULT_MODEL}|tokens:{CHUNK_TOKENS}|{CHUNK_OVERLAP_TOKENS}"
+    return hashlib.sha256(settings.encode("utf-8")).hexdigest()[:32]
+
+
+def _build_index(pdf_path: str, embedder: Embedder) -> FaissVectorDB:
+    text = load_pdf_text(pdf_path)
+    chunks = chunk_text(text, max_tokens=CHUNK_TOKENS, overlap_tokens=CHUNK_OVERLAP_TOKENS)
+    embeddings = embedder.embed(chunks)
+
+    db = FaissVectorDB(dim=embeddings.shape[1], index_type="auto")
+    db.add(embeddings, chunks)
+    return db
+
+
+def load_or_build_index(pdf_path: str, embedder: Embedder = None, index_dir: str = None) -> FaissVectorDB:
+    """Return the FAISS index for `pdf_path`, building and saving it on first use."""
+    key = _index_key(pdf_path)
+    with _lock:
+        db = _indexes.get(key)
+        if db is not None:
+            _indexes.move_to_end(key)
+            return db
+
+    directory = Path(index_dir) if index_dir else INDEX_DIR
+    target = directory / key
+    if not (target / INDEX_FILE).exists():
+        db = _build_index(pdf_path, embedder or Embedder())
+        # Write to a private directory and rename, so readers never see a partial index
+        tmp = directory / f".{key}.{os.getpid()}.{threading.get_ident()}.tmp"
+        db.save(tmp)
+        try:
+            os.replace(tmp, target)
+        except OSError:
+            shutil.rmtree(tmp, ignore_errors=True)  # another process saved it first
+    db = FaissVectorDB.load(target, mmap=True)
+
+    with _lock:
+        _indexes[key] = db
+        _indexes.move_to_end(key)
+        while len(_indexes) > INDEX_CACHE_SIZE:
+            _indexes.popitem(last=False)
+    return db
 
 
 def answer_question_from_pdf(pdf_path: str, question: str, top_k: int = 5) -> dict:
@@ -22,14 +106,8 @@ def answer_question_from_pdf(pdf_path: str, question: str, top_k: int = 5) -> di
 
     NOTE: Integrate an LLM (OpenAI / other) where indicated to generate high-quality answers from contexts.
     """
-    text = load_pdf_text(pdf_path)
-    chunks = chunk_text(text)
-
     embedder = Embedder()
-    embeddings = embedder.embed(chunks)
-
-    db = FaissVectorDB(dim=embeddings.shape[1])
-    db.add(embeddings, chunks)
+    db = load_or_build_index(pdf_path, embedder)
 
     q_emb = embedder.embed_single(question)
     hits = db.search(q_emb, top_k=top_k)
@@ -1,25 +1,14 @@
-from typing import Dict
+from concurrent.futures import Executor
+from contextlib import nullcontext
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 from pathlib import Path
+import asyncio
+import hashlib
 import os
-
-# Try new imports first, fallback to old
-try:
-    from langchain_community.vectorstores import Chroma
-except ImportError:
-    from langchain.vectorstores import Chroma
-
-try:
-    from langchain_openai import OpenAIEmbeddings, ChatOpenAI
-except ImportError:
-    try:
-        from langchain.embeddings import OpenAIEmbeddings
-        from langchain.chat_models import ChatOpenAI
-    except ImportError:
-        from langchain_openai import OpenAIEmbeddings, ChatOpenAI
+import time
 
 # Try new prompt imports first, fallback to old
 PromptTemplate = None
-LLMChain = None
 
 try:
     from langchain.prompts import PromptTemplate
@@ -29,15 +18,7 @@ except Exception:
     except Exception:
         pass
 
-try:
-    from langchain.chains import LLMChain
-except Exception:
-    try:
-        from langchain_core.chains import LLMChain
-    except Exception:
-        pass
-
-# If we still don't have PromptTemplate and LLMChain, create simple versions
+# If we still don't have PromptTemplate, create a simple version
 if not PromptTemplate:
     class PromptTemplate:
         def __init__(self, input_variables, template):
@@ -50,61 +31,204 @@ if not PromptTemplate:
                 result = result.replace("{" + key + "}", str(value))
             return result
 
-if not LLMChain:
-    class LLMChain:
-        def __init__(self, llm, prompt):
-            self.llm = llm
-            self.prompt = prompt
-        
-        def invoke(self, inputs):
-            formatted_prompt = self.prompt.format(**inputs)
-            result = self.llm.invoke(formatted_prompt)
-            if hasattr(result, 'content'):
-                return {"text": result.content}
-            return {"text": str(result)}
-        
-        def run(self, **kwargs):
-            formatted_prompt = self.prompt.format(**kwargs)
-            result = self.llm.invoke(formatted_prompt)
-            if hasattr(result, 'content'):
-                return result.content
-            return str(result)
-
-# Use free sentence-transformers if no OpenAI key
-try:
-    from langchain_community.embeddings import HuggingFaceEmbeddings
-except ImportError:
-    HuggingFaceEmbeddings = None
+from .answer_cache import get_answer_cache
+from .chroma_pool import CORPUS_COLLECTION, get_pool, read_version
+from .context_packer import CONTEXT_FALLBACK_TOKENS, pack_context
+from .llm_clients import run as run_async
+from .embedding_service import get_embedding_service
+from .model_router import get_router
+from .lexical import get_lexical_index, is_identifier, reciprocal_rank_fusion, words
+from .loader import Document
+from . import reranker
 
 
 ROOT_DIR = Path(__file__).resolve().parent.parent
 DB_DIR = ROOT_DIR / "rag" / "db"
 
 
-def get_embeddings():
-    """Return embeddings - use HuggingFace free embeddings first, then try OpenAI if configured."""
-    # Try free HuggingFace embeddings first (more reliable for embeddings task)
-    if HuggingFaceEmbeddings:
-        try:
-            return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        except Exception as e:
-            print(f"HuggingFace embeddings failed: {e}, falling back to OpenAI")
-    
-    # Fall back to OpenAI if key exists
-    if os.getenv("OPENAI_API_KEY"):
-        try:
-            return OpenAIEmbeddings()
-        except Exception as e:
-            print(f"OpenAI embeddings failed: {e}")
-    
-    # Last resort: try OpenAI anyway (will fail if no key)
-    try:
-        return OpenAIEmbeddings()
-    except Exception:
-        # If all else fails, return HuggingFace even if it seemed to fail
-        if HuggingFaceEmbeddings:
-            return HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        raise RuntimeError("No embeddings provider available")
+ANSWER_TEMPLATE = "Based on the following context, answer the question concisely.\n\nContext:\n{context}\n\nQuestion: {question}\n\nAnswer:"
+NOT_PROCESSED = "Document not yet processed. Please wait for processing to complete."
+NO_RESULTS = "No relevant information found in the document for this question."
+
+# Share of the fused ranking given to BM25 (0 = vector search only)
+HYBRID_WEIGHT = float(os.getenv("HYBRID_WEIGHT", "0.5"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = 60
+# Bare identifier lookups ("ZX-00012?", "what is part ZX-00012") are answered from BM25 alone, without embedding
+HYBRID_LEXICAL_SHORTCUT = os.getenv("HYBRID_LEXICAL_SHORTCUT", "false").lower() in ("1", "true", "yes")
+# Words a bare lookup may have besides its identifiers
+_LOOKUP_WORDS = frozenset(
+    "a an the what what's whats is are was which who where find show me look up lookup for of about on "
+    "part item number no id code sku model ref reference please".split()
+)
+
+# Questions accepted per batch call, and answers one batch generates at a time
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", "8"))
+
+
+def _lookup_or_retrieve(doc_id: str, question: str, k: int, persist_dir: str, collection: str = None,
+                        where: Optional[Dict] = None,
+                        timings: Optional[Dict] = None) -> Tuple[Optional[Dict], List, Optional[Tuple]]:
+    """Answer from the cache, or embed the question and search the pooled collection (blocking).
+
+    `collection` defaults to the document's own; corpus queries pass the shared
+    collection with a `where` filter, and `doc_id` is then only the cache key.
+    With reranking enabled, `RERANK_CANDIDATES` chunks are retrieved and the
+    cross-encoder keeps the best `k`. Stage durations in ms are written to `timings`.
+    Returns `(cached_answer, docs, cache_key)`; pass `cache_key` to `_remember` with the fresh answer.
+    """
+    timings = {} if timings is None else timings
+    start = time.perf_counter()
+    collection = collection or doc_id
+    cache = get_answer_cache()
+    version = read_version(persist_dir, collection)
+    cached, embedding = cache.lookup(doc_id, question, version, embed=get_embedding_service().embed_query)
+    if cached is not None:
+        timings["retrieve_ms"] = _elapsed_ms(start)
+        return cached, [], None
+
+    fetch_k = _fetch_k(k)
+    vectordb = get_pool().get(persist_dir, collection)
+    lexical = get_lexical_index(persist_dir, doc_id) if collection == doc_id and HYBRID_WEIGHT > 0 else None
+    if collection != doc_id:
+        docs = _scored_search(vectordb, question, embedding, fetch_k, where)
+    elif lexical is not None:
+        docs = _hybrid_search(vectordb, lexical, persist_dir, doc_id, question, embedding, fetch_k)
+    elif embedding is not None:
+        # Already embedded for the near-duplicate check - don't embed twice
+        docs = vectordb.similarity_search_by_vector(embedding.tolist(), k=fetch_k)
+    else:
+        docs = vectordb.similarity_search(question, k=fetch_k)
+    timings["retrieve_ms"] = _elapsed_ms(start)
+    return None, _rerank(question, docs, k, timings), (doc_id, question, version, embedding)
+
+
+def _retrieve_and_pack(doc_id: str, question: str, k: int, persist_dir: str, collection: str = None,
+                       where: Optional[Dict] = None,
+                       timings: Optional[Dict] = None) -> Tuple[Optional[Dict], str, List, Optional[Tuple]]:
+    """`_lookup_or_retrieve`, then the chunks packed into the context (blocking: the tokenizer runs here).
+
+    Returns `(cached_answer, context, docs, cache_key)`, where `docs` are the chunks `context` draws on.
+    """
+    cached, docs, cache_key = _lookup_or_retrieve(doc_id, question, k, persist_dir, collection, where, timings)
+    context, docs = pack_context(docs) if docs else ("", docs)
+    return cached, context, docs, cache_key
+
+
+def _fetch_k(k: int) -> int:
+    return max(k, reranker.RERANK_CANDIDATES) if reranker.RERANK_ENABLED else k
+
+
+def _rerank(question: str, docs: List, k: int, timings: Dict) -> List:
+    """Best `k` of the retrieved `docs`, by the cross-encoder when it runs, else in retrieval order."""
+    if len(docs) <= k:
+        return docs
+    start = time.perf_counter()
+    reranked = reranker.get_reranker().rerank(question, docs, k)
+    if reranked is None:
+        return docs[:k]
+    timings["rerank_ms"] = _elapsed_ms(start)
+    return reranked
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.perf_counter() - start) * 1000, 2)
+
+
+def _hybrid_search(vectordb, lexical, persist_dir: str, doc_id: str, question: str, embedding, k: int) -> List:
+    """Fuse BM25 and vector rankings of the document's chunks with weighted reciprocal rank fusion."""
+    candidates = max(k, HYBRID_CANDIDATES)
+    lexical_hits = [position for position, _ in lexical.search(question, candidates)]
+
+    if embedding is None and _lexical_shortcut(lexical, question):
+        vector_docs = []
+    elif embedding is not None:
+        vector_docs = vectordb.similarity_search_by_vector(embedding.tolist(), k=candidates)
+    else:
+        vector_docs = vectordb.similarity_search(question, k=candidates)
+    return _fuse(vector_docs, lexical_hits, persist_dir, doc_id, k)
+
+
+def _lexical_shortcut(lexical, question: str) -> bool:
+    """Whether BM25 alone answers `question`: a bare lookup of identifiers found in the document.
+
+    Any other word keeps the vector side, so questions that merely mention an
+    identifier ("Q3", "COVID-19") are still fused as `HYBRID_WEIGHT` says.
+    """
+    if not HYBRID_LEXICAL_SHORTCUT:
+        return False
+    identifiers = []
+    for word in words(question):
+        if is_identifier(word):
+            identifiers.append(word)
+        elif word not in _LOOKUP_WORDS:
+            return False
+    return bool(identifiers) and all(lexical.document_frequency(term) for term in identifiers)
+
+
+def _fuse(vector_docs: List, lexical_hits: List[int], persist_dir: str, doc_id: str, k: int) -> List:
+    """Top `k` chunks by weighted RRF of the vector and BM25 rankings, fetching lexical-only hits."""
+    by_position = {d.metadata.get("chunk"): d for d in vector_docs}
+    order = reciprocal_rank_fusion(
+        [([d.metadata.get("chunk") for d in vector_docs], 1 - HYBRID_WEIGHT), (lexical_hits, HYBRID_WEIGHT)],
+        k=RRF_K,
+    )[:k]
+
+    missing = [position for position in order if position not in by_position]
+    if missing:
+        # Lexical-only hits: fetch their text by the ids ingestion assigned
+        found = get_pool().collection(persist_dir, doc_id).get(
+            ids=[f"{doc_id}-{position}" for position in missing], include=["documents", "metadatas"]
+        )
+        for text, metadata in zip(found["documents"], found["metadatas"]):
+            by_position[metadata.get("chunk")] = Document(page_content=text, metadata=metadata)
+    return [by_position[position] for position in order if position in by_position]
+
+
+def _scored_search(vectordb, question: str, embedding, k: int, where: Optional[Dict]) -> List:
+    """Nearest chunks across documents, best first, with each chunk's distance in its metadata."""
+    if embedding is not None:
+        pairs = vectordb.similarity_search_by_vector_with_relevance_scores(embedding.tolist(), k=k, filter=where)
+    else:
+        pairs = vectordb.similarity_search_with_score(question, k=k, filter=where)
+    docs = []
+    for doc, distance in sorted(pairs, key=lambda pair: pair[1]):
+        doc.metadata = {**doc.metadata, "distance": round(float(distance), 4)}
+        docs.append(doc)
+    return docs
+
+
+def _corpus_scope(doc_ids: Optional[List[str]]) -> Tuple[str, Optional[Dict]]:
+    """Cache key and Chroma filter for a corpus query over `doc_ids` (None means every document)."""
+    if not doc_ids:
+        return "corpus:all", None
+    ids = sorted(set(doc_ids))
+    key = "corpus:" + hashlib.sha1(",".join(ids).encode("utf-8")).hexdigest()
+    return key, ({"doc_id": ids[0]} if len(ids) == 1 else {"doc_id": {"$in": ids}})
+
+
+def _remember(cache_key: Optional[Tuple], result: Dict) -> Dict:
+    if cache_key is not None:
+        doc_id, question, version, embedding = cache_key
+        get_answer_cache().put(doc_id, question, version, result, embedding)
+    return result
+
+
+def _get_llm():
+    """Return the shared answer model router, or None when no API key is configured."""
+    return get_router(temperature=0)
+
+
+def _answer_prompt():
+    return PromptTemplate(input_variables=["context", "question"], template=ANSWER_TEMPLATE)
+
+
+def _context_answer(docs: List) -> Dict:
+    # Fallback: return context directly (no LLM), packed to a smaller budget
+    context, docs = pack_context(docs, CONTEXT_FALLBACK_TOKENS)
+    answer = f"Based on your document, here's what I found:\n\n{context}"
+    return {"answer": answer, "sources": [d.metadata for d in docs]}
 
 
 def query_doc(doc_id: str, question: str, k: int = 4, persist_dir: str = None) -> Dict:
@@ -116,64 +240,314 @@ def query_doc(doc_id: str, question: str, k: int = 4, persist_dir: str = None) -
         persist_dir = str(DB_DIR)
     
     # Check if collection directory exists
-    collection_dir = Path(persist_dir)
-    if not collection_dir.exists():
-        return {
-            "answer": "Document not yet processed. Please wait for processing to complete.",
-            "sources": []
-        }
+    if not Path(persist_dir).exists():
+        return {"answer": NOT_PROCESSED, "sources": []}
     
     try:
-        embeddings = get_embeddings()
-        vectordb = Chroma(
-            persist_directory=persist_dir,
-            embedding_function=embeddings,
-            collection_name=doc_id,
-        )
-
-        docs = vectordb.similarity_search(question, k=k)
-        
+        cached, context, docs, cache_key = _retrieve_and_pack(doc_id, question, k, persist_dir)
+        if cached is not None:
+            return cached
         if not docs:
-            return {
-                "answer": "No relevant information found in the document for this question.",
-                "sources": []
-            }
-        
-        context = "\n\n".join([d.page_content for d in docs])
+            return {"answer": NO_RESULTS, "sources": []}
 
         # If OpenAI key exists, use LLM for answer generation
-        api_key = os.getenv("OPENAI_API_KEY")
-        api_base = os.getenv("OPENAI_API_BASE")
-        if api_key and PromptTemplate and LLMChain:
-            try:
-                # Use Featherless model
-                if api_base:
-                    llm = ChatOpenAI(
-                        temperature=0,
-                        model="openai/gpt-oss-120b",
-                        base_url=api_base,
-                        api_key=api_key
-                    )
-                else:
-                    llm = ChatOpenAI(temperature=0, model="openai/gpt-oss-120b", api_key=api_key)
-                
-                prompt = PromptTemplate(
-                    input_variables=["context", "question"],
-                    template="Based on the following context, answer the question concisely.\n\nContext:\n{context}\n\nQuestion: {question}\n\nAnswer:",
-                )
-                chain = LLMChain(llm=llm, prompt=prompt)
-                answer = chain.run({"context": context, "question": question})
-                return {"answer": answer, "sources": [d.metadata for d in docs]}
-            except Exception as e:
-                # Fallback if LLM fails
-                pass
+        llm = None
+        try:
+            llm = _get_llm()
+            if llm:
+                answer = llm.invoke(_answer_prompt().format(context=context, question=question))
+                return _remember(cache_key, {"answer": answer, "sources": [d.metadata for d in docs]})
+        except Exception:
+            pass  # Fallback if LLM fails
         
-        # Fallback: return context directly (no LLM)
-        answer = f"Based on your document, here's what I found:\n\n{context[:1500]}"
-        return {"answer": answer, "sources": [d.metadata for d in docs]}
+        # Don't pin a degraded answer in the cache when the LLM failed
+        result = _context_answer(docs)
+        return _remember(cache_key, result) if llm is None else result
         
     except Exception as e:
         return {
             "answer": f"Error querying document: {str(e)}",
             "sources": []
         }
+
+
+async def aquery_doc(doc_id: str, question: str, k: int = 4, persist_dir: str = None,
+                     executor: Optional[Executor] = None, llm_semaphore: Optional[asyncio.Semaphore] = None) -> Dict:
+    """Async `query_doc` for the API event loop.
+
+    Retrieval (embedding + Chroma I/O) runs on `executor` and the answer comes from
+    the chat model's async client, bounded by `llm_semaphore`, so one slow question
+    never stalls other requests on the same worker.
+    """
+    if persist_dir is None:
+        persist_dir = str(DB_DIR)
+
+    if not Path(persist_dir).exists():
+        return {"answer": NOT_PROCESSED, "sources": []}
+
+    loop = asyncio.get_running_loop()
+    timings = {}
+    try:
+        cached, context, docs, cache_key = await loop.run_in_executor(
+            executor, _retrieve_and_pack, doc_id, question, k, persist_dir, None, None, timings
+        )
+        return await _agenerate(question, cached, context, docs, cache_key, llm_semaphore, timings, executor)
+    except Exception as e:
+        return {
+            "answer": f"Error querying document: {str(e)}",
+            "sources": []
+        }
+
+
+async def aquery_corpus(question: str, doc_ids: Optional[List[str]] = None, k: int = 6, persist_dir: str = None,
+                        executor: Optional[Executor] = None,
+                        llm_semaphore: Optional[asyncio.Semaphore] = None) -> Dict:
+    """Answer from the shared corpus collection, across `doc_ids` or every document when None.
+
+    One filtered search over one collection, whatever the number of documents;
+    sources come back best first with their `doc_id` and `distance`.
+    """
+    if persist_dir is None:
+        persist_dir = str(DB_DIR)
+
+    if not Path(persist_dir).exists():
+        return {"answer": NOT_PROCESSED, "sources": []}
+
+    cache_id, where = _corpus_scope(doc_ids)
+    loop = asyncio.get_running_loop()
+    timings = {}
+    try:
+        cached, context, docs, cache_key = await loop.run_in_executor(
+            executor, _retrieve_and_pack, cache_id, question, k, persist_dir, CORPUS_COLLECTION, where, timings
+        )
+        return await _agenerate(question, cached, context, docs, cache_key, llm_semaphore, timings, executor)
+    except Exception as e:
+        return {
+            "answer": f"Error querying documents: {str(e)}",
+            "sources": []
+        }
+
+
+def _retrieve_batch(doc_id: str, questions: List[str], k: int, persist_dir: str,
+                    timings: Dict) -> List[Tuple[Optional[Dict], str, List, Optional[Tuple], Dict]]:
+    """Blocking retrieval for many questions: one encode call and one Chroma query for every cache miss.
+
+    Returns `(cached_answer, context, docs, cache_key, timings)` per question, in order.
+    """
+    start = time.perf_counter()
+    cache = get_answer_cache()
+    semantic = cache.similarity_threshold > 0
+    version = read_version(persist_dir, doc_id)
+    results: List = [None] * len(questions)
+    misses = []
+    for i, question in enumerate(questions):
+        # With near-duplicate matching, the miss is counted by the lookup below
+        cached, _ = cache.lookup(doc_id, question, version, count_miss=not semantic)
+        if cached is not None:
+            results[i] = (cached, "", [], None, {})
+        else:
+            misses.append(i)
+    if not misses:
+        timings["retrieve_ms"] = _elapsed_ms(start)
+        return results
+
+    lexical = get_lexical_index(persist_dir, doc_id) if HYBRID_WEIGHT > 0 else None
+    # As in /query: a bare identifier lookup skips embedding when nothing else needs its vector
+    lexical_only = set()
+    if lexical is not None and not semantic:
+        lexical_only = {i for i in misses if _lexical_shortcut(lexical, questions[i])}
+    unique = list(dict.fromkeys(questions[i] for i in misses if i not in lexical_only))
+    vectors = dict(zip(unique, get_embedding_service().embed_documents(unique))) if unique else {}
+    timings["embed_ms"] = _elapsed_ms(start)
+
+    pending = []
+    for i in misses:
+        embedding = None
+        if semantic:
+            # Near-duplicate check reuses the batch's vectors
+            cached, embedding = cache.lookup(doc_id, questions[i], version, embed=vectors.__getitem__)
+            if cached is not None:
+                results[i] = (cached, "", [], None, {})
+                continue
+        pending.append((i, embedding))
+
+    if pending:
+        fetch_k = _fetch_k(k)
+        candidates = max(fetch_k, HYBRID_CANDIDATES) if lexical is not None else fetch_k
+        searched = [(i, embedding) for i, embedding in pending if i not in lexical_only]
+        found = {"documents": [], "metadatas": []}
+        if searched:
+            found = get_pool().read_collection(persist_dir, doc_id).query(
+                query_embeddings=[vectors[questions[i]] for i, _ in searched],
+                n_results=candidates,
+                include=["documents", "metadatas"],
+            )
+        hits = {
+            i: [Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas)]
+            for (i, _), texts, metadatas in zip(searched, found["documents"], found["metadatas"])
+        }
+        for i, embedding in pending:
+            question = questions[i]
+            docs = hits.get(i, [])
+            if lexical is not None:
+                lexical_hits = [position for position, _ in lexical.search(question, candidates)]
+                docs = _fuse(docs, lexical_hits, persist_dir, doc_id, fetch_k)
+            results[i] = (None, "", docs, (doc_id, question, version, embedding), {})
+    timings["retrieve_ms"] = _elapsed_ms(start)
+
+    for i, (_, _, docs, cache_key, question_timings) in enumerate(results):
+        if cache_key is not None:
+            docs = _rerank(questions[i], docs, k, question_timings)
+            context, docs = pack_context(docs) if docs else ("", docs)
+            results[i] = (None, context, docs, cache_key, question_timings)
+    return results
+
+
+async def aquery_doc_batch(doc_id: str, questions: List[str], k: int = 4, persist_dir: str = None,
+                           executor: Optional[Executor] = None,
+                           llm_semaphore: Optional[asyncio.Semaphore] = None,
+                           max_concurrency: int = None) -> Dict:
+    """Answer many questions about one document in a single pass.
+
+    The questions are embedded in one `encode` call and searched with one Chroma
+    query (as in `aquery_doc`, with `HYBRID_LEXICAL_SHORTCUT` a bare lookup of
+    identifiers found in the document is answered from BM25 alone). Answers are
+    then generated concurrently, at most `max_concurrency` (default
+    `BATCH_LLM_CONCURRENCY`) at a time from this batch, and still within
+    `llm_semaphore`. Results come back in question order, each with its own timings.
+    """
+    if persist_dir is None:
+        persist_dir = str(DB_DIR)
+
+    if not Path(persist_dir).exists():
+        return {"results": [{"question": q, "answer": NOT_PROCESSED, "sources": []} for q in questions]}
+
+    start = time.perf_counter()
+    timings = {}
+    loop = asyncio.get_running_loop()
+    try:
+        retrieved = await loop.run_in_executor(executor, _retrieve_batch, doc_id, questions, k, persist_dir, timings)
+    except Exception as e:
+        error = f"Error querying document: {str(e)}"
+        return {"results": [{"question": q, "answer": error, "sources": []} for q in questions], "timings": timings}
+
+    batch_slots = asyncio.Semaphore(max(1, max_concurrency or BATCH_LLM_CONCURRENCY))
+
+    async def answer(question: str, cached, context, docs, cache_key, question_timings) -> Dict:
+        async with batch_slots:
+            try:
+                result = await _agenerate(question, cached, context, docs, cache_key, llm_semaphore,
+                                          question_timings, executor)
+            except Exception as e:
+                result = {"answer": f"Error querying document: {str(e)}", "sources": [], "timings": question_timings}
+        result["timings"]["total_ms"] = _elapsed_ms(start)
+        return {"question": question, **result}
+
+    results = await asyncio.gather(*(answer(q, *r) for q, r in zip(questions, retrieved)))
+    timings["total_ms"] = _elapsed_ms(start)
+    return {"results": list(results), "timings": timings}
+
+
+def query_doc_batch(doc_id: str, questions: List[str], k: int = 4, persist_dir: str = None,
+                    max_concurrency: int = None) -> Dict:
+    """Blocking `aquery_doc_batch` for scripts and notebooks (not for use inside an event loop)."""
+    return run_async(aquery_doc_batch(doc_id, questions, k, persist_dir, max_concurrency=max_concurrency))
+
+
+async def _agenerate(question: str, cached: Optional[Dict], context: str, docs: List, cache_key: Optional[Tuple],
+                     llm_semaphore: Optional[asyncio.Semaphore], timings: Optional[Dict] = None,
+                     executor: Optional[Executor] = None) -> Dict:
+    """Answer from the packed `context` of `docs`; the result carries the stage `timings` (kept out of the answer cache).
+
+    The context fallback is packed again on `executor`, off the event loop.
+    """
+    timings = {} if timings is None else timings
+    if cached is not None:
+        return {**cached, "timings": timings}
+    if not docs:
+        return {"answer": NO_RESULTS, "sources": [], "timings": timings}
+
+    start = time.perf_counter()
+    llm = None
+    try:
+        llm = _get_llm()
+        if llm:
+            prompt = _answer_prompt().format(context=context, question=question)
+            async with llm_semaphore or nullcontext():
+                answer = await llm.ainvoke(prompt)
+            result = _remember(cache_key, {"answer": answer, "sources": [d.metadata for d in docs]})
+            timings["generate_ms"] = _elapsed_ms(start)
+            return {**result, "timings": timings}
+    except Exception:
+        pass  # Fallback if LLM fails
+
+    result = await asyncio.get_running_loop().run_in_executor(executor, _context_answer, docs)
+    if llm is None:
+        _remember(cache_key, result)
+    timings["generate_ms"] = _elapsed_ms(start)
+    return {**result, "timings": timings}
+
+
+async def astream_query_doc(doc_id: str, question: str, k: int = 4, persist_dir: str = None,
+                            executor: Optional[Executor] = None,
+                            llm_semaphore: Optional[asyncio.Semaphore] = None) -> AsyncIterator[Tuple[str, object]]:
+    """Stream an answer as `(event, data)` pairs for server-sent events.
+
+    `sources` is sent as soon as retrieval finishes, then the answer arrives as
+    `token` chunks from the chat model and the stream ends with `done`. Without an
+    LLM the context fallback is sent as a single token.
+    """
+    if persist_dir is None:
+        persist_dir = str(DB_DIR)
+
+    if not Path(persist_dir).exists():
+        for event in (("sources", []), ("token", NOT_PROCESSED), ("done", None)):
+            yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    try:
+        cached, context, docs, cache_key = await loop.run_in_executor(
+            executor, _retrieve_and_pack, doc_id, question, k, persist_dir
+        )
+    except Exception as e:
+        yield "error", f"Error querying document: {str(e)}"
+        return
+
+    if cached is not None:
+        for event in (("sources", cached["sources"]), ("token", cached["answer"]), ("done", None)):
+            yield event
+        return
+
+    if not docs:
+        for event in (("sources", []), ("token", NO_RESULTS), ("done", None)):
+            yield event
+        return
+
+    yield "sources", [d.metadata for d in docs]
+
+    llm = None
+    parts = []
+    try:
+        llm = _get_llm()
+        if llm:
+            prompt = _answer_prompt().format(context=context, question=question)
+            async with llm_semaphore or nullcontext():
+                async for text in llm.astream(prompt):
+                    if text:
+                        parts.append(text)
+                        yield "token", text
+            if parts:
+                _remember(cache_key, {"answer": "".join(parts), "sources": [d.metadata for d in docs]})
+    except Exception as e:
+        if parts:
+            # Part of the answer is already out - report instead of appending the fallback
+            yield "error", f"Answer generation failed: {str(e)}"
+            return
+
+    if not parts:
+        result = await loop.run_in_executor(executor, _context_answer, docs)
+        if llm is None:
+            _remember(cache_key, result)
+        yield "token", result["answer"]
+    yield "done", None
@@ -0,0 +1,128 @@
+"""reranker.py
+
+Optional cross-encoder rerank stage for retrieved chunks.
+
+Retrieval fetches `RERANK_CANDIDATES` chunks cheaply, a small CPU cross-encoder
+scores every (question, chunk) pair in batches, and only the best k reach the
+prompt - fewer, better chunks mean fewer prompt tokens and faster generation.
+
+The stage is off unless `RERANK_ENABLED` is set. Under load it sheds itself:
+when `RERANK_MAX_CONCURRENCY` reranks are already running in this process,
+further queries keep the retrieval order instead of queueing for the model.
+"""
+from typing import Dict, List, Optional
+import os
+import threading
+import time
+
+import numpy as np
+
+try:
+    from sentence_transformers import CrossEncoder
+except Exception:
+    CrossEncoder = None
+
+
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "32"))
+RERANK_MAX_CONCURRENCY = int(os.getenv("RERANK_MAX_CONCURRENCY", "2"))
+
+
+class Reranker:
+    """Scores (question, chunk) pairs with a shared CrossEncoder, loaded on first use."""
+
+    def __init__(self, model_name: str = RERANK_MODEL, batch_size: int = RERANK_BATCH_SIZE,
+                 max_concurrency: int = RERANK_MAX_CONCURRENCY):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._slots = threading.BoundedSemaphore(max(1, max_concurrency))
+        self._lock = threading.Lock()  # counters only, so stats() never waits on a model load
+        self._load_lock = threading.Lock()
+        self._model = None
+        self._failed = False
+        self._reranked = 0
+        self._skipped = 0
+        self._pairs = 0
+        self._total_ms = 0.0
+
+    def _load(self):
+        if self._model is None and not self._failed:
+            with self._load_lock:
+                if self._model is None and not self._failed:
+                    try:
+                        if CrossEncoder is None:
+                            raise RuntimeError("sentence-transformers not installed")
+                        self._model = CrossEncoder(self.model_name)
+                    except Exception as e:
+                        # Keep serving with the retrieval order rather than failing queries
+                        print(f"Reranker {self.model_name} unavailable: {e}")
+                        self._failed = True
+        return self._model
+
+    def rerank(self, question: str, docs: List, k: int) -> Optional[List]:
+        """Return the best `k` of `docs` with `rerank_score` in their metadata.
+
+        Returns None when the stage is saturated or the model can't be loaded;
+        callers then keep the retrieval order.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._skipped += 1
+            return None
+        try:
+            model = self._load()
+            if model is None:
+                return None
+            start = time.perf_counter()
+            scores = np.asarray(model.predict(
+                [(question, d.page_content) for d in docs], batch_size=self.batch_size, show_progress_bar=False
+            ), dtype=np.float32).reshape(len(docs), -1)[:, -1]
+            elapsed = (time.perf_counter() - start) * 1000
+        finally:
+            self._slots.release()
+
+        with self._lock:
+            self._reranked += 1
+            self._pairs += len(docs)
+            self._total_ms += elapsed
+
+        ranked = []
+        for i in np.argsort(-scores, kind="stable")[:k]:
+            doc = docs[i]
+            doc.metadata = {**doc.metadata, "rerank_score": round(float(scores[i]), 4)}
+            ranked.append(doc)
+        return ranked
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "enabled": RERANK_ENABLED,
+                "model": self.model_name,
+                "loaded": self._model is not None,
+                "reranked": self._reranked,
+                "skipped_under_load": self._skipped,
+                "pairs": self._pairs,
+                "avg_ms": round(self._total_ms / self._reranked, 2) if self._reranked else 0.0,
+            }
+
+
+_reranker: Optional[Reranker] = None
+_reranker_lock = threading.Lock()
+
+
+def get_reranker() -> Reranker:
+    global _reranker
+    if _reranker is None:
+        with _reranker_lock:
+            if _reranker is None:
+                _reranker = Reranker()
+    return _reranker
+
+
+def stats() -> Dict:
+    """Reranker counters for /metrics (never loads the model)."""
+    if _reranker is None:
+        return {"enabled": RERANK_ENABLED, "model": RERANK_MODEL, "loaded": False}
+    return _reranker.stats()
@@ -0,0 +1,179 @@
+"""text_analyzer.py
+
+Rule-based document insights (used when no LLM is available, and for the
+fields an LLM call failed to produce).
+
+`TextAnalyzer` reads a document page by page and computes the summary, topics,
+entities, action items and reading stats together. It never builds the joined
+text. Each page is split into words once for the stats, then scanned once with
+a single precompiled pattern that matches dates, capitalized phrases (topics and
+organizations) and action sentences. The tail of a page after its last sentence
+end is carried over to the next page, so sentences that cross a page break are
+scanned whole.
+"""
+from collections import Counter
+from typing import Dict, Iterable, List, Union
+import heapq
+import re
+
+
+SUMMARY_SENTENCES = 3
+MAX_TOPICS = 5
+MAX_ENTITIES = 3
+MAX_ACTIONS_PER_KIND = 2
+MAX_ACTIONS = 5
+# Longest page tail carried over to the next page to keep a sentence whole
+MAX_CARRY_CHARS = 4096
+WORDS_PER_MINUTE = 200
+
+_MONTHS = "January|February|March|April|May|June|July|August|September|October|November|December"
+
+# Every branch starts at a word boundary, so most positions fail on the first check.
+# Action keywords match a capital or lower-case first letter: cheaper than (?i).
+_PATTERN = re.compile(
+    rf"""
+    \b(?:
+        (?P<date>
+            \d{{1,2}}(?P<sep>[/-])\d{{1,2}}(?P=sep)\d{{2,4}}\b
+          | (?:{_MONTHS})\s+\d{{1,2}},?\s+\d{{4}}\b
+        )
+      | (?=(?P<action>(?:[Ss]hould|[Mm]ust|[Nn]eed\ to|[Rr]equired\ to|[Rr]ecommend|[Ss]uggest)[^.]{{0,300}}\.))
+      | (?=(?P<task>(?:[Aa]ction|[Tt]ask|[Tt]odo|[Ss]tep)[\s:]+[^.]{{0,300}}\.))
+      | (?P<cap>
+            (?P<phrase>[A-Z][a-z]+(?:\s+[A-Z][a-z]+)*\b)
+            (?P<suffix>,?\s+(?:LLC|Inc|Corp|Ltd)\b)?
+        )
+    )
+    """,
+    re.VERBOSE,
+)
+_ORG_WORD = re.compile(r"\b(?:Inc|Corp|Ltd|LLC|Company|University|Institute|Center)\b")
+_SENTENCE = re.compile(r"[^.!?]+")
+_LAST_SENTENCE_END = re.compile(r".*[.!?](?=\s)", re.DOTALL)
+_LAST_SPACE = re.compile(r".*\s", re.DOTALL)
+
+
+class TextAnalyzer:
+    """Feed pages in order with `feed`, then read the insights with `result`."""
+
+    def __init__(self):
+        self.words = 0
+        self.chars = 0  # non-whitespace characters, i.e. total word length
+        self.sentences: List[str] = []
+        self.phrases: Counter = Counter()
+        self.organizations: Dict[str, None] = {}
+        self.dates: Dict[str, None] = {}
+        self.actions: Dict[str, List[str]] = {"action": [], "task": []}
+        self._carry = ""
+
+    def feed(self, text: str) -> None:
+        buffer = self._carry + "\n\n" + text if self._carry else text
+        match = _LAST_SENTENCE_END.match(buffer)
+        cut = match.end() if match else 0
+        if len(buffer) - cut > MAX_CARRY_CHARS:
+            match = _LAST_SPACE.match(buffer)
+            cut = match.end() if match else len(buffer)
+        self._scan(buffer[:cut])
+        self._carry = buffer[cut:]
+
+    def _scan(self, text: str) -> None:
+        words = text.split()
+        self.words += len(words)
+        self.chars += sum(map(len, words))
+
+        if len(self.sentences) < SUMMARY_SENTENCES:
+            for match in _SENTENCE.finditer(text):
+                sentence = match.group().strip()
+                if len(sentence) > 20:
+                    self.sentences.append(sentence)
+                    if len(self.sentences) == SUMMARY_SENTENCES:
+                        break
+
+        phrases, organizations, dates, actions = self.phrases, self.organizations, self.dates, self.actions
+        for match in _PATTERN.finditer(text):
+            kind = match.lastgroup
+            if kind == "cap":
+                phrase = match.group("phrase")
+                if len(organizations) < MAX_ENTITIES:
+                    suffix = match.group("suffix")
+                    if suffix:
+                        organizations.setdefault(phrase + suffix, None)
+                    elif phrase not in phrases and _ORG_WORD.search(phrase):
+                        organizations.setdefault(phrase, None)
+                phrases[phrase] += 1
+            elif kind == "date":
+                if len(dates) < MAX_ENTITIES:
+                    dates.setdefault(match.group("date"), None)
+            elif len(actions[kind]) < MAX_ACTIONS_PER_KIND:
+                action = match.group(kind).strip()[:100]
+                if action not in actions[kind]:
+                    actions[kind].append(action)
+
+    def _flush(self) -> None:
+        if self._carry:
+            carry, self._carry = self._carry, ""
+            self._scan(carry)
+
+    def reading_time(self) -> str:
+        self._flush()
+        if not self.words:
+            return "< 1 minute"
+        minutes = self.words / WORDS_PER_MINUTE
+        if minutes < 1:
+            return "< 1 minute"
+        if minutes < 60:
+            return f"{int(minutes)} minutes"
+        hours = int(minutes // 60)
+        mins = int(minutes % 60)
+        return f"{hours}h {mins}m"
+
+    def complexity(self) -> str:
+        self._flush()
+        if not self.words:
+            return "Unknown"
+        avg_len = self.chars / self.words
+        if avg_len > 6:
+            return "High"
+        if avg_len > 4.5:
+            return "Medium"
+        return "Low"
+
+    def document_stats(self) -> Dict:
+        return {
+            "estimated_reading_time": self.reading_time(),
+            "complexity_score": self.complexity(),
+        }
+
+    def result(self) -> Dict:
+        """Insights in the same shape the LLM path returns."""
+        self._flush()
+        summary = '. '.join(self.sentences) + '.' if self.sentences else "Document processed successfully."
+        if len(summary) > 500:
+            summary = summary[:500] + '...'
+
+        # Most frequent first, ties in order of first appearance
+        topics = heapq.nlargest(MAX_TOPICS, (p for p in self.phrases if len(p) > 3), key=self.phrases.__getitem__)
+        if not topics:
+            topics = ["Document Analysis", "Information Processing"]
+
+        return {
+            "summary": summary,
+            "key_topics": topics,
+            "entities": {
+                "people": [],
+                "organizations": list(self.organizations),
+                "dates": list(self.dates),
+                "locations": [],
+            },
+            "action_items": (self.actions["action"] + self.actions["task"])[:MAX_ACTIONS],
+            "sentiment": "Neutral",
+            "document_stats": self.document_stats(),
+        }
+
+
+def analyze_text(pages: Union[str, Iterable[str]]) -> TextAnalyzer:
+    """Run the analyzer over a text or over page texts in order."""
+    analyzer = TextAnalyzer()
+    for page in ([pages] if isinstance(pages, str) else pages):
+        analyzer.feed(page)
+    return analyzer
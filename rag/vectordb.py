@@ -1,8 +1,15 @@
 """vectordb.py
 
 A thin FAISS-based vector store wrapper for demo purposes.
+
+An index can be saved to a directory and loaded back memory-mapped, so a
+document is embedded once and later processes only page in what they search.
 """
-from typing import List, Tuple
+from array import array
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+import os
+
 import numpy as np
 
 try:
@@ -11,34 +18,292 @@ except Exception:
     faiss = None
 
 
+INDEX_FILE = "index.faiss"
+TEXTS_FILE = "texts.bin"
+OFFSETS_FILE = "offsets.npy"
+
+
+class ChunkStore:
+    """Chunk texts in one UTF-8 buffer plus an int64 offsets array.
+
+    Costs the encoded bytes plus 8 bytes per chunk, against ~50+ bytes of object
+    overhead per Python `str`. `ChunkStore.load(..., mmap=True)` maps both files
+    read-only, so opening a large index does not pull every chunk into memory.
+    """
+
+    def __init__(self, buffer=None, offsets=None):
+        self.readonly = buffer is not None
+        self._buffer = buffer if buffer is not None else bytearray()
+        self._offsets = offsets if offsets is not None else array("q", [0])
+
+    @classmethod
+    def from_texts(cls, texts: Sequence[str]) -> "ChunkStore":
+        store = cls()
+        store.extend(texts)
+        return store
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "ChunkStore":
+        directory = Path(directory)
+        offsets = np.load(directory / OFFSETS_FILE, mmap_mode="r" if mmap else None)
+        if mmap and offsets[-1] > 0:
+            buffer = np.memmap(directory / TEXTS_FILE, dtype=np.uint8, mode="r")
+        else:
+            buffer = (directory / TEXTS_FILE).read_bytes()
+        return cls(buffer, offsets)
+
+    def extend(self, texts: Sequence[str]) -> None:
+        if self.readonly:
+            raise RuntimeError("ChunkStore loaded from disk is read-only")
+        for text in texts:
+            self._buffer += text.encode("utf-8")
+            self._offsets.append(len(self._buffer))
+
+    def save(self, directory: Union[str, Path]) -> None:
+        directory = Path(directory)
+        (directory / TEXTS_FILE).write_bytes(bytes(self._buffer))
+        np.save(directory / OFFSETS_FILE, np.asarray(self._offsets, dtype=np.int64))
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held for the texts and offsets (on disk when memory-mapped)."""
+        return len(self._buffer) + len(self._offsets) * 8
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, idx: int) -> str:
+        start, end = int(self._offsets[idx]), int(self._offsets[idx + 1])
+        return bytes(self._buffer[start:end]).decode("utf-8")
+
+
+INDEX_TYPES = ("flat", "ivf_flat", "ivf_pq", "hnsw")
+# "auto" picks exact search for small corpora, a graph in the middle and compressed IVF at scale
+AUTO_FLAT_MAX = int(os.getenv("FAISS_AUTO_FLAT_MAX", "20000"))
+AUTO_HNSW_MAX = int(os.getenv("FAISS_AUTO_HNSW_MAX", "500000"))
+DEFAULT_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+STORAGE_TYPES = ("float32", "fp16", "int8")
+DEFAULT_STORAGE = os.getenv("FAISS_STORAGE", "float32")
+DEFAULT_EF_SEARCH = int(os.getenv("FAISS_EF_SEARCH", "64"))
+HNSW_M = 32
+# k-means wants ~39 training points per centroid; FAISS warns below that
+MIN_POINTS_PER_CENTROID = 39
+PQ_NBITS = 8
+
+
+def choose_index_type(n: int) -> str:
+    if n <= AUTO_FLAT_MAX:
+        return "flat"
+    if n <= AUTO_HNSW_MAX:
+        return "hnsw"
+    return "ivf_pq"
+
+
+def _sq_type(storage: str):
+    """FAISS scalar-quantizer type for `storage`, None for full float32 vectors."""
+    return {"float32": None, "fp16": faiss.ScalarQuantizer.QT_fp16, "int8": faiss.ScalarQuantizer.QT_8bit}[storage]
+
+
+def _unit_rows(embeddings: np.ndarray, inplace: bool = False) -> np.ndarray:
+    """L2-normalize rows for cosine similarity with at most one float32 copy."""
+    x = np.ascontiguousarray(embeddings, dtype=np.float32)
+    if x.ndim == 1:
+        x = x.reshape(1, -1)
+    # A float32 input comes back as itself or, reshaped, as a view of it
+    if not inplace and isinstance(embeddings, np.ndarray) and np.shares_memory(x, embeddings):
+        x = x.copy()
+    faiss.normalize_L2(x)  # zero rows are left as-is
+    return x
+
+
+def _pq_subquantizers(dim: int) -> int:
+    """Largest divisor of `dim` giving at least 4 dimensions per PQ sub-vector."""
+    for m in range(max(1, dim // 4), 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
 class FaissVectorDB:
-    def __init__(self, dim: int):
+    """Cosine-similarity store over FAISS.
+
+    `index_type` is one of `INDEX_TYPES` or "auto". Approximate indexes are
+    created on the first `add` and IVF variants are trained on that batch, so
+    pass a representative first batch. `nlist` defaults to ~4*sqrt(n).
+
+    `storage` keeps the vectors of flat, IVF-Flat and HNSW indexes as
+    "float32" (default), "fp16" (half the memory) or "int8" (a quarter, with
+    per-dimension ranges trained on the first batch). IVF-PQ codes are already
+    compressed and ignore it. Chunk texts always live in a compact `ChunkStore`.
+    """
+
+    def __init__(self, dim: int, index_type: str = "flat", nlist: Optional[int] = None,
+                 nprobe: int = DEFAULT_NPROBE, ef_search: int = DEFAULT_EF_SEARCH,
+                 storage: str = DEFAULT_STORAGE):
         if faiss is None:
             raise RuntimeError('faiss not installed. pip install faiss-cpu')
+        if index_type != "auto" and index_type not in INDEX_TYPES:
+            raise ValueError(f"index_type must be 'auto' or one of {INDEX_TYPES}, got {index_type!r}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"storage must be one of {STORAGE_TYPES}, got {storage!r}")
         self.dim = dim
-        # Using IndexFlatIP + normalized vectors to emulate cosine similarity
-        self.index = faiss.IndexFlatIP(dim)
-        self.texts: List[str] = []
-
-    def add(self, embeddings: np.ndarray, texts: List[str]):
-        # normalize for cosine similarity
-        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
-        norms[norms == 0] = 1.0
-        embs = embeddings / norms
-        self.index.add(embs.astype('float32'))
+        self.index_type = index_type
+        self.storage = storage
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.ef_search = ef_search
+        self.index = None
+        if index_type == "flat" and storage == "float32":
+            # Using IndexFlatIP + normalized vectors to emulate cosine similarity
+            self.index = faiss.IndexFlatIP(dim)
+        self.texts = ChunkStore()
+
+    def _create_index(self, train: np.ndarray) -> None:
+        n = len(train)
+        kind = choose_index_type(n) if self.index_type == "auto" else self.index_type
+        nlist = self.nlist or max(1, int(4 * np.sqrt(n)))
+        nlist = min(nlist, max(1, n // MIN_POINTS_PER_CENTROID))
+        if kind == "ivf_pq" and n < (1 << PQ_NBITS) * MIN_POINTS_PER_CENTROID:
+            print(f"FaissVectorDB: {n} vectors are too few to train PQ codes, using ivf_flat")
+            kind = "ivf_flat"
+        if kind.startswith("ivf") and nlist < 2:
+            print(f"FaissVectorDB: {n} vectors are too few to train IVF lists, using flat")
+            kind = "flat"
+
+        ip = faiss.METRIC_INNER_PRODUCT
+        qtype = _sq_type(self.storage)
+        if kind == "flat":
+            index = faiss.IndexFlatIP(self.dim) if qtype is None else faiss.IndexScalarQuantizer(self.dim, qtype, ip)
+        elif kind == "hnsw":
+            if qtype is None:
+                index = faiss.IndexHNSWFlat(self.dim, HNSW_M, ip)
+            else:
+                index = faiss.IndexHNSWSQ(self.dim, qtype, HNSW_M, ip)
+        else:
+            quantizer = faiss.IndexFlatIP(self.dim)
+            if kind == "ivf_pq":
+                index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, _pq_subquantizers(self.dim), PQ_NBITS, ip)
+                self.storage = "float32"  # PQ codes replace scalar quantization
+            elif qtype is None:
+                index = faiss.IndexIVFFlat(quantizer, self.dim, nlist, ip)
+            else:
+                index = faiss.IndexIVFScalarQuantizer(quantizer, self.dim, nlist, qtype, ip)
+        if not index.is_trained:
+            index.train(train)
+        self.index = index
+        self.index_type = kind
+        self.set_search_params(self.nprobe, self.ef_search)
+
+    def set_search_params(self, nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+        """Trade recall for latency: IVF lists probed per query, HNSW candidate list size."""
+        if nprobe is not None:
+            self.nprobe = nprobe
+        if ef_search is not None:
+            self.ef_search = ef_search
+        if self.index is None:
+            return
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.nprobe = min(self.nprobe, ivf.nlist)
+        if hasattr(self.index, "hnsw"):
+            self.index.hnsw.efSearch = self.ef_search
+
+    @property
+    def ntotal(self) -> int:
+        return self.index.ntotal if self.index is not None else 0
+
+    def add(self, embeddings: np.ndarray, texts: List[str], inplace: bool = False):
+        """Add rows of `embeddings` with their chunk `texts`.
+
+        With `inplace`, a C-contiguous float32 `embeddings` is normalized in its
+        own buffer instead of a copy (the caller's array is modified).
+        """
+        if self.texts.readonly:
+            raise RuntimeError('indexes opened with FaissVectorDB.load are read-only')
+        embs = _unit_rows(embeddings, inplace)
+        if self.index is None:
+            self._create_index(embs)
+        self.index.add(embs)
         self.texts.extend(texts)
 
+    def search_batch(self, embeddings: np.ndarray, top_k: int = 5,
+                     inplace: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Search many queries in one FAISS call.
+
+        Returns `(ids, scores)`, both shaped `(n_queries, top_k)`; missing hits
+        have id -1. Look texts up with `self.texts[i]`. `inplace` works as in `add`.
+        """
+        queries = _unit_rows(embeddings, inplace)
+        if self.index is None or self.index.ntotal == 0:
+            n = len(queries)
+            return np.full((n, top_k), -1, dtype=np.int64), np.zeros((n, top_k), dtype=np.float32)
+        scores, ids = self.index.search(queries, top_k)
+        return ids, scores
+
     def search(self, embedding: np.ndarray, top_k: int = 5) -> List[Tuple[str, float]]:
-        vec = embedding.reshape(1, -1).astype('float32')
-        # normalize
-        norm = np.linalg.norm(vec)
-        if norm == 0:
+        vec = embedding.reshape(1, -1)
+        if not np.any(vec):
             return []
-        vec = vec / norm
-        D, I = self.index.search(vec, top_k)
-        results = []
-        for score, idx in zip(D[0], I[0]):
-            if idx < 0 or idx >= len(self.texts):
-                continue
-            results.append((self.texts[idx], float(score)))
-        return results
+        ids, scores = self.search_batch(vec, top_k)
+        return [(self.texts[idx], float(score)) for idx, score in zip(ids[0], scores[0]) if 0 <= idx < len(self.texts)]
+
+    def save(self, directory: Union[str, Path]) -> None:
+        """Write the index and chunk texts to `directory` (created if missing)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        if self.index is None:
+            # Nothing added - there is no batch to train on
+            self.index, self.index_type, self.storage = faiss.IndexFlatIP(self.dim), "flat", "float32"
+        faiss.write_index(self.index, str(directory / INDEX_FILE))
+        self.texts.save(directory)
+
+    @classmethod
+    def load(cls, directory: Union[str, Path], mmap: bool = True) -> "FaissVectorDB":
+        """Open an index written by `save`. With `mmap`, vectors and texts stay on disk until touched."""
+        if faiss is None:
+            raise RuntimeError('faiss not installed. pip install faiss-cpu')
+        directory = Path(directory)
+        index_path = str(directory / INDEX_FILE)
+        index = None
+        if mmap:
+            try:
+                index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP)
+            except Exception:
+                index = None  # older FAISS builds can't map flat indexes
+        if index is None:
+            index = faiss.read_index(index_path)
+
+        db = cls.__new__(cls)
+        db.dim = index.d
+        db.index = index
+        db.index_type = _index_type_of(index)
+        db.storage = _storage_of(index)
+        db.nlist = None
+        db.nprobe = DEFAULT_NPROBE
+        db.ef_search = DEFAULT_EF_SEARCH
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            db.nlist, db.nprobe = ivf.nlist, ivf.nprobe
+        if hasattr(index, "hnsw"):
+            db.ef_search = index.hnsw.efSearch
+        db.texts = ChunkStore.load(directory, mmap=mmap)
+        return db
+
+
+def _index_type_of(index) -> str:
+    if hasattr(index, "hnsw"):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if faiss.try_extract_index_ivf(index) is not None:
+        return "ivf_flat"
+    return "flat"
+
+
+def _storage_of(index) -> str:
+    if hasattr(index, "hnsw"):
+        index = faiss.downcast_index(index.storage)
+    sq = getattr(faiss.downcast_index(index), "sq", None)
+    if sq is None:
+        return "float32"
+    return {faiss.ScalarQuantizer.QT_fp16: "fp16", faiss.ScalarQuantizer.QT_8bit: "int8"}.get(sq.qtype, "float32")